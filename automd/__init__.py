@@ -10,7 +10,13 @@ Using UFF as potential and Gromacs as Engine to run MD for isomer searching
 """
 
 
-from .main import run, get_isomers, generate_gromacs_topfile_itpfile
+from .main import run, get_isomers, iter_isomers, rerun_energies, \
+    generate_gromacs_topfile_itpfile
+from .batch import run_many
+from .aio import arun, aget_isomers
+from .archive import ResultArchive
+from .dedup import deduplicate
+from .topology import Topology, load_topology
 
 
 __version__ = '3.2.2'
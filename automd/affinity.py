@@ -0,0 +1,163 @@
+"""
+
+node-local allocation of cpu cores to concurrent mdrun jobs
+
+Reservations of all automd processes of a user on a node are kept in a
+json file guarded by an flock, each mdrun gets a disjoint set of cores of
+the affinity mask of this process, passed as -pinoffset/-pinstride. Users
+sharing a node share reservations by setting AUTOMD_AFFINITY_FILE to a
+path all of them can write. If the file cannot be used, mdrun is not
+pinned.
+
+
+"""
+
+import os
+import json
+import uuid
+import fcntl
+import tempfile
+import contextlib
+
+import modlog
+
+
+logger = modlog.getLogger(__name__)
+AFFINITY_FILE = os.environ.get(
+    'AUTOMD_AFFINITY_FILE',
+    os.path.join(tempfile.gettempdir(),
+                 f'automd-affinity-{os.getuid()}.json'))
+MAX_PIN_STRIDE = 4
+# AUTOMD_PIN_CORES=0 disables the allocator, mdrun then uses -pin auto
+PIN_CORES = os.environ.get('AUTOMD_PIN_CORES', '1') != '0'
+
+
+class CoreReservation:
+    """
+    cores reserved for one mdrun
+    Attributes:
+        token: key of the reservation in AFFINITY_FILE
+        cores: reserved logical core ids
+        pinoffset/pinstride: arguments of mdrun
+    """
+
+    def __init__(self, token, cores, pinoffset, pinstride):
+        self.token = token
+        self.cores = cores
+        self.pinoffset = pinoffset
+        self.pinstride = pinstride
+
+    def __repr__(self):
+        return f"CoreReservation(pinoffset={self.pinoffset}, " \
+            f"pinstride={self.pinstride}, cores={self.cores})"
+
+
+def get_available_cores():
+    """
+    logical core ids this process may run on (affinity mask / cpuset)
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextlib.contextmanager
+def locked_reservations(filename=None):
+    """
+    {token: {pid, cores}} of live reservations, written back on exit
+    """
+    filename = filename or AFFINITY_FILE
+    with open(filename + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            try:
+                with open(filename) as fd:
+                    reservations = json.load(fd)
+            except (OSError, ValueError):
+                reservations = dict()
+            reservations = {token: x for token, x in reservations.items()
+                            if is_alive(x['pid'])}
+            yield reservations
+            with open(filename + '.tmp', 'w') as fd:
+                json.dump(reservations, fd)
+            os.replace(filename + '.tmp', filename)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def find_free_cores(ncores, available, used):
+    """
+    (pinoffset, pinstride) of the first ncores free cores evenly strided,
+    smallest stride first; None if there is no such set
+    """
+    free = set(available) - set(used)
+    for stride in range(1, MAX_PIN_STRIDE + 1):
+        for offset in sorted(free):
+            cores = [offset + i * stride for i in range(ncores)]
+            if all(core in free for core in cores):
+                return offset, stride
+    return None
+
+
+def acquire_cores(ncores, filename=None):
+    """
+    reserve ncores cores for a mdrun
+    Output:
+        CoreReservation, None if not enough free cores
+    """
+    if not PIN_CORES:
+        return None
+    available = get_available_cores()
+    try:
+        with locked_reservations(filename) as reservations:
+            used = [core for x in reservations.values()
+                    for core in x['cores']]
+            found = find_free_cores(ncores, available, used)
+            if found is None:
+                logger.warning(f'no {ncores} free cores for pinning, '
+                               'mdrun is not pinned')
+                return None
+            offset, stride = found
+            cores = [offset + i * stride for i in range(ncores)]
+            token = f'{os.getpid()}-{uuid.uuid4().hex}'
+            reservations[token] = {'pid': os.getpid(), 'cores': cores}
+    except OSError as e:
+        logger.warning(f'core reservations not available ({e}), '
+                       'mdrun is not pinned')
+        return None
+    logger.debug(f'reserved cores {cores}')
+    return CoreReservation(token, cores, offset, stride)
+
+
+def release_cores(reservation, filename=None):
+    if reservation is None:
+        return
+    try:
+        with locked_reservations(filename) as reservations:
+            reservations.pop(reservation.token, None)
+    except OSError as e:
+        logger.warning(f'cannot release cores {reservation.cores}: {e}')
+        return
+    logger.debug(f'released cores {reservation.cores}')
+
+
+@contextlib.contextmanager
+def reserved_cores(ncores, filename=None):
+    """
+    context of acquire_cores/release_cores
+    """
+    reservation = acquire_cores(ncores, filename)
+    try:
+        yield reservation
+    finally:
+        release_cores(reservation, filename)
@@ -0,0 +1,239 @@
+"""
+
+asyncio API of automd
+
+`arun`/`aget_isomers` are coroutine versions of `run`/`get_isomers`, every
+gromacs command (grompp, convert-tpr, mdrun and the autotune benchmarks) is
+started with asyncio.create_subprocess_exec and killed when the task is
+cancelled; the short python steps (input parsing, topology, edr/xtc
+decoding) run in the default executor.
+
+
+"""
+
+import os
+import asyncio
+import functools
+import subprocess
+
+import modlog
+
+from . import affinity
+from . import autotune as _autotune
+from . import instrument
+from . import gromacs_utils
+from . import main
+
+
+logger = modlog.getLogger(__name__)
+
+
+async def run_in_executor(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(func, *args, **kwargs))
+
+
+async def run_subprocess(args, cwd='.', log_name='log', poll=None,
+                         poll_interval=gromacs_utils.PROGRESS_INTERVAL):
+    """
+    run a command with stdout/stderr to {log_name}.log/.err in cwd
+    Input:
+        poll: called every poll_interval seconds while the command runs
+    Output:
+        exit code, the process is killed if the task is cancelled
+    """
+    logger.debug(f"cmd: {' '.join(args)}")
+    with open(os.path.join(cwd, f'{log_name}.log'), 'w') as stdout, \
+            open(os.path.join(cwd, f'{log_name}.err'), 'w') as stderr:
+        process = await asyncio.create_subprocess_exec(
+            *args, cwd=cwd, stdin=subprocess.DEVNULL,
+            stdout=stdout, stderr=stderr)
+        try:
+            if poll is None:
+                return await process.wait()
+            while True:
+                try:
+                    exit_code = await asyncio.wait_for(
+                        asyncio.shield(process.wait()), poll_interval)
+                except asyncio.TimeoutError:
+                    poll()
+                    continue
+                poll()
+                return exit_code
+        except (asyncio.CancelledError, Exception):
+            if process.returncode is None:
+                logger.debug(f"kill {args[0]} pid {process.pid}")
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+            raise
+
+
+async def aexec_grompp(mdrun_filename=gromacs_utils.MDRUN_FILE,
+                       top_filename=gromacs_utils.TOP_FILE,
+                       gro_filename=gromacs_utils.GRO_FILE,
+                       dest_dir='.', use_cache=True):
+    """
+    coroutine of gromacs_utils.exec_grompp
+    """
+    hit, cache_key = False, None
+    if use_cache:
+        hit, cache_key = await run_in_executor(
+            gromacs_utils.lookup_tpr, mdrun_filename, top_filename,
+            gro_filename, dest_dir)
+    if hit:
+        return mdrun_filename
+    exit_code = await run_subprocess(
+        gromacs_utils.get_grompp_args(
+            mdrun_filename, top_filename, gro_filename),
+        cwd=dest_dir, log_name='log_grompp')
+    if exit_code != 0:
+        raise OSError('grompp error')
+    if cache_key:
+        await run_in_executor(gromacs_utils.save_tpr, cache_key, dest_dir)
+    return mdrun_filename
+
+
+async def aexec_mdrun(maxcore=4, device='cpu', dest_dir='.', resume=False,
+                      progress=None, layout=None):
+    """
+    coroutine of gromacs_utils.exec_mdrun
+    """
+    dest_dir = dest_dir or '.'
+    checkpoint, append = gromacs_utils.find_checkpoint(dest_dir) \
+        if resume else (None, True)
+    cores = await run_in_executor(affinity.acquire_cores, maxcore)
+    try:
+        args = gromacs_utils.get_mdrun_args(maxcore, device, cores,
+                                            checkpoint, append, layout)
+        follower = gromacs_utils.get_mdrun_progress(dest_dir, progress) \
+            if progress is not None else None
+        exit_code = await run_subprocess(
+            args, cwd=dest_dir, log_name='log_mdrun',
+            poll=follower.poll if follower else None)
+    finally:
+        affinity.release_cores(cores)
+    if exit_code != 0:
+        raise OSError('mdrun error')
+    return gromacs_utils.get_mdrun_output(dest_dir)
+
+
+async def aexec_extend_tpr(extend_time, time_unit='ps', dest_dir='.'):
+    """
+    coroutine of gromacs_utils.exec_extend_tpr
+    """
+    dest_dir = dest_dir or '.'
+    exit_code = await run_subprocess(
+        gromacs_utils.get_extend_tpr_args(extend_time, time_unit),
+        cwd=dest_dir, log_name='log_convert-tpr')
+    if exit_code != 0:
+        raise OSError('convert-tpr error')
+    gromacs_utils.record_extension(extend_time, time_unit, dest_dir)
+
+
+async def abenchmark_layout(ntmpi, ntomp, device='cpu', dest_dir='.'):
+    """
+    coroutine of autotune.benchmark_layout
+    """
+    tune_dir = await run_in_executor(
+        _autotune.prepare_benchmark, ntmpi, ntomp, dest_dir)
+    cores = await run_in_executor(affinity.acquire_cores, ntmpi * ntomp)
+    try:
+        exit_code = await run_subprocess(
+            _autotune.get_benchmark_args(ntmpi, ntomp, device, cores),
+            cwd=tune_dir, log_name='log_mdrun')
+    finally:
+        affinity.release_cores(cores)
+    return await run_in_executor(
+        _autotune.read_benchmark, ntmpi, ntomp, tune_dir, exit_code)
+
+
+async def aget_thread_layout(grofile, maxcore, device='cpu', dest_dir='.',
+                             autotune=False):
+    """
+    coroutine of autotune.get_thread_layout
+    """
+    dest_dir = dest_dir or '.'
+    layout, natoms, key = await run_in_executor(
+        _autotune.find_layout, grofile, maxcore, device)
+    if layout is None and autotune:
+        results = dict()
+        try:
+            for ntmpi, ntomp in _autotune.get_candidate_layouts(maxcore):
+                results[f'{ntmpi}x{ntomp}'] = await abenchmark_layout(
+                    ntmpi, ntomp, device, dest_dir)
+        finally:
+            # also removes the benchmarks of a cancelled task
+            layout = _autotune.select_layout(natoms, results, dest_dir)
+        if layout is not None:
+            await run_in_executor(_autotune.save_layout, key, layout)
+    return layout
+
+
+async def arun(input_file, runtype='md', mdrun_file=None, dest_dir='.',
+               max_core: int = main.DEFAULT_MAX_CORE, device: str = 'cpu',
+               extract_forces: bool = False, topfile=None, itpfile=None,
+               dry_run: bool = False, cache_results: bool = False,
+               resume: bool = False, extend_time=None, progress=None,
+               autotune: bool = False, **args):
+    """
+    coroutine of automd.run, same arguments and output
+    """
+    max_core = max_core or main.DEFAULT_MAX_CORE
+    resume, continued = main.check_resume(dest_dir, resume, extend_time)
+    result_key = None
+    timings = instrument.StageTimings(dest_dir)
+    if cache_results and not dry_run and not resume:
+        result_key, out_dict = await run_in_executor(
+            main.lookup_result, input_file, runtype, mdrun_file, topfile,
+            extract_forces, dest_dir, timings, **args)
+        if out_dict is not None:
+            return out_dict
+    prepare = main.prepare_continued if continued else main.prepare_inputs
+    out_dict = await run_in_executor(
+        prepare, input_file, runtype, mdrun_file, dest_dir, topfile,
+        itpfile, timings=timings, **args)
+    if not continued:
+        with timings.stage('grompp'):
+            await aexec_grompp(out_dict['mdrunfile'], out_dict['topfile'],
+                               out_dict['grofile'], dest_dir=dest_dir)
+    if not dry_run:
+        if extend_time:
+            with timings.stage('extend_tpr'):
+                await aexec_extend_tpr(
+                    extend_time, args.get('time_unit', 'ps'), dest_dir)
+        with timings.stage('thread_layout'):
+            layout = await aget_thread_layout(
+                out_dict['grofile'], max_core, device, dest_dir, autotune)
+        out_dict['thread_layout'] = main.get_layout_summary(layout)
+        with timings.stage('mdrun'):
+            out_dict.update(await aexec_mdrun(
+                max_core, device=device, dest_dir=dest_dir,
+                resume=continued, progress=progress, layout=layout))
+        await run_in_executor(
+            main.finish_run, out_dict, dest_dir, extract_forces, timings,
+            result_key)
+    out_dict['timings'] = timings.to_dict()
+    return out_dict
+
+
+async def aget_isomers(input_file, mdrun_file=None, dest_dir='.',
+                       max_core=main.DEFAULT_MAX_CORE, device: str = 'cpu',
+                       extract_forces=False, topfile=None, dry_run=False,
+                       dedup=None, dedup_threshold=None, dedup_mode='dedup',
+                       **args):
+    """
+    coroutine of automd.get_isomers, same arguments and output
+    """
+    out_dict = await arun(input_file, mdrun_file=mdrun_file,
+                          dest_dir=dest_dir, max_core=max_core,
+                          device=device, extract_forces=extract_forces,
+                          topfile=topfile, dry_run=dry_run, **args)
+    if dry_run:
+        return []
+    return await run_in_executor(
+        main.collect_isomers, out_dict, dest_dir, dedup, dedup_threshold,
+        dedup_mode)
@@ -0,0 +1,309 @@
+"""
+
+columnar archive of the results of many runs
+
+Scalars of every out_dict (file names, timings, performance, the last
+frame of energy series...) go to one row of index.csv, the types of its
+columns to columns.json, arrays (energy series, forces) to .npz shards of
+about SHARD_SIZE bytes. Rows can be
+queried without touching the shards, arrays of a job are loaded only when
+they are accessed.
+
+    with ResultArchive('results') as archive:
+        for input_file, out_dict in automd.run_many(inputs):
+            archive.append(input_file, out_dict)
+    archive = ResultArchive('results')
+    rows = archive.select(status='done')
+    forces = archive[rows[0]['job']]['forces']
+
+
+"""
+
+import os
+import csv
+import json
+import numbers
+
+import numpy as np
+import modlog
+
+
+logger = modlog.getLogger(__name__)
+INDEX_FILE = 'index.csv'
+# types of the columns of index.csv, so that strings stay strings
+COLUMNS_FILE = 'columns.json'
+SHARD_FORMAT = 'shard_{:05d}.npz'
+SHARD_SIZE = 64 * 1024 ** 2
+# columns of every row, the others are the scalars of out_dict
+INDEX_COLUMNS = ['job', 'input_file', 'status', 'error', 'shard']
+INDEX_TYPES = {'job': 'int', 'input_file': 'str', 'status': 'str',
+               'error': 'str', 'shard': 'int'}
+CASTS = {'bool': lambda value: value == 'True', 'int': int, 'float': float,
+         'str': str}
+
+
+def flatten(out_dict, prefix=''):
+    """
+    scalars and arrays of a nested out_dict, keys joined by '.'
+    Output:
+        scalars: {key: int/float/str/bool/None}
+        arrays: {key: np.ndarray}
+    """
+    scalars, arrays = dict(), dict()
+    for key, value in out_dict.items():
+        key = f'{prefix}{key}'
+        if isinstance(value, dict):
+            sub_scalars, sub_arrays = flatten(value, f'{key}.')
+            scalars.update(sub_scalars)
+            arrays.update(sub_arrays)
+        elif value is None or isinstance(value, (str, bool, numbers.Number)):
+            scalars[key] = value.item() if isinstance(value, np.generic) \
+                else value
+        elif isinstance(value, np.ndarray) and value.ndim == 0:
+            scalars[key] = value.item()
+        else:
+            try:
+                array = np.asarray(value)
+            except ValueError:
+                continue
+            if array.dtype == object:
+                continue
+            arrays[key] = array
+            if array.ndim == 1 and len(array) and \
+                    np.issubdtype(array.dtype, np.number):
+                # series in the index by their last frame
+                scalars[key] = array[-1].item()
+    return scalars, arrays
+
+
+def get_column_type(values):
+    """
+    bool/int/float/str, the type all values (but None) of a column can be
+    read back as
+    """
+    types = {type(value) for value in values if value is not None}
+    if types == {bool}:
+        return 'bool'
+    if types <= {int}:
+        return 'int' if types else 'str'
+    if types <= {int, float}:
+        return 'float'
+    return 'str'
+
+
+def parse_value(value, column_type=None):
+    """
+    value of a cell of index.csv, '' is None; guessed from the string for
+    columns of unknown type
+    """
+    if value == '':
+        return None
+    if column_type:
+        return CASTS[column_type](value)
+    if value in ['True', 'False']:
+        return value == 'True'
+    for cast in [int, float]:
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+class ArchivedResult:
+    """
+    one job of a ResultArchive, arrays are read from its shard on access
+    """
+
+    def __init__(self, archive, row):
+        self.archive = archive
+        self.row = row
+
+    def keys(self):
+        names = self.archive.array_names(self.row)
+        return sorted(set(self.row) | set(names) |
+                      {name.split('.')[0] for name in names})
+
+    def __getitem__(self, key):
+        names = self.archive.array_names(self.row)
+        if key in names:
+            return self.archive.load_array(self.row, key)
+        children = [x for x in names if x.startswith(key + '.')]
+        if children:
+            return {x[len(key)+1:]: self.archive.load_array(self.row, x)
+                    for x in children}
+        return self.row[key]
+
+    def __repr__(self):
+        return f"ArchivedResult(job={self.row['job']}, " \
+            f"input_file={self.row.get('input_file')})"
+
+
+class ResultArchive:
+    """
+    index.csv and npz shards in directory, appended by one writer
+    Input:
+        directory: directory of the archive, created if missing
+        shard_size: bytes of arrays per shard
+        compress: zip compress the shards, smaller but slower
+    """
+
+    def __init__(self, directory, shard_size=SHARD_SIZE, compress=False):
+        self.directory = directory
+        self.shard_size = shard_size
+        self.compress = compress
+        os.makedirs(directory, exist_ok=True)
+        self.rows = self.read_index()
+        shards = [row['shard'] for row in self.rows
+                  if row.get('shard') is not None]
+        self.shard = max(shards) + 1 if shards else 0
+        self.buffer = dict()
+        self.buffer_size = 0
+        self.open_shards = dict()
+        self.shard_names = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, job):
+        return ArchivedResult(self, self.rows[job])
+
+    def __iter__(self):
+        for row in self.rows:
+            yield ArchivedResult(self, row)
+
+    @property
+    def index_filename(self):
+        return os.path.join(self.directory, INDEX_FILE)
+
+    @property
+    def columns_filename(self):
+        return os.path.join(self.directory, COLUMNS_FILE)
+
+    def read_index(self):
+        if not os.path.exists(self.index_filename):
+            return list()
+        types = dict(INDEX_TYPES)
+        if os.path.exists(self.columns_filename):
+            with open(self.columns_filename) as fd:
+                types.update(json.load(fd))
+        with open(self.index_filename, newline='') as fd:
+            return [{key: parse_value(value, types.get(key))
+                     for key, value in row.items()}
+                    for row in csv.DictReader(fd)]
+
+    def write_index(self):
+        columns = list(INDEX_COLUMNS)
+        for row in self.rows:
+            columns += [key for key in row if key not in columns]
+        types = {key: INDEX_TYPES.get(key) or get_column_type(
+                     row.get(key) for row in self.rows) for key in columns}
+        with open(self.columns_filename + '.tmp', 'w') as fd:
+            json.dump(types, fd, indent=1)
+        os.replace(self.columns_filename + '.tmp', self.columns_filename)
+        tmp_filename = self.index_filename + '.tmp'
+        with open(tmp_filename, 'w', newline='') as fd:
+            writer = csv.DictWriter(fd, columns)
+            writer.writeheader()
+            writer.writerows(self.rows)
+        os.replace(tmp_filename, self.index_filename)
+
+    def append(self, input_file, out_dict):
+        """
+        add the result of a run, out_dict may be the exception of a
+        failed run
+        Output:
+            job number of the result
+        """
+        job = len(self.rows)
+        row = {'job': job, 'input_file': input_file}
+        if isinstance(out_dict, Exception):
+            row.update(status='failed', error=str(out_dict))
+            self.rows.append(row)
+            return job
+        scalars, arrays = flatten(out_dict)
+        row.update(scalars)
+        row.update(status='done', shard=self.shard if arrays else None)
+        for key, array in arrays.items():
+            self.buffer[f'{job}/{key}'] = array
+            self.buffer_size += array.nbytes
+        self.rows.append(row)
+        if self.buffer_size >= self.shard_size:
+            self.flush()
+        return job
+
+    def flush(self):
+        """
+        write the buffered arrays to a shard and the index
+        """
+        if self.buffer:
+            filename = os.path.join(self.directory,
+                                    SHARD_FORMAT.format(self.shard))
+            save = np.savez_compressed if self.compress else np.savez
+            with open(filename + '.tmp', 'wb') as fd:
+                save(fd, **self.buffer)
+            os.replace(filename + '.tmp', filename)
+            logger.debug(f"archive shard {filename}: {len(self.buffer)} "
+                         f"arrays, {self.buffer_size} bytes")
+            self.buffer, self.buffer_size = dict(), 0
+            self.shard += 1
+        self.write_index()
+
+    def close(self):
+        self.flush()
+        for shard in self.open_shards.values():
+            shard.close()
+        self.open_shards.clear()
+        self.shard_names.clear()
+
+    def select(self, condition=None, **values):
+        """
+        rows of the index matching condition(row) and columns == values
+        """
+        return [row for row in self.rows
+                if all(row.get(key) == value for key, value in values.items())
+                and (condition is None or condition(row))]
+
+    def to_dataframe(self):
+        """
+        index as pandas.DataFrame, pandas is required
+        """
+        import pandas
+        return pandas.DataFrame(self.rows)
+
+    def get_shard(self, shard):
+        if shard not in self.open_shards:
+            self.open_shards[shard] = np.load(os.path.join(
+                self.directory, SHARD_FORMAT.format(shard)))
+        return self.open_shards[shard]
+
+    def array_names(self, row):
+        """
+        keys of the arrays of the job of row
+        """
+        shard = row.get('shard')
+        if shard is None:
+            return list()
+        if shard == self.shard:
+            prefix = f"{row['job']}/"
+            return [x[len(prefix):] for x in self.buffer
+                    if x.startswith(prefix)]
+        if shard not in self.shard_names:
+            names = dict()
+            for name in self.get_shard(shard).files:
+                job, key = name.split('/', 1)
+                names.setdefault(int(job), list()).append(key)
+            self.shard_names[shard] = names
+        return self.shard_names[shard].get(row['job'], list())
+
+    def load_array(self, row, key):
+        name = f"{row['job']}/{key}"
+        if row['shard'] == self.shard:
+            return self.buffer[name]
+        return self.get_shard(row['shard'])[name]
@@ -0,0 +1,221 @@
+"""
+
+mdrun thread layout autotuner
+
+Short, bounded mdrun runs of the prepared topol.tpr compare -ntmpi/-ntomp
+layouts, the fastest (ns/day) is stored per host, gmx binary, device,
+number of cores and size bucket of the system, and used by later runs of
+systems of the same bucket.
+
+
+"""
+
+import os
+import json
+import math
+import shutil
+import platform
+import tempfile
+import subprocess
+
+import modlog
+
+from . import affinity
+from . import capability
+from . import gromacs_utils
+from . import telemetry
+from .cache import DiskCache, hash_key
+
+
+logger = modlog.getLogger(__name__)
+LAYOUT_CACHE = DiskCache('layouts', max_size=1024 ** 2)
+LAYOUT_FILE = 'layout.json'
+AUTOTUNE_DIR = 'autotune'
+# bound of a benchmark run: steps, and hours for very large systems
+TUNE_NSTEPS = 2000
+TUNE_MAXH = 0.005
+
+
+def get_size_bucket(natoms):
+    """
+    systems with natoms up to the next power of 2 share a layout
+    """
+    return 2 ** math.ceil(math.log2(max(natoms, 1)))
+
+
+def count_gro_atoms(gro_filename):
+    with open(gro_filename) as fd:
+        fd.readline()
+        return int(fd.readline().split()[0])
+
+
+def get_layout_key(natoms, maxcore, device):
+    gmx_capability = capability.get_capability()
+    return hash_key('layout', {
+        'host': platform.node(),
+        'machine': platform.machine(),
+        'cores': len(affinity.get_available_cores()),
+        'gmx': [gmx_capability.gmx_path, gmx_capability.version],
+        'device': device,
+        'maxcore': maxcore,
+        'bucket': get_size_bucket(natoms),
+    })
+
+
+def get_candidate_layouts(maxcore):
+    """
+    (ntmpi, ntomp) layouts to compare: fewer OpenMP threads on one rank,
+    whether threading pays off at all, and every split of maxcore threads
+    into ranks and threads
+    """
+    layouts = list()
+    nthreads = 1
+    while nthreads < maxcore:
+        layouts.append((1, nthreads))
+        nthreads *= 2
+    for ntmpi in range(1, maxcore + 1):
+        if maxcore % ntmpi == 0:
+            layouts.append((ntmpi, maxcore // ntmpi))
+    return layouts
+
+
+def load_layout(key):
+    entry = LAYOUT_CACHE.get(key)
+    if entry is None:
+        return None
+    try:
+        with open(os.path.join(entry, LAYOUT_FILE)) as fd:
+            return json.load(fd)
+    except (OSError, ValueError):
+        return None
+
+
+def save_layout(key, layout):
+    with tempfile.NamedTemporaryFile('w', suffix='.json') as fd:
+        json.dump(layout, fd, indent=4)
+        fd.flush()
+        LAYOUT_CACHE.put(key, {LAYOUT_FILE: fd.name})
+
+
+def prepare_benchmark(ntmpi, ntomp, dest_dir='.'):
+    """
+    directory of the benchmark of a layout, with topol.tpr of dest_dir
+    """
+    tune_dir = os.path.join(dest_dir, AUTOTUNE_DIR, f'{ntmpi}x{ntomp}')
+    os.makedirs(tune_dir, exist_ok=True)
+    shutil.copyfile(os.path.join(dest_dir, gromacs_utils.TPR_FILE),
+                    os.path.join(tune_dir, gromacs_utils.TPR_FILE))
+    return tune_dir
+
+
+def get_benchmark_args(ntmpi, ntomp, device='cpu', cores=None):
+    """
+    argv of a short mdrun with a layout, bounded in steps and time
+    """
+    gmx_capability = capability.get_capability()
+    args = gromacs_utils.get_mdrun_args(
+        ntmpi * ntomp, device, cores, layout={'ntmpi': ntmpi, 'ntomp': ntomp})
+    for flag, value in [('-nsteps', str(TUNE_NSTEPS)),
+                        ('-maxh', str(TUNE_MAXH)),
+                        ('-resethway', None), ('-noconfout', None)]:
+        if gmx_capability.supports(flag):
+            args += [flag] if value is None else [flag, value]
+    return args
+
+
+def read_benchmark(ntmpi, ntomp, tune_dir, exit_code):
+    """
+    ns/day of a finished benchmark, its directory is removed
+    Output:
+        float, None if mdrun failed with this layout
+    """
+    performance = telemetry.read_performance(
+        os.path.join(tune_dir, gromacs_utils.LOG_FILE))
+    shutil.rmtree(tune_dir, ignore_errors=True)
+    if exit_code != 0:
+        logger.debug(f"layout {ntmpi}x{ntomp} failed")
+        return None
+    return performance.get('ns_per_day')
+
+
+def benchmark_layout(ntmpi, ntomp, device='cpu', dest_dir='.'):
+    """
+    ns/day of a short mdrun of topol.tpr of dest_dir with a layout
+    Output:
+        float, None if mdrun fails with this layout
+    """
+    tune_dir = prepare_benchmark(ntmpi, ntomp, dest_dir)
+    with affinity.reserved_cores(ntmpi * ntomp) as cores:
+        args = get_benchmark_args(ntmpi, ntomp, device, cores)
+        logger.debug(f"autotune cmd: {' '.join(args)}")
+        with open(os.path.join(tune_dir, 'log_mdrun.log'), 'w') as stdout, \
+                open(os.path.join(tune_dir, 'log_mdrun.err'), 'w') as stderr:
+            exit_code = subprocess.call(
+                args, cwd=tune_dir, stdin=subprocess.DEVNULL,
+                stdout=stdout, stderr=stderr)
+    return read_benchmark(ntmpi, ntomp, tune_dir, exit_code)
+
+
+def select_layout(natoms, results, dest_dir='.'):
+    """
+    fastest layout of the benchmark results {'AxB': ns/day or None}
+    Output:
+        dict of the fastest layout: ntmpi, ntomp, ns_per_day, natoms and
+        ns/day of all candidates, None if all candidates failed
+    """
+    shutil.rmtree(os.path.join(dest_dir, AUTOTUNE_DIR), ignore_errors=True)
+    logger.debug(f"autotune {natoms} atoms: {results}")
+    finished = {name: x for name, x in results.items() if x}
+    if not finished:
+        return None
+    best = max(finished, key=finished.get)
+    ntmpi, ntomp = (int(x) for x in best.split('x'))
+    return {'ntmpi': ntmpi, 'ntomp': ntomp, 'ns_per_day': finished[best],
+            'natoms': natoms, 'candidates': results}
+
+
+def tune_layout(natoms, maxcore, device='cpu', dest_dir='.'):
+    """
+    benchmark the candidate layouts with topol.tpr of dest_dir
+    Output:
+        see select_layout
+    """
+    results = dict()
+    for ntmpi, ntomp in get_candidate_layouts(maxcore):
+        results[f'{ntmpi}x{ntomp}'] = benchmark_layout(
+            ntmpi, ntomp, device, dest_dir)
+    return select_layout(natoms, results, dest_dir)
+
+
+def find_layout(grofile, maxcore, device='cpu'):
+    """
+    stored layout of the system of grofile
+    Output:
+        (layout or None, natoms, key of the layout)
+    """
+    natoms = count_gro_atoms(grofile)
+    key = get_layout_key(natoms, maxcore, device)
+    return load_layout(key), natoms, key
+
+
+def get_thread_layout(grofile, maxcore, device='cpu', dest_dir='.',
+                      autotune=False):
+    """
+    thread layout of mdrun for the system of grofile
+    Input:
+        grofile: gro file of the system, for its number of atoms
+        maxcore: number of cores of the run
+        autotune: benchmark the layouts with topol.tpr of dest_dir if no
+            layout of this host and size bucket is stored
+    Output:
+        dict with ntmpi and ntomp, None to use -nt maxcore
+    """
+    layout, natoms, key = find_layout(grofile, maxcore, device)
+    if layout is None and autotune:
+        layout = tune_layout(natoms, maxcore, device, dest_dir or '.')
+        if layout is not None:
+            save_layout(key, layout)
+    if layout is not None:
+        logger.debug(f"thread layout: {layout['ntmpi']} ranks x "
+                     f"{layout['ntomp']} threads")
+    return layout
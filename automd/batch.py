@@ -0,0 +1,151 @@
+"""
+
+batch executor of automd
+
+Split the cores of a host between concurrent `run` jobs
+
+
+"""
+
+import os
+import math
+import concurrent.futures
+
+import modlog
+
+from . import main
+
+
+logger = modlog.getLogger(__name__)
+ATOMS_PER_THREAD = 64
+
+
+def get_total_cores():
+    """
+    number of cores this process is allowed to run on
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def count_atoms(input_file):
+    """
+    count atoms of a structure file, cheap path for xyz/gro/pdb
+    Input:
+        input_file: filename of structure file
+    Output:
+        int, number of atoms
+    """
+    ext = os.path.splitext(input_file)[-1].lower()
+    if ext == '.xyz':
+        with open(input_file) as fd:
+            return int(fd.readline().split()[0])
+    if ext == '.gro':
+        with open(input_file) as fd:
+            fd.readline()
+            return int(fd.readline().split()[0])
+    if ext == '.pdb':
+        natoms = 0
+        with open(input_file) as fd:
+            for line in fd:
+                if line.startswith(('ATOM', 'HETATM')):
+                    natoms += 1
+                elif line.startswith('ENDMDL'):
+                    break
+        return natoms
+    try:
+        import gaseio
+        arrays = gaseio.read(input_file, force_gase=True)
+    except Exception:
+        import chemio
+        arrays = chemio.read(input_file)
+    return len(arrays['symbols'])
+
+
+def get_job_threads(natoms, max_threads):
+    """
+    threads used by mdrun for a system of natoms,
+    one thread per ATOMS_PER_THREAD atoms but no more than max_threads
+    """
+    nthreads = math.ceil(natoms / ATOMS_PER_THREAD)
+    return max(1, min(max_threads, nthreads))
+
+
+def read_manifest(manifest_file):
+    """
+    read a manifest file, one input file per line, `#` for comments
+    relative paths are relative to the manifest file
+    """
+    basedir = os.path.dirname(os.path.abspath(manifest_file))
+    inputs = list()
+    with open(manifest_file) as fd:
+        for line in fd:
+            line = line.split('#')[0].strip()
+            if line:
+                inputs.append(os.path.join(basedir, line))
+    return inputs
+
+
+def get_job_dest_dir(dest_dir, index, input_file, ndigits):
+    name = os.path.splitext(os.path.basename(input_file))[0]
+    return os.path.join(dest_dir, f"{index:0{ndigits}d}_{name}")
+
+
+def run_many(inputs, total_cores=None, max_core=main.DEFAULT_MAX_CORE,
+             dest_dir='.', **args):
+    """
+    run automd for many inputs concurrently
+    Input:
+        inputs: list of filenames of inputs
+        total_cores: cores shared by all jobs, default all available cores
+        max_core: maximum number of cores of a single job
+        dest_dir: each job runs in dest_dir/<index>_<name>
+        **args: arguments for `run`
+    Output:
+        generator of (input_file, out_dict) in the order jobs finish,
+        out_dict is the raised exception if the job failed
+    """
+    inputs = list(inputs)
+    total_cores = total_cores or get_total_cores()
+    max_core = max(1, min(max_core or main.DEFAULT_MAX_CORE, total_cores))
+    ndigits = len(str(len(inputs)))
+    logger.debug(f"run_many: {len(inputs)} jobs on {total_cores} cores")
+    free_cores = total_cores
+    pending = dict()
+
+    def collect(return_when):
+        nonlocal free_cores
+        done, _ = concurrent.futures.wait(
+            pending, return_when=return_when)
+        for future in done:
+            input_file, ncores = pending.pop(future)
+            free_cores += ncores
+            try:
+                yield input_file, future.result()
+            except Exception as e:
+                logger.warning(f"{input_file} failed: {e}")
+                yield input_file, e
+
+    with concurrent.futures.ThreadPoolExecutor(total_cores) as executor:
+        for index, input_file in enumerate(inputs):
+            if isinstance(input_file, str) and os.path.exists(input_file):
+                input_file = os.path.abspath(input_file)
+            try:
+                ncores = get_job_threads(count_atoms(input_file), max_core)
+            except Exception as e:
+                logger.warning(f"{input_file} failed: {e}")
+                yield input_file, e
+                continue
+            while free_cores < ncores:
+                yield from collect(concurrent.futures.FIRST_COMPLETED)
+            free_cores -= ncores
+            job_dest_dir = get_job_dest_dir(
+                dest_dir, index, input_file, ndigits)
+            logger.debug(f"submit {input_file}: {ncores} cores")
+            future = executor.submit(
+                main.run, input_file, dest_dir=job_dest_dir,
+                max_core=ncores, **args)
+            pending[future] = (input_file, ncores)
+        while pending:
+            yield from collect(concurrent.futures.FIRST_COMPLETED)
@@ -0,0 +1,147 @@
+"""
+
+on-disk caches of automd
+
+Each entry is a directory named by the hash of its key, the least recently
+used entries are evicted when the cache grows over its size limit.
+
+
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import modlog
+
+
+logger = modlog.getLogger(__name__)
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser('~'), '.cache', 'automd')
+DEFAULT_MAX_SIZE = 256 * 1024 ** 2
+
+
+def get_cache_dir():
+    """
+    root directory of all caches, AUTOMD_CACHE_DIR overrides the default
+    """
+    return os.environ.get('AUTOMD_CACHE_DIR', DEFAULT_CACHE_DIR)
+
+
+def hash_key(*parts):
+    """
+    sha256 hex digest of json serializable parts
+    """
+    string = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(string.encode()).hexdigest()
+
+
+def hash_files(*filenames):
+    """
+    sha256 hex digest of the contents of files
+    """
+    sha = hashlib.sha256()
+    for filename in filenames:
+        with open(filename, 'rb') as fd:
+            for chunk in iter(lambda: fd.read(1024 ** 2), b''):
+                sha.update(chunk)
+        sha.update(b'\0')
+    return sha.hexdigest()
+
+
+def get_dir_size(dirname):
+    size = 0
+    for root, _, files in os.walk(dirname):
+        for fname in files:
+            try:
+                size += os.path.getsize(os.path.join(root, fname))
+            except OSError:
+                pass
+    return size
+
+
+class DiskCache:
+    """
+    directory based cache with a size limit and LRU eviction
+    Input:
+        name: subdirectory of the cache root
+        max_size: maximum bytes of the cache, AUTOMD_<NAME>_CACHE_SIZE
+            overrides the default
+    """
+
+    def __init__(self, name, max_size=None):
+        self.name = name
+        env_size = os.environ.get(f'AUTOMD_{name.upper()}_CACHE_SIZE')
+        self.max_size = int(env_size or max_size or DEFAULT_MAX_SIZE)
+
+    @property
+    def directory(self):
+        return os.path.join(get_cache_dir(), self.name)
+
+    def get(self, key):
+        """
+        directory of entry key, None if missing
+        """
+        entry = os.path.join(self.directory, key)
+        if not os.path.isdir(entry):
+            return None
+        try:
+            os.utime(entry)
+        except OSError:
+            return None
+        logger.debug(f"{self.name} cache hit: {key}")
+        return entry
+
+    def put(self, key, filenames):
+        """
+        store copies of filenames as entry key
+        Input:
+            key: str
+            filenames: dict, {name in entry: source filename}
+        Output:
+            directory of the entry
+        """
+        entry = os.path.join(self.directory, key)
+        os.makedirs(self.directory, exist_ok=True)
+        tmpdir = tempfile.mkdtemp(prefix='.tmp', dir=self.directory)
+        try:
+            for name, filename in filenames.items():
+                shutil.copyfile(filename, os.path.join(tmpdir, name))
+        except OSError:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            raise
+        try:
+            os.rename(tmpdir, entry)
+        except OSError:
+            # another process stored the same entry first
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        logger.debug(f"{self.name} cache put: {key}")
+        self.evict()
+        return entry
+
+    def evict(self):
+        """
+        remove least recently used entries until size <= max_size
+        """
+        entries = list()
+        for key in os.listdir(self.directory):
+            entry = os.path.join(self.directory, key)
+            if key.startswith('.tmp') or not os.path.isdir(entry):
+                continue
+            try:
+                entries.append((os.path.getmtime(entry),
+                                get_dir_size(entry), entry))
+            except OSError:
+                pass
+        size = sum(x[1] for x in entries)
+        for _, entry_size, entry in sorted(entries):
+            if size <= self.max_size:
+                break
+            logger.debug(f"{self.name} cache evict: {entry}")
+            shutil.rmtree(entry, ignore_errors=True)
+            size -= entry_size
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
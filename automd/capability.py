@@ -0,0 +1,173 @@
+"""
+
+capability of the installed gromacs
+
+`gmx --version` and `gmx mdrun -h` are probed once per gmx binary, the result
+is kept in memory and on disk, keyed on the resolved path and mtime of gmx.
+
+
+"""
+
+import os
+import re
+import json
+import shutil
+import tempfile
+import functools
+import subprocess
+
+import modlog
+
+from .cache import DiskCache, hash_key
+
+
+logger = modlog.getLogger(__name__)
+GMX_EXE = 'gmx'
+CAPABILITY_FILE = 'capability.json'
+CAPABILITY_CACHE = DiskCache('capability', max_size=1024 ** 2)
+
+
+class GromacsCapability:
+    """
+    what the installed gromacs supports
+    Attributes:
+        gmx_path: resolved path of gmx
+        mtime: mtime of gmx_path
+        version: version string, e.g. 2020.1
+        precision: single/mixed/double
+        simd: SIMD instructions, e.g. AVX2_256
+        mdrun_flags: flags accepted by `gmx mdrun`
+        config: all `key: value` lines of `gmx --version`
+    """
+
+    def __init__(self, gmx_path, mtime, version, precision=None, simd=None,
+                 mdrun_flags=None, config=None):
+        self.gmx_path = gmx_path
+        self.mtime = mtime
+        self.version = version
+        self.precision = precision
+        self.simd = simd
+        self.mdrun_flags = list(mdrun_flags or [])
+        self.config = dict(config or {})
+
+    def supports(self, flag):
+        """
+        whether `gmx mdrun` accepts flag, e.g. -pme
+        """
+        return flag in self.mdrun_flags
+
+    @property
+    def double(self):
+        return self.precision == 'double'
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def __repr__(self):
+        return f"GromacsCapability({self.gmx_path}, version={self.version}, " \
+            f"precision={self.precision}, simd={self.simd})"
+
+
+def parse_version_output(output):
+    """
+    parse `gmx --version` to dict of `key: value` lines, lower case keys
+    """
+    config = dict()
+    for line in output.split('\n'):
+        match = re.match(r'^([A-Za-z][^:]*?):\s+(.*?)\s*$', line)
+        if match:
+            config[match[1].lower()] = match[2]
+    return config
+
+
+def parse_mdrun_flags(help_text):
+    """
+    flags listed in `gmx mdrun -h`, both forms of -[no]flag are included
+    """
+    flags = set()
+    for flag in re.findall(r'^\s*(-(?:\[no\])?[A-Za-z][\w-]*)',
+                           help_text, re.MULTILINE):
+        if flag.startswith('-[no]'):
+            flags.add('-' + flag[5:])
+            flags.add('-no' + flag[5:])
+        else:
+            flags.add(flag)
+    return sorted(flags)
+
+
+def probe_gromacs(gmx_path):
+    """
+    run gmx to get its capability
+    """
+    exit_code, output = subprocess.getstatusoutput(
+        f'{gmx_path} --version')
+    if exit_code != 0:
+        raise OSError('There is no gromacs, Please check if gmx in PATH')
+    config = parse_version_output(output)
+    version_string = config.get('gromacs version') or config.get('gromacs')
+    if not version_string:
+        raise OSError(f'Cannot get gromacs version from\n{output}')
+    version = re.sub(r'^VERSION\s+', '', version_string,
+                     flags=re.IGNORECASE).split()[0]
+    precision = config.get('precision', '').split()
+    exit_code, help_text = subprocess.getstatusoutput(f'{gmx_path} mdrun -h')
+    mdrun_flags = parse_mdrun_flags(help_text)
+    # an empty list would be cached for the lifetime of the binary
+    if exit_code != 0 or not mdrun_flags:
+        raise OSError(f'Cannot get mdrun flags from {gmx_path} mdrun -h\n'
+                      f'{help_text}')
+    capability = GromacsCapability(
+        gmx_path, os.path.getmtime(gmx_path), version,
+        precision=precision[0] if precision else None,
+        simd=config.get('simd instructions'),
+        mdrun_flags=mdrun_flags,
+        config=config)
+    logger.debug(f"probe gromacs: {capability}")
+    return capability
+
+
+def load_capability(key):
+    entry = CAPABILITY_CACHE.get(key)
+    if entry is None:
+        return None
+    try:
+        with open(os.path.join(entry, CAPABILITY_FILE)) as fd:
+            return GromacsCapability.from_dict(json.load(fd))
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def save_capability(key, capability):
+    with tempfile.NamedTemporaryFile('w', suffix='.json') as fd:
+        json.dump(capability.to_dict(), fd, indent=4)
+        fd.flush()
+        CAPABILITY_CACHE.put(key, {CAPABILITY_FILE: fd.name})
+
+
+@functools.lru_cache(maxsize=None)
+def _get_capability(gmx_path, mtime):
+    key = hash_key('capability', gmx_path, mtime)
+    capability = load_capability(key)
+    if capability is None:
+        capability = probe_gromacs(gmx_path)
+        save_capability(key, capability)
+    return capability
+
+
+def get_capability(gmx=GMX_EXE):
+    """
+    capability of gmx, probed only once per binary
+    Input:
+        gmx: name or path of the gromacs executable
+    Output:
+        GromacsCapability
+    """
+    gmx_path = shutil.which(gmx)
+    if gmx_path is None:
+        raise OSError('There is no gromacs, Please check if gmx in PATH')
+    gmx_path = os.path.realpath(gmx_path)
+    return _get_capability(gmx_path, os.path.getmtime(gmx_path))
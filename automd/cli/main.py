@@ -8,6 +8,8 @@ from automd import __version__
 from importlib import import_module
 
 program = 'automd'
+PROFILE_FILE = 'automd.prof'
+PROFILE_LINES = 30
 
 class CLIError(Exception):
     """Error for CLI commands.
@@ -47,7 +49,13 @@ def main(prog=program, description='AutoMD command line tool.',
                         version='%(prog)s-{}'.format(version))
     parser.add_argument('-T', '--traceback', action='store_true')
     parser.add_argument('-D', '--debug', action='store_true')
-    parser.add_argument('-P', '--profile', action='store_true')
+    parser.add_argument('-P', '--profile', action='store_true',
+                        help='profile with cProfile, stats are printed '
+                        'and dumped to --profile_file; only the main thread '
+                        'is profiled, not the worker threads of run_many or '
+                        'replicas')
+    parser.add_argument('--profile_file', default=PROFILE_FILE,
+                        help=f'default: {PROFILE_FILE}')
     parser.add_argument('--nocheck', action='store_true')
     subparsers = parser.add_subparsers(title='Sub-commands',
                                        dest='command')
@@ -92,40 +100,46 @@ def main(prog=program, description='AutoMD command line tool.',
         args = parser.parse_args(args)
 
     if args.profile:
-        pass
-        # from cProfile import Profile
-        # prof = Profile()
-        # prof.enable()
-    if args.command == 'help':
-        if args.helpcommand is None:
-            parser.print_help()
-        else:
-            parsers[args.helpcommand].print_help()
-    elif args.command is None:
-        parser.print_usage()
-    else:
-        f = functions[args.command]
-        try:
-            if f.__code__.co_argcount == 1:
-                f(args)
-            else:
-                f(args, parsers[args.command])
-        except KeyboardInterrupt:
-            pass
-        except CLIError as x:
-            parser.error(x)
-        except Exception as x:
-            if args.traceback:
-                raise
+        from cProfile import Profile
+        prof = Profile()
+        prof.enable()
+    try:
+        if args.command == 'help':
+            if args.helpcommand is None:
+                parser.print_help()
             else:
-                l1 = '{}: {}\n'.format(x.__class__.__name__, x)
-                l2 = ('To get a full traceback, use: {} -T {} ...'
-                      .format(prog, args.command))
-                parser.error(l1 + l2)
-    if args.profile:
-        pass
-        # prof.create_stats()
-        # prof.print_stats()
+                parsers[args.helpcommand].print_help()
+        elif args.command is None:
+            parser.print_usage()
+        else:
+            f = functions[args.command]
+            try:
+                if f.__code__.co_argcount == 1:
+                    f(args)
+                else:
+                    f(args, parsers[args.command])
+            except KeyboardInterrupt:
+                pass
+            except CLIError as x:
+                parser.error(x)
+            except Exception as x:
+                if args.traceback:
+                    raise
+                else:
+                    l1 = '{}: {}\n'.format(x.__class__.__name__, x)
+                    l2 = ('To get a full traceback, use: {} -T {} ...'
+                          .format(prog, args.command))
+                    parser.error(l1 + l2)
+    finally:
+        # also after parser.error, which exits
+        if args.profile:
+            import pstats
+            prof.disable()
+            prof.dump_stats(args.profile_file)
+            stats = pstats.Stats(prof, stream=sys.stderr)
+            stats.sort_stats('cumulative').print_stats(PROFILE_LINES)
+            print(f'profile stats dumped to {args.profile_file}',
+                  file=sys.stderr)
 
 
 class Formatter(argparse.HelpFormatter):
@@ -27,13 +27,37 @@ class CLICommand:
         #                     help='Show more information about files.')
         # parser.add_argument('-k', '--key',
         #                     help='key to show')
-        parser.add_argument("input_file", type=str)
+        parser.add_argument("input_file", type=str, nargs='*',
+                            help="input structure file(s)")
+        parser.add_argument("--manifest", type=str, default=None,
+                            help="file listing one input file per line")
+        parser.add_argument("--total_cores", default=None, type=int,
+                            help="cores shared by all jobs of a batch, "
+                            "default: all available cores")
         parser.add_argument("--mdrun_file", nargs='?', type=str, default=None)
         parser.add_argument("--topfile", nargs='?', type=str, default=None)
         parser.add_argument("--dest_dir", default='.', type=str)
-        parser.add_argument("--max_core", default=4, type=int)
+        parser.add_argument("--max_core", default=4, type=int,
+                            help="maximum cores of a single job")
         parser.add_argument("--dry_run", action="store_true")
         parser.add_argument("--extract_forces", action="store_true")
+        parser.add_argument("--archive", type=str, default=None,
+                            help="append results to this columnar archive "
+                            "(index.csv + npz shards)")
+        parser.add_argument("--cache_results", action="store_true",
+                            help="reuse results of identical runs")
+        parser.add_argument("--resume", action="store_true",
+                            help="continue the run of dest_dir from "
+                            "its checkpoint")
+        parser.add_argument("--extend_time", default=None, type=float,
+                            help="lengthen the finished run of dest_dir, "
+                            "in time_unit")
+        parser.add_argument("--autotune", action="store_true",
+                            help="benchmark -ntmpi/-ntomp layouts once per "
+                            "host and system size, then use the fastest")
+        parser.add_argument("--obgmx_method", default='exe', type=str,
+                            choices=['exe', 'python'],
+                            help="UFF topology generator, default: exe")
         for key, value in default_mdrun_config.items():
             if isinstance(value, bool):
                 parser.add_argument(
@@ -49,7 +73,32 @@ class CLICommand:
         if args.debug:
             import json
             print(json.dumps(args.__dict__, indent=4))
-        results = automd.run(**args.__dict__)
-        if args.debug:
-            import json_tricks
-            print(json_tricks.dumps(results, allow_nan=True))
+        inputs = list(args.input_file)
+        if args.manifest:
+            inputs.extend(automd.batch.read_manifest(args.manifest))
+        if not inputs:
+            raise ValueError('input_file or --manifest is required')
+        kwargs = args.__dict__.copy()
+        for key in ['input_file', 'manifest', 'total_cores', 'archive']:
+            kwargs.pop(key)
+        archive = automd.ResultArchive(args.archive) if args.archive \
+            else None
+        try:
+            if len(inputs) == 1 and not args.manifest:
+                jobs = [(inputs[0], automd.run(inputs[0], **kwargs))]
+            else:
+                jobs = automd.run_many(
+                    inputs, total_cores=args.total_cores, **kwargs)
+            for input_file, results in jobs:
+                if archive is not None:
+                    archive.append(input_file, results)
+                if isinstance(results, Exception):
+                    print(f"{input_file}: failed, {results}")
+                    continue
+                print(f"{input_file}: done")
+                if args.debug:
+                    import json_tricks
+                    print(json_tricks.dumps(results, allow_nan=True))
+        finally:
+            if archive is not None:
+                archive.close()
@@ -0,0 +1,182 @@
+"""
+
+deduplication and clustering of isomers
+
+Frames are compared by Kabsch aligned RMSD or by an invariant fingerprint
+(sorted interatomic distances), both vectorized over the representatives.
+
+
+"""
+
+import numpy as np
+import modlog
+
+
+logger = modlog.getLogger(__name__)
+SUPPORTED_METHODS = ['fingerprint', 'rmsd']
+SUPPORTED_MODES = ['dedup', 'cluster']
+DEFAULT_THRESHOLDS = {'fingerprint': 0.1, 'rmsd': 0.5}
+CHUNK_FRAMES = 1024
+
+
+def get_fingerprints(positions):
+    """
+    sorted interatomic distances of frames
+    Input:
+        positions: (nframes, natoms, 3)
+    Output:
+        (nframes, natoms*(natoms-1)/2) array
+    """
+    positions = np.asarray(positions, dtype=float)
+    i, j = np.triu_indices(positions.shape[1], 1)
+    fingerprints = np.empty((len(positions), len(i)))
+    for start in range(0, len(positions), CHUNK_FRAMES):
+        chunk = positions[start:start+CHUNK_FRAMES]
+        dists = np.linalg.norm(chunk[:, i] - chunk[:, j], axis=-1)
+        fingerprints[start:start+CHUNK_FRAMES] = np.sort(dists, axis=1)
+    return fingerprints
+
+
+def fingerprint_distances(fingerprints, fingerprint):
+    """
+    RMS difference between one fingerprint and an array of fingerprints
+    """
+    return np.sqrt(((fingerprints - fingerprint) ** 2).mean(axis=1))
+
+
+def center_positions(positions):
+    positions = np.asarray(positions, dtype=float)
+    return positions - positions.mean(axis=-2, keepdims=True)
+
+
+def kabsch_rmsd(refs, positions):
+    """
+    RMSD after optimal superposition of positions on each of refs
+    Input:
+        refs: (nrefs, natoms, 3) centered positions
+        positions: (natoms, 3) centered positions
+    Output:
+        (nrefs,) array
+    """
+    natoms = positions.shape[0]
+    cov = np.einsum('kni,nj->kij', refs, positions)
+    u, s, vt = np.linalg.svd(cov)
+    sign = np.sign(np.linalg.det(u) * np.linalg.det(vt))
+    s[:, -1] *= sign
+    msd = ((refs ** 2).sum(axis=(1, 2)) + (positions ** 2).sum()
+           - 2 * s.sum(axis=1)) / natoms
+    return np.sqrt(np.maximum(msd, 0))
+
+
+def align_positions(positions, ref):
+    """
+    optimal superposition of frames on a reference
+    Input:
+        positions: (nframes, natoms, 3) centered positions
+        ref: (natoms, 3) centered positions
+    Output:
+        (nframes, natoms, 3) rotated positions
+    """
+    cov = np.einsum('kni,nj->kij', positions, ref)
+    u, _, vt = np.linalg.svd(cov)
+    sign = np.sign(np.linalg.det(u) * np.linalg.det(vt))
+    u[:, :, -1] *= sign[:, None]
+    return np.einsum('kni,kij->knj', positions, u @ vt)
+
+
+def cluster_positions(positions, method='fingerprint', threshold=None,
+                      mode='dedup'):
+    """
+    cluster frames of the same molecule
+    Input:
+        positions: (nframes, natoms, 3) in Angstrom
+        method: fingerprint/rmsd
+        threshold: frames within threshold (Angstrom) are duplicates,
+            default DEFAULT_THRESHOLDS[method]
+        mode: dedup, a frame joins the first representative within threshold
+              cluster, every frame is assigned to its nearest representative
+              and the representative is the member nearest to the mean
+              fingerprint of the cluster (fingerprint), or to the mean of
+              the members aligned on the first one (rmsd)
+    Output:
+        representatives: (nclusters,) frame indices
+        labels: (nframes,) cluster index of each frame
+    """
+    assert method in SUPPORTED_METHODS, f'method must be in {SUPPORTED_METHODS}'
+    assert mode in SUPPORTED_MODES, f'mode must be in {SUPPORTED_MODES}'
+    threshold = DEFAULT_THRESHOLDS[method] if threshold is None else threshold
+    positions = np.asarray(positions, dtype=float)
+    nframes = len(positions)
+    if method == 'rmsd':
+        features = center_positions(positions)
+
+        def distances(reps, index):
+            return kabsch_rmsd(features[reps], features[index])
+
+        def get_representative(members):
+            # linear in the cluster size, unlike the medoid
+            mean = align_positions(features[members],
+                                   features[members[0]]).mean(axis=0)
+            return members[np.argmin(kabsch_rmsd(features[members], mean))]
+    else:
+        fingerprints = get_fingerprints(positions)
+
+        def distances(reps, index):
+            return fingerprint_distances(
+                fingerprints[reps], fingerprints[index])
+
+        def get_representative(members):
+            mean = fingerprints[members].mean(axis=0)
+            return members[np.argmin(fingerprint_distances(
+                fingerprints[members], mean))]
+    labels = np.empty(nframes, dtype=int)
+    reps = list()
+    for index in range(nframes):
+        if reps:
+            dists = distances(reps, index)
+            nearest = int(np.argmin(dists))
+            if dists[nearest] <= threshold:
+                if mode == 'dedup':
+                    nearest = int(np.nonzero(dists <= threshold)[0][0])
+                labels[index] = nearest
+                continue
+        labels[index] = len(reps)
+        reps.append(index)
+    if mode == 'cluster':
+        reps = np.array(reps)
+        for index in range(nframes):
+            labels[index] = np.argmin(distances(reps, index))
+        for label in range(len(reps)):
+            members = np.nonzero(labels == label)[0]
+            if len(members) == 0:
+                continue
+            reps[label] = get_representative(members)
+    reps = np.array(reps, dtype=int)
+    logger.debug(f"{nframes} frames -> {len(reps)} clusters")
+    return reps, labels
+
+
+def deduplicate(structures, method='fingerprint', threshold=None,
+                mode='dedup'):
+    """
+    one representative structure per cluster
+    Input:
+        structures: list of structure arrays of the same molecule
+        method/threshold/mode: see cluster_positions
+    Output:
+        list of representative structures, each with cluster_size
+    """
+    structures = list(structures)
+    if not structures:
+        return []
+    positions = np.array([x['positions'] for x in structures])
+    reps, labels = cluster_positions(positions, method, threshold, mode)
+    sizes = np.bincount(labels, minlength=len(reps))
+    output = list()
+    for rep, size in zip(reps, sizes):
+        if size == 0:
+            continue
+        structure = dict(structures[rep])
+        structure['cluster_size'] = int(size)
+        output.append(structure)
+    return output
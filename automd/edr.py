@@ -0,0 +1,178 @@
+"""
+
+reader of gromacs energy files (.edr)
+
+The XDR frames are decoded directly to numpy arrays, no `gmx energy` and
+no xvg text is involved.
+
+
+"""
+
+import struct
+
+import numpy as np
+import modlog
+
+from .xdr import XDRBuffer
+
+
+logger = modlog.getLogger(__name__)
+ENX_MAGIC = -55555
+FRAME_MAGIC = -7777777
+ENX_VERSION = 5
+FIRST_REAL_TO_CHECK = -2e10
+# xdr_datatype of gromacs: int, float, double, int64, char, string
+BLOCK_ITEM_SIZES = {0: 4, 1: 4, 2: 8, 3: 8, 4: 4}
+BLOCK_STRING_TYPE = 5
+
+
+class EDRError(ValueError):
+    pass
+
+
+def read_energy_names(xdr):
+    """
+    names and units of the energy terms at the start of an edr file
+    Output:
+        file_version, names, units
+    """
+    magic = xdr.int()
+    if magic > 0:
+        raise EDRError('edr files of gromacs < 4.0 are not supported')
+    if magic != ENX_MAGIC:
+        raise EDRError('Energy names magic number mismatch, '
+                       'this is not a gromacs edr file')
+    file_version = xdr.int()
+    if file_version > ENX_VERSION:
+        raise EDRError(f'edr file version {file_version} is not supported')
+    nre = xdr.int()
+    names, units = list(), list()
+    for _ in range(nre):
+        names.append(xdr.string())
+        units.append(xdr.string() if file_version >= 2 else 'kJ/mol')
+    return file_version, names, units
+
+
+def get_real_size(xdr):
+    """
+    size of real of the file, from the first real of a frame header
+    """
+    single, = struct.unpack_from('>f', xdr.data, xdr.offset)
+    if single == np.float32(FIRST_REAL_TO_CHECK):
+        return 4
+    double, = struct.unpack_from('>d', xdr.data, xdr.offset)
+    if double == FIRST_REAL_TO_CHECK:
+        return 8
+    raise EDRError('edr frame header not recognized')
+
+
+def read_frame_header(xdr, real_size):
+    """
+    read a frame header and skip its data
+    Output:
+        dict, including t, step, nre, nsum and offset of energies
+    """
+    xdr.skip(real_size)
+    if xdr.int() != FRAME_MAGIC:
+        raise EDRError('Energy header magic number mismatch')
+    file_version = xdr.int()
+    if file_version < 4:
+        raise EDRError(f'edr file version {file_version} is not supported')
+    header = {'t': xdr.double(), 'step': xdr.int64()}
+    header['nsum'] = xdr.int()
+    header['nsteps'] = xdr.int64()
+    if file_version >= 5:
+        header['dt'] = xdr.double()
+    header['nre'] = xdr.int()
+    xdr.int()  # reserved
+    nblock = xdr.int()
+    subs = list()
+    for _ in range(nblock):
+        _, nsub = xdr.unpack('>2i')
+        for _ in range(nsub):
+            subs.append(xdr.unpack('>2i'))
+    xdr.skip(12)  # e_size and two reserved ints
+    header['offset'] = xdr.offset
+    # energies, with average and sum if nsum > 0
+    nvalues = 3 if header['nsum'] > 0 else 1
+    xdr.skip(header['nre'] * nvalues * real_size)
+    for typenr, nr in subs:
+        if typenr == BLOCK_STRING_TYPE:
+            for _ in range(nr):
+                xdr.int()
+                xdr.string()
+        elif typenr in BLOCK_ITEM_SIZES:
+            xdr.skip(nr * BLOCK_ITEM_SIZES[typenr])
+        else:
+            raise EDRError(f'unknown block type {typenr}')
+    return header
+
+
+def select_frames(nframes, frames=None):
+    """
+    indices of frames selected by None(all)/int/slice/list of int
+    """
+    indices = np.arange(nframes)
+    if frames is None:
+        return indices
+    if isinstance(frames, (int, np.integer)):
+        frames = [frames]
+    return np.atleast_1d(indices[frames])
+
+
+def read_edr(filename, terms=None, frames=None):
+    """
+    read energies of an edr file
+    Input:
+        filename: edr filename
+        terms: list of names of terms to read, default all terms
+        frames: None(all)/int/slice/list of int, frames to read
+    Output:
+        dict:
+            names: list of names of terms
+            units: list of units of terms
+            time: (nframes,) time in ps
+            step: (nframes,) steps
+            energies: (nframes, nterms) in units of the file
+    """
+    with open(filename, 'rb') as fd:
+        xdr = XDRBuffer(fd.read())
+    _, names, units = read_energy_names(xdr)
+    if terms is None:
+        columns = np.arange(len(names))
+    else:
+        missing = set(terms) - set(names)
+        if missing:
+            raise KeyError(f'{missing} not in energy terms {names}')
+        columns = np.array([names.index(term) for term in terms], dtype=int)
+    headers = list()
+    real_size = None
+    while not xdr.eof():
+        real_size = real_size or get_real_size(xdr)
+        try:
+            header = read_frame_header(xdr, real_size)
+        except struct.error:
+            logger.warning(f'{filename}: incomplete last frame')
+            break
+        if xdr.offset > len(xdr.data):
+            logger.warning(f'{filename}: incomplete last frame')
+            break
+        if header['nre'] > 0:
+            headers.append(header)
+    indices = select_frames(len(headers), frames)
+    dtype = '>f4' if real_size == 4 else '>f8'
+    energies = np.empty((len(indices), len(columns)))
+    for i, index in enumerate(indices):
+        header = headers[index]
+        nvalues = 3 if header['nsum'] > 0 else 1
+        values = np.frombuffer(
+            xdr.data, dtype=dtype, count=header['nre'] * nvalues,
+            offset=header['offset']).reshape((-1, nvalues))
+        energies[i] = values[columns, 0]
+    return {
+        'names': [names[i] for i in columns],
+        'units': [units[i] for i in columns],
+        'time': np.array([headers[i]['t'] for i in indices]),
+        'step': np.array([headers[i]['step'] for i in indices], dtype=int),
+        'energies': energies,
+    }
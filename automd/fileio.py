@@ -0,0 +1,236 @@
+"""
+
+native readers/writers of the structure formats used by automd
+
+xyz, pdb (first or any MODEL) and gro are parsed directly to arrays,
+other formats fall back to gaseio and then chemio.
+
+
+"""
+
+import os
+import re
+
+import numpy as np
+import modlog
+
+from .obgmx.perception import get_element_table
+
+
+logger = modlog.getLogger(__name__)
+NM_TO_ANG = 10.0
+# vacuum around the molecule when the input has no cell, in Angstrom,
+# larger than twice the 1.0 nm cut-off of the default mdp files
+DEFAULT_BOX_MARGIN = 10.0
+GRO_RESNAME = 'MOL'
+
+
+def get_format(filename, input_format=None):
+    """
+    xyz/pdb/gro if the native reader applies, else None
+    """
+    if input_format:
+        return {'gromacs': 'gro'}.get(input_format, input_format)
+    if not isinstance(filename, str):
+        return None
+    ext = os.path.splitext(filename)[-1].lower().lstrip('.')
+    return ext if ext in NATIVE_READERS else None
+
+
+def read_xyz(filename):
+    with open(filename) as fd:
+        natoms = int(fd.readline().split()[0])
+        fd.readline()
+        lines = [fd.readline().split() for _ in range(natoms)]
+    symbols = [line[0] for line in lines]
+    positions = np.array([line[1:4] for line in lines], dtype=float)
+    return {'symbols': symbols, 'positions': positions}
+
+
+def write_xyz(filename, arrays):
+    positions = np.asarray(arrays['positions'], dtype=float)
+    lines = [str(len(positions)), str(arrays.get('comment', ''))]
+    lines += [f'{symbol:<2s} {x:16.8f} {y:16.8f} {z:16.8f}'
+              for symbol, (x, y, z) in zip(arrays['symbols'], positions)]
+    with open(filename, 'w') as fd:
+        fd.write('\n'.join(lines) + '\n')
+
+
+def get_pdb_symbol(line):
+    symbol = line[76:78].strip()
+    if not symbol:
+        # element from the atom name, two letters only if left aligned
+        name = line[12:16]
+        letters = ''.join(c for c in name if c.isalpha())
+        symbol = letters[:2] if name[0] != ' ' else letters[:1]
+    return symbol[0].upper() + symbol[1:].lower()
+
+
+def get_cell_from_parameters(a, b, c, alpha, beta, gamma):
+    """
+    cell vectors (3, 3) of lattice parameters, a along x
+    """
+    alpha, beta, gamma = np.radians([alpha, beta, gamma])
+    cx = np.cos(beta)
+    cy = (np.cos(alpha) - np.cos(beta) * np.cos(gamma)) / np.sin(gamma)
+    cz = np.sqrt(max(1 - cx ** 2 - cy ** 2, 0))
+    return np.array([[a, 0, 0],
+                     [b * np.cos(gamma), b * np.sin(gamma), 0],
+                     [c * cx, c * cy, c * cz]])
+
+
+def read_pdb(filename, index=0):
+    """
+    read a MODEL of a pdb file
+    Input:
+        filename: pdb filename
+        index: index of MODEL, default the first one
+    Output:
+        dict, including symbols and positions (Angstrom), cell if CRYST1
+    """
+    models = [list()]
+    cell = None
+    with open(filename) as fd:
+        for line in fd:
+            if line.startswith(('ATOM', 'HETATM')):
+                models[-1].append((get_pdb_symbol(line), line[30:38],
+                                   line[38:46], line[46:54]))
+            elif line.startswith('CRYST1'):
+                params = [float(x) for x in line[6:54].split()]
+                if params[0] > 1 and params[1] > 1 and params[2] > 1:
+                    cell = get_cell_from_parameters(*params)
+            elif line.startswith('ENDMDL') and models[-1]:
+                if len(models) > index >= 0:
+                    break
+                models.append(list())
+    models = [model for model in models if model]
+    if not models:
+        raise ValueError(f'no atoms in {filename}')
+    symbols = [atom[0] for atom in models[index]]
+    positions = [atom[1:] for atom in models[index]]
+    arrays = {'symbols': symbols,
+              'positions': np.array(positions, dtype=float)}
+    if cell is not None:
+        arrays['cell'] = cell
+        arrays['pbc'] = np.array([True, True, True])
+    return arrays
+
+
+def get_gro_symbol(name):
+    """
+    element of a gro atom name, e.g. C1, Cl2, C_3
+    """
+    letters = re.match(r'[A-Za-z]*', name).group()
+    if letters[:2].capitalize() in get_element_table():
+        return letters[:2].capitalize()
+    return letters[:1].upper()
+
+
+def parse_gro_frame(fd, atoms=None):
+    """
+    parse the gro frame starting at the position of a text file object
+    Input:
+        fd: file object
+        atoms: None(all)/list of int/slice, atoms to keep
+    Output:
+        dict, including symbols, positions and cell (Angstrom)
+    """
+    title = fd.readline().strip()
+    natoms = int(fd.readline().split()[0])
+    lines = [fd.readline() for _ in range(natoms)]
+    box = [float(x) for x in fd.readline().split()]
+    if atoms is not None:
+        lines = list(np.array(lines, dtype=object)[atoms])
+    names = [line[10:15].strip() for line in lines]
+    symbols = [get_gro_symbol(name) for name in names]
+    positions = np.array([[line[20:28], line[28:36], line[36:44]]
+                          for line in lines], dtype=float).reshape((-1, 3)) \
+        * NM_TO_ANG
+    cell = np.diag(box[:3])
+    if len(box) == 9:
+        cell[0, 1], cell[0, 2], cell[1, 0], cell[1, 2], cell[2, 0], \
+            cell[2, 1] = box[3:]
+    return {'symbols': symbols, 'positions': positions, 'names': names,
+            'cell': cell * NM_TO_ANG, 'pbc': np.array([True, True, True]),
+            'comment': title}
+
+
+def read_gro(filename):
+    """
+    read the first frame of a gro file
+    Output:
+        dict, including symbols, positions and cell (Angstrom)
+    """
+    with open(filename) as fd:
+        return parse_gro_frame(fd)
+
+
+def write_gro(filename, arrays, title=None):
+    """
+    write arrays (Angstrom) to a gro file, one residue GRO_RESNAME
+    """
+    positions = np.asarray(arrays['positions'], dtype=float) / NM_TO_ANG
+    cell = np.asarray(arrays.get('cell', np.zeros((3, 3))),
+                      dtype=float).reshape((3, 3)) / NM_TO_ANG
+    names = arrays.get('names', arrays['symbols'])
+    lines = [title or str(arrays.get('comment', '')) or 'automd',
+             f'{len(positions):5d}']
+    for i, (name, (x, y, z)) in enumerate(zip(names, positions)):
+        lines.append(f'{1:5d}{GRO_RESNAME:<5s}{name[:5]:>5s}'
+                     f'{(i + 1) % 100000:5d}{x:8.3f}{y:8.3f}{z:8.3f}')
+    box = [cell[0, 0], cell[1, 1], cell[2, 2]]
+    if np.count_nonzero(cell - np.diag(box)):
+        box += [cell[0, 1], cell[0, 2], cell[1, 0],
+                cell[1, 2], cell[2, 0], cell[2, 1]]
+    lines.append(''.join(f'{x:10.5f}' for x in box))
+    with open(filename, 'w') as fd:
+        fd.write('\n'.join(lines) + '\n')
+
+
+def center_structure(arrays, margin=DEFAULT_BOX_MARGIN):
+    """
+    put the geometric center of the molecule at the center of its cell,
+    as `gmx editconf -c`; a rectangular cell of the molecule extent plus
+    margin on each side is used if the input has no cell
+    Output:
+        new arrays with centered positions and cell (Angstrom)
+    """
+    arrays = dict(arrays)
+    positions = np.asarray(arrays['positions'], dtype=float)
+    cell = np.asarray(arrays.get('cell', np.zeros((3, 3))),
+                      dtype=float).reshape((3, 3))
+    if not np.all(np.linalg.norm(cell, axis=1) > 0):
+        extent = positions.max(axis=0) - positions.min(axis=0)
+        cell = np.diag(extent + 2 * margin)
+    center = positions.mean(axis=0)
+    arrays['positions'] = positions - center + cell.sum(axis=0) / 2
+    arrays['cell'] = cell
+    return arrays
+
+
+NATIVE_READERS = {
+    'xyz': read_xyz,
+    'pdb': read_pdb,
+    'gro': read_gro,
+}
+
+
+def read_structure(filename, input_format=None):
+    """
+    read the first frame of a structure file to arrays
+    Input:
+        filename: structure file
+        input_format: format of the file, default guessed from extension,
+            formats without a native reader are read by gaseio/chemio
+    Output:
+        dict, including symbols and positions (Angstrom)
+    """
+    fmt = get_format(filename, input_format)
+    if fmt in NATIVE_READERS:
+        return NATIVE_READERS[fmt](filename)
+    try:
+        import gaseio
+        return gaseio.read(filename, format=input_format, force_gase=True)
+    except Exception as e:
+        import chemio
+        return chemio.read(filename, format=input_format)
@@ -0,0 +1,362 @@
+"""
+
+byte offset index of the frames of trajectory files
+
+The offset, size and step of every complete frame of a gro, xtc, trr or edr
+file are stored next to it in `<file>.offsets.npz`, so frame k is read with
+one seek instead of parsing everything in front of it. The index remembers
+how many bytes it covers and hashes of the start of the file and of its
+last indexed frame: a file that grew, e.g. while mdrun is running, is
+indexed from the end of the last complete frame on, a file that was
+rewritten is indexed again.
+
+    for header, coords in read_xtc_frames('topol.xtc', frames=[-1]):
+        ...
+
+
+"""
+
+import os
+import io
+import re
+import mmap
+import struct
+import hashlib
+
+import numpy as np
+import modlog
+
+from . import edr
+from . import trr
+from . import xtc
+from .xdr import XDRBuffer
+from .fileio import parse_gro_frame
+
+
+logger = modlog.getLogger(__name__)
+INDEX_SUFFIX = '.offsets.npz'
+INDEX_COLUMNS = ['offset', 'size', 'step', 'flags']
+# bytes at the start of a file hashed to detect a rewritten file
+HEAD_SIZE = 4096
+GRO_STEP_PATTERN = re.compile(rb'step=\s*(\d+)')
+
+
+class FrameIndexError(ValueError):
+    pass
+
+
+def get_index_filename(filename):
+    return filename + INDEX_SUFFIX
+
+
+def get_head_hash(fd, size):
+    fd.seek(0)
+    return hashlib.sha256(fd.read(min(size, HEAD_SIZE))).hexdigest()
+
+
+def get_tail_hash(fd, index):
+    """
+    hash of the last indexed frame, bytes [offset[-1], end) of the file
+    """
+    start = int(index['offset'][-1]) if len(index['offset']) else 0
+    fd.seek(start)
+    return hashlib.sha256(fd.read(int(index['end']) - start)).hexdigest()
+
+
+def scan_xdr(data, offset, read_header):
+    """
+    complete frames of a xdr file from offset on
+    Output:
+        list of (offset, size, header), offset after the last complete frame
+    """
+    frames = list()
+    xdr = XDRBuffer(data, offset)
+    while not xdr.eof():
+        start = xdr.offset
+        try:
+            header = read_header(xdr)
+        except struct.error:
+            break
+        if xdr.offset > len(data):
+            break
+        frames.append((start, xdr.offset - start, header))
+        offset = xdr.offset
+    return frames, offset
+
+
+def scan_xtc(data, offset):
+    frames, end = scan_xdr(data, offset, xtc.read_frame_header)
+    return [(start, size, header['step'], 0)
+            for start, size, header in frames], end
+
+
+def scan_trr(data, offset):
+    frames, end = scan_xdr(data, offset, trr.read_frame_header)
+    return [(start, size, header['step'],
+             sum(1 << i for i, key in enumerate(trr.TRR_BLOCKS)
+                 if header[key] is not None))
+            for start, size, header in frames], end
+
+
+def scan_edr(data, offset):
+    xdr = XDRBuffer(data, offset)
+    if offset == 0:
+        try:
+            edr.read_energy_names(xdr)
+        except struct.error:
+            return list(), 0
+    if xdr.eof():
+        return list(), xdr.offset
+    real_size = edr.get_real_size(xdr)
+    frames, end = scan_xdr(data, xdr.offset,
+                           lambda x: edr.read_frame_header(x, real_size))
+    # frames without energies are not counted, as by edr.read_edr
+    return [(start, size, header['step'], 0)
+            for start, size, header in frames if header['nre'] > 0], end
+
+
+def scan_gro(data, offset):
+    frames = list()
+    while offset < len(data):
+        title_end = data.find(b'\n', offset)
+        natoms_end = data.find(b'\n', title_end + 1)
+        if title_end < 0 or natoms_end < 0:
+            break
+        if not data[offset:natoms_end].strip():
+            # blank lines at the end of the file
+            break
+        try:
+            natoms = int(data[title_end+1:natoms_end].split()[0])
+        except (ValueError, IndexError):
+            raise FrameIndexError(f'bad gro frame at byte {offset}')
+        end = natoms_end
+        # atom lines and the box line
+        for _ in range(natoms + 1):
+            end = data.find(b'\n', end + 1)
+            if end < 0:
+                break
+        if end < 0:
+            break
+        match = GRO_STEP_PATTERN.search(data, offset, title_end)
+        step = int(match[1]) if match else -1
+        frames.append((offset, end + 1 - offset, step, 0))
+        offset = end + 1
+    return frames, offset
+
+
+SCANNERS = {
+    '.xtc': scan_xtc,
+    '.trr': scan_trr,
+    '.edr': scan_edr,
+    '.gro': scan_gro,
+}
+
+
+def get_scanner(filename):
+    ext = os.path.splitext(filename)[-1]
+    if ext not in SCANNERS:
+        raise FrameIndexError(f'no frame index for {filename}')
+    return SCANNERS[ext]
+
+
+def load_index(filename):
+    try:
+        with np.load(get_index_filename(filename)) as data:
+            return {key: data[key] for key in data.files}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_index(filename, index):
+    index_filename = get_index_filename(filename)
+    try:
+        with open(index_filename + '.tmp', 'wb') as fd:
+            np.savez(fd, **index)
+        os.replace(index_filename + '.tmp', index_filename)
+    except OSError as e:
+        logger.debug(f"cannot save frame index {index_filename}: {e}")
+
+
+def get_frame_index(filename):
+    """
+    frame index of a trajectory file, updated if the file changed
+    Output:
+        dict of (nframes,) arrays: offset, size, step and flags (blocks of
+        trr frames, bit i for trr.TRR_BLOCKS[i]), and end, the number of
+        bytes indexed, head and tail, hashes of the start of the file and
+        of the last indexed frame
+    """
+    scan = get_scanner(filename)
+    size = os.path.getsize(filename)
+    index = load_index(filename)
+    start = 0
+    with open(filename, 'rb') as fd:
+        if index is not None:
+            # frames indexed before are kept if the file only grew
+            if int(index['end']) <= size and str(index['head']) == \
+                    get_head_hash(fd, int(index['head_size'])) and \
+                    str(index.get('tail')) == get_tail_hash(fd, index):
+                start = int(index['end'])
+            else:
+                index = None
+        head_size = min(size, HEAD_SIZE)
+        if index is not None and start == size and \
+                head_size == int(index['head_size']):
+            return index
+        head = get_head_hash(fd, head_size)
+        if size == 0:
+            frames, end = list(), 0
+        else:
+            with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                frames, end = scan(data, start)
+        new = np.array(frames, dtype=np.int64).reshape((-1, 4))
+        old = {key: index[key] for key in INDEX_COLUMNS} \
+            if index is not None else dict()
+        index = {key: np.concatenate([old.get(key, np.empty(0, np.int64)),
+                                      new[:, i]])
+                 for i, key in enumerate(INDEX_COLUMNS)}
+        index.update(end=np.int64(end), head=np.array(head),
+                     head_size=np.int64(head_size))
+        index['tail'] = np.array(get_tail_hash(fd, index))
+    logger.debug(f"frame index {filename}: {len(new)} frames from byte "
+                 f"{start}, {len(index['offset'])} frames")
+    save_index(filename, index)
+    return index
+
+
+def get_frames(index, frames=None, flag=None):
+    """
+    positions in index of frames selected by None(all)/int/slice/list of
+    int, counting only frames having all trr blocks of flag if given
+    """
+    positions = np.arange(len(index['offset']))
+    if flag is not None:
+        positions = positions[(index['flags'] & flag) == flag]
+    return positions[edr.select_frames(len(positions), frames)]
+
+
+def iread_frames(filename, positions, index):
+    """
+    iterate bytes of the frames at positions of index
+    """
+    with open(filename, 'rb') as fd:
+        for i in positions:
+            fd.seek(index['offset'][i])
+            yield fd.read(index['size'][i])
+
+
+def get_trr_flag(key):
+    return 1 << trr.TRR_BLOCKS.index(key)
+
+
+def read_frame_steps(filename, keys=None):
+    """
+    steps of the frames of a trajectory, of trr frames having blocks keys
+    """
+    index = get_frame_index(filename)
+    flag = sum(get_trr_flag(key) for key in keys) if keys else None
+    return index['step'][get_frames(index, flag=flag)]
+
+
+def read_xtc_frames(filename, frames=None, atoms=None):
+    """
+    iterate selected frames of a xtc file
+    Input:
+        frames: None(all)/int/slice/list of int
+        atoms: None(all)/int/slice/list of int
+    Output:
+        generator of (header, (natoms, 3) coordinates in nm)
+    """
+    index = get_frame_index(filename)
+    for data in iread_frames(filename, get_frames(index, frames), index):
+        header = xtc.read_frame_header(XDRBuffer(data))
+        coords = xtc.read_frame_coords(data, header)
+        yield header, coords if atoms is None else coords[atoms]
+
+
+def read_trr_frames(filename, keys=('f',), frames=None, atoms=None,
+                    dtype=np.float64, scale=1.0):
+    """
+    read blocks of selected frames of a trr file
+    Input:
+        keys: x/v/f/box, blocks to read, frames count the frames having
+            all of them
+        frames: None(all)/int/slice/list of int
+        atoms: None(all)/int/slice/list of int, ignored for box
+        scale: factor multiplied to the values, e.g. for unit conversion
+    Output:
+        headers, {key: (nframes, natoms, 3) array, (nframes, 3, 3) for box}
+    """
+    index = get_frame_index(filename)
+    positions = get_frames(index, frames,
+                           sum(get_trr_flag(key) for key in keys))
+    headers, values = list(), {key: list() for key in keys}
+    for data in iread_frames(filename, positions, index):
+        header = trr.read_frame_header(XDRBuffer(data))
+        headers.append(header)
+        for key in keys:
+            nitems = 3 if key == 'box' else header['natoms']
+            array = np.frombuffer(
+                data, dtype='>f4' if header['real_size'] == 4 else '>f8',
+                count=nitems * 3, offset=header[key]).reshape((nitems, 3))
+            if atoms is not None and key != 'box':
+                array = array[atoms]
+            values[key].append(np.asarray(array * scale, dtype=dtype))
+    empty_shape = {'box': (0, 3, 3)}
+    return headers, {key: np.array(value, dtype=dtype) if value else
+                     np.empty(empty_shape.get(key, (0, 0, 3)), dtype=dtype)
+                     for key, value in values.items()}
+
+
+def read_edr_frames(filename, terms=None, frames=None):
+    """
+    read energies of selected frames of an edr file
+    Output:
+        dict as edr.read_edr
+    """
+    index = get_frame_index(filename)
+    positions = get_frames(index, frames)
+    with open(filename, 'rb') as fd:
+        head = fd.read(index['offset'][0] if len(index['offset']) else
+                       index['end'])
+    _, names, units = edr.read_energy_names(XDRBuffer(head))
+    if terms is None:
+        columns = np.arange(len(names))
+    else:
+        missing = set(terms) - set(names)
+        if missing:
+            raise KeyError(f'{missing} not in energy terms {names}')
+        columns = np.array([names.index(term) for term in terms], dtype=int)
+    times, steps = list(), list()
+    energies = np.empty((len(positions), len(columns)))
+    for i, data in enumerate(iread_frames(filename, positions, index)):
+        xdr = XDRBuffer(data)
+        real_size = edr.get_real_size(xdr)
+        header = edr.read_frame_header(xdr, real_size)
+        nvalues = 3 if header['nsum'] > 0 else 1
+        values = np.frombuffer(
+            data, dtype='>f4' if real_size == 4 else '>f8',
+            count=header['nre'] * nvalues,
+            offset=header['offset']).reshape((-1, nvalues))
+        energies[i] = values[columns, 0]
+        times.append(header['t'])
+        steps.append(header['step'])
+    return {
+        'names': [names[i] for i in columns],
+        'units': [units[i] for i in columns],
+        'time': np.array(times),
+        'step': np.array(steps, dtype=int),
+        'energies': energies,
+    }
+
+
+def read_gro_frames(filename, frames=None, atoms=None):
+    """
+    read selected frames of a gro file
+    Output:
+        list of dict, see fileio.parse_gro_frame
+    """
+    index = get_frame_index(filename)
+    return [parse_gro_frame(io.StringIO(data.decode()), atoms)
+            for data in iread_frames(filename, get_frames(index, frames),
+                                     index)]
@@ -7,12 +7,12 @@ utils of gromacs
 
 import os
 import re
+import glob
 import shutil
 import subprocess
-import configparser
 import json
+import hashlib
 from distutils.version import LooseVersion
-from io import StringIO
 import warnings
 
 import modlog
@@ -20,9 +20,17 @@ import numpy as np
 from jinja2 import FileSystemLoader, Environment
 
 import atomtools.unit
+from . import affinity
+from . import capability
+from . import edr
+from . import frameindex
+from . import telemetry
+from . import trr
+from .cache import DiskCache, hash_key, hash_files
+from .topology import load_topology, read_with_includes
+from .fileio import read_structure, write_gro, center_structure
 from .default_config import default_mdrun_config
 import time
-from timer import timer
 
 
 os.environ['GMX_MAXBACKUP'] = '-1'
@@ -35,11 +43,23 @@ INPUT_XYZ = 'input.xyz'
 TOP_FILE = 'obgmx.top'
 ITP_FILE = 'obgmx.itp'
 GRO_FILE = 'input.gro'
+RERUN_TRR = 'rerun.trr'
 OUTPUT_GRO = 'output.gro'
 TRR_FILE = 'traj.trr'
 EDR_FILE = 'topol.edr'
 XTC_FILE = 'topol.xtc'
+FORCES_NPY = 'forces.npy'
+# frames read at once by a selection of extract_forces
+FORCES_CHUNK_FRAMES = 256
 MDRUN_TEMP = 'mdrun_temp.mdp'
+TPR_FILE = 'topol.tpr'
+TPR_CACHE = DiskCache('tpr')
+CPT_FILE = 'topol.cpt'
+LOG_FILE = 'topol.log'
+# seconds between two reads of the -v output of mdrun for progress
+PROGRESS_INTERVAL = 1.0
+# minutes between two checkpoints written by mdrun
+CHECKPOINT_INTERVAL = float(os.environ.get('AUTOMD_CHECKPOINT_INTERVAL', 15))
 
 BASEDIR = os.path.dirname(os.path.realpath(__file__))
 logger = modlog.getLogger(__name__)
@@ -72,27 +92,14 @@ def format_convert(inputfile, outputfile, outputformat, extra_data=None):
 
 
 def get_gromacs_config():
-    exit_code, output = subprocess.getstatusoutput(
-        r"""gmx --version  | grep :\ """)
-    if exit_code != 0:
-        raise OSError('There is no gromacs, Please check if gmx in PATH')
-    # test gromacs version
-    conf = configparser.ConfigParser(delimiters=(':',), )
-    conf.read_string('[gromacs]\n' + output)
-    conf = conf._sections['gromacs']
-
+    conf = capability.get_capability().config
     logger.debug(json.dumps(conf, indent=4))
     return conf
 
 
 def get_gromacs_version():
-    GROMACS_VERSION_PATTERN = r'VERSION\s+(.*)\s*'
-    conf = get_gromacs_config()
-    version_string = conf['gromacs']
-
-    logger.debug(f'version_string: {version_string}')
-    pattern = re.compile(GROMACS_VERSION_PATTERN, re.IGNORECASE)
-    version = re.findall(pattern, version_string)[0]
+    version = capability.get_capability().version
+    logger.debug(f'version: {version}')
     return version
 
 
@@ -112,30 +119,61 @@ def test_gromacs():
     return True
 
 
-def generate_gromacs_grofile(filename, dest_dir='.', notcenter: bool = False):
+def generate_gromacs_grofile(filename, dest_dir='.', notcenter: bool = False,
+                             structure=None):
+    """
+    write GRO_FILE of the input in dest_dir, centered in its box
+    Input:
+        filename: structure file
+        dest_dir: destination directory
+        notcenter: keep coordinates as they are
+        structure: parsed arrays of filename, read from filename if None
+    Output:
+        realpath of the gro file
+    """
     write_filename = os.path.realpath(f"{dest_dir}/{GRO_FILE}")
-    format_convert(filename, write_filename, outputformat='gromacs',
-                   extra_data={'filename': GRO_FILE})
-    # try:
-    #     import gaseio
-    #     x = gaseio.read(filename, force_gase=True)
-    #     x['filename'] = GRO_FILE
-    #     gaseio.write(write_filename, x, format="gromacs")
-    # except:
-    #     import chemio
-    #     chemio.convert(filename, write_filename=write_filename,
-    #                    write_format='gromacs', data={'filename': GRO_FILE})
-    # centerize
+    if structure is None:
+        structure = read_structure(filename)
     if not notcenter:
-        cmd = f'cd {dest_dir}; gmx editconf -c -f {write_filename} -o {write_filename} \
-                > editconf.log 2>editconf.err'
-        logger.debug(f'grompp cmd: \n{cmd}')
-        exit_code = os.system(cmd)
-        if exit_code != 0:
-            warnings.warn("Gromacs editconf centerize molecule fail")
+        structure = center_structure(structure)
+    write_gro(write_filename, structure, title=GRO_FILE)
     return write_filename
 
 
+def get_rerun_structures(structures):
+    """
+    structures as frames of a rerun: kept if they have a cell, else
+    centered in a cell of their extent, see fileio.center_structure
+    """
+    frames = list()
+    for structure in structures:
+        cell = structure.get('cell')
+        if cell is None or not np.any(cell):
+            structure = center_structure(structure)
+        frames.append(structure)
+    natoms = {len(x['positions']) for x in frames}
+    if len(natoms) > 1:
+        raise ValueError(f'structures of a rerun have {natoms} atoms')
+    return frames
+
+
+def write_rerun_trajectory(structures, dest_dir='.'):
+    """
+    write structures (Angstrom) as frames of RERUN_TRR in dest_dir
+    Output:
+        realpath of the trr file
+    """
+    utrans = float(atomtools.unit.trans_length('Ang', 'nm'))
+    filename = os.path.realpath(f"{dest_dir}/{RERUN_TRR}")
+    trr.write_trr(
+        filename,
+        [np.asarray(x['positions'], dtype=float) * utrans
+         for x in structures],
+        [np.asarray(x['cell'], dtype=float).reshape((3, 3)) * utrans
+         for x in structures])
+    return filename
+
+
 def generate_gromacs_topfile(
     filename, input_format=None,
     obgmx_method='exe', dest_dir='.',
@@ -143,35 +181,36 @@ def generate_gromacs_topfile(
     use_geom_angle=False,
     use_geom_dihedral=False,
     use_harmonic_angle=False,
+    use_cache=True,
+    structure=None,
 ):
     from . import obgmx
     top_fname, itp_fname = obgmx.generate_gromacs_obgmx_UFF_topfile(
         filename, input_format, obgmx_method, dest_dir,
         use_geom_bond, use_geom_angle,
-        use_geom_dihedral, use_harmonic_angle)
+        use_geom_dihedral, use_harmonic_angle, use_cache, structure)
     return top_fname, itp_fname
 
 
 def set_gro_element_name_with_top(
         gro_filename: str = GRO_FILE,
         top_filename: str = TOP_FILE,
-        itp_filename: str = ITP_FILE):
-    top_filename = top_filename or TOP_FILE
+        itp_filename: str = ITP_FILE,
+        topology=None):
+    """
+    set atom names of the gro file to the atom types of the topology
+    Input:
+        gro_filename/top_filename/itp_filename: filenames
+        topology: parsed Topology, loaded from itp_filename if None
+    """
     itp_filename = itp_filename or ITP_FILE
     gro_filename = gro_filename or GRO_FILE
-    with open(itp_filename) as fd:
-        top_string = fd.read()
-    atoms_section = re.split(
-        r'\s*\[\s*atoms\s*\]\s+|\s*\[\s*bonds\s*\]\s+', top_string)[1]
-    element_names = list()
-    for line in atoms_section.split('\n')[1:]:
-        element_names.append(line.split()[1])
+    topology = topology or load_topology(itp_filename)
     with open(gro_filename) as fd:
         gro_lines = fd.readlines()
-    for i, (line, new_name) in enumerate(zip(gro_lines[2:-1], element_names)):
-        line = list(line)
-        line[10:15] = list('%5s' % (new_name))
-        gro_lines[i+2] = ''.join(line)
+    for i, new_name in enumerate(topology.atoms['type'][:len(gro_lines)-3]):
+        line = gro_lines[i+2]
+        gro_lines[i+2] = f'{line[:10]}{new_name[:5]:>5s}{line[15:]}'
     gro_string = ''.join(gro_lines)
     with open(gro_filename, 'w') as fd:
         fd.write(gro_string)
@@ -228,154 +267,533 @@ def generate_mdrun_file(mdrun_file=None, runtype='md', dest_dir='.', **kwargs):
     return dest_mdrun
 
 
-def exec_grompp(mdrun_filename=MDRUN_FILE, top_filename=TOP_FILE,
+def read_mdp_options(mdrun_filename):
+    """
+    {option: value} of a mdp file, '_' in options replaced by '-'
+    """
+    options = dict()
+    with open(mdrun_filename) as fd:
+        for line in fd:
+            line = line.split(';')[0]
+            if '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            options[key.strip().lower().replace('_', '-')] = value.strip()
+    return options
+
+
+def set_mdp_options(mdrun_filename, options):
+    """
+    set options of a mdp file in place, replacing existing lines
+    Input:
+        mdrun_filename: mdp file
+        options: {option: value}, '_' and '-' in options are equivalent
+    """
+    options = {key.lower().replace('_', '-'): value
+               for key, value in options.items()}
+    with open(mdrun_filename) as fd:
+        lines = fd.read().split('\n')
+    for i, line in enumerate(lines):
+        key = line.split(';')[0].split('=')[0].strip().lower().replace('_', '-')
+        if '=' in line.split(';')[0] and key in options:
+            lines[i] = f'{key:<13s} = {options.pop(key)}'
+    lines += [f'{key:<13s} = {value}' for key, value in options.items()]
+    with open(mdrun_filename, 'w') as fd:
+        fd.write('\n'.join(lines) + '\n')
+
+
+def is_reproducible_mdp(mdrun_filename):
+    """
+    False if grompp draws a random seed, i.e. gen-vel with gen-seed -1
+    """
+    options = read_mdp_options(mdrun_filename)
+    return options.get('gen-vel', 'no').lower() != 'yes' or \
+        options.get('gen-seed', '-1') != '-1'
+
+
+def get_tpr_key(mdrun_filename=MDRUN_FILE, top_filename=TOP_FILE,
                 gro_filename=GRO_FILE, dest_dir='.'):
-    # """gmx grompp to generate important files"""
-    # generate_mdrun_file(mdrun_file=mdrun_file)
-    cmd = f'cd {dest_dir}; gmx grompp -f {mdrun_filename} \
--p {top_filename} -c {gro_filename} \
->log_grompp.log 2>log_grompp.err'
-    logger.debug(f'grompp cmd: \n{cmd}')
-    exit_code = os.system(cmd)
-    if exit_code != 0:
-        raise OSError('grompp error')
-    return mdrun_filename
+    """
+    cache key of topol.tpr: content hash of the mdp, the top with its local
+    #include files and the gro, and the gromacs binary
+    """
+    gmx_capability = capability.get_capability()
+    top_string = read_with_includes(os.path.join(dest_dir, top_filename))
+    return hash_key(
+        'tpr', gmx_capability.gmx_path, gmx_capability.version,
+        hash_files(os.path.join(dest_dir, mdrun_filename),
+                   os.path.join(dest_dir, gro_filename)),
+        hashlib.sha256(top_string.encode()).hexdigest())
+
+
+def lookup_tpr(mdrun_filename=MDRUN_FILE, top_filename=TOP_FILE,
+               gro_filename=GRO_FILE, dest_dir='.'):
+    """
+    copy topol.tpr of identical inputs from TPR_CACHE to dest_dir
+    Output:
+        (hit, cache_key), cache_key is None if the inputs are not cacheable
+    """
+    if not is_reproducible_mdp(os.path.join(dest_dir, mdrun_filename)):
+        return False, None
+    cache_key = get_tpr_key(
+        mdrun_filename, top_filename, gro_filename, dest_dir)
+    entry = TPR_CACHE.get(cache_key)
+    if entry is None:
+        return False, cache_key
+    shutil.copyfile(os.path.join(entry, TPR_FILE),
+                    os.path.join(dest_dir, TPR_FILE))
+    logger.debug(f"tpr cache hit: {cache_key}")
+    return True, cache_key
 
 
-def get_help_text():
-    help_cmd = f'gmx mdrun -h'
-    _, help_text = subprocess.getstatusoutput(help_cmd)
-    return help_text
+def save_tpr(cache_key, dest_dir='.'):
+    TPR_CACHE.put(cache_key, {TPR_FILE: os.path.join(dest_dir, TPR_FILE)})
 
 
-def exec_mdrun(maxcore=4, device='cpu', dest_dir='.'):
+def get_grompp_args(mdrun_filename=MDRUN_FILE, top_filename=TOP_FILE,
+                    gro_filename=GRO_FILE):
     """
-    execute mdrun, the main part of MD simulation
+    argv of gmx grompp
+    """
+    return ['gmx', 'grompp', '-f', mdrun_filename, '-p', top_filename,
+            '-c', gro_filename, '-o', TPR_FILE]
+
+
+def exec_grompp(mdrun_filename=MDRUN_FILE, top_filename=TOP_FILE,
+                gro_filename=GRO_FILE, dest_dir='.', use_cache=True):
+    """
+    gmx grompp to generate topol.tpr
     Input:
-        maxcore: int, max core using
-        device: str: default cpu, also gpu/auto
+        mdrun_filename/top_filename/gro_filename: relative to dest_dir
         dest_dir: destination directory
+        use_cache: reuse topol.tpr of identical inputs from TPR_CACHE
     Output:
-        dict: including trr_filename, edr_filename, xtc_filename
+        mdrun_filename
+    """
+    hit, cache_key = False, None
+    if use_cache:
+        hit, cache_key = lookup_tpr(
+            mdrun_filename, top_filename, gro_filename, dest_dir)
+    if hit:
+        return mdrun_filename
+    cmd = get_grompp_args(mdrun_filename, top_filename, gro_filename)
+    logger.debug(f'grompp cmd: \n{" ".join(cmd)}')
+    with open(os.path.join(dest_dir, 'log_grompp.log'), 'w') as stdout, \
+            open(os.path.join(dest_dir, 'log_grompp.err'), 'w') as stderr:
+        exit_code = subprocess.call(cmd, cwd=dest_dir,
+                                    stdout=stdout, stderr=stderr)
+    if exit_code != 0:
+        raise OSError('grompp error')
+    if cache_key:
+        save_tpr(cache_key, dest_dir)
+    return mdrun_filename
+
+
+def get_mdrun_args(maxcore=4, device='cpu', cores=None, checkpoint=None,
+                   append=True, layout=None, rerun=None):
+    """
+    argv of gmx mdrun
+    Input:
+        maxcore: number of threads
+        device: cpu/gpu/auto
+        cores: affinity.CoreReservation to pin to, -pin auto if None
+        checkpoint: checkpoint file to continue from (-cpi)
+        append: append to the output files of the checkpoint,
+            otherwise mdrun writes .partNNNN files
+        layout: dict with ntmpi and ntomp, used instead of -nt maxcore
+        rerun: trajectory to recalculate energies and forces of (-rerun)
     """
     if not isinstance(maxcore, int):
         maxcore = 4
-    dest_dir = dest_dir or '.'
     assert device in ['auto', 'cpu', 'gpu']
-    help_text = get_help_text()
-    pme_flag = ''
-    pmefft_flag = ''
-    if '-pme ' in help_text:
-        pme_flag = f'-pme {device} '
-    if '-pmefft ' in help_text:
-        pmefft_flag = f'-pmefft {device} '
-    cmd = f'cd {dest_dir}; \
-gmx mdrun -v -deffnm topol \
--nt {maxcore} -nb {device} {pme_flag} {pmefft_flag} -pin on \
--o traj.trr \
->log_mdrun.log 2>log_mdrun.err'
-    logger.debug(f"mdrun cmd:\n{cmd}")
-    exit_code, _ = subprocess.getstatusoutput(cmd)
+    gmx_capability = capability.get_capability()
+    args = ['gmx', 'mdrun', '-v', '-deffnm', 'topol']
+    if layout:
+        args += ['-ntmpi', str(layout['ntmpi']),
+                 '-ntomp', str(layout['ntomp'])]
+    else:
+        args += ['-nt', str(maxcore)]
+    args += ['-nb', device]
+    if gmx_capability.supports('-pme'):
+        args += ['-pme', device]
+    if gmx_capability.supports('-pmefft'):
+        args += ['-pmefft', device]
+    if cores is not None and gmx_capability.supports('-pinoffset'):
+        args += ['-pin', 'on', '-pinoffset', str(cores.pinoffset),
+                 '-pinstride', str(cores.pinstride)]
+    else:
+        args += ['-pin', 'auto']
+    args += ['-cpt', f'{CHECKPOINT_INTERVAL:g}']
+    if checkpoint:
+        args += ['-cpi', checkpoint]
+        if not append and gmx_capability.supports('-noappend'):
+            args += ['-noappend']
+    if rerun:
+        args += ['-rerun', rerun]
+    args += ['-o', TRR_FILE]
+    return args
+
+
+def has_checkpoint(dest_dir='.'):
+    """
+    whether dest_dir has a checkpoint of a run and its tpr
+    """
+    dest_dir = dest_dir or '.'
+    return os.path.exists(os.path.join(dest_dir, CPT_FILE)) and \
+        os.path.exists(os.path.join(dest_dir, TPR_FILE))
+
+
+def find_checkpoint(dest_dir='.'):
+    """
+    checkpoint to resume a run in dest_dir from
+    Output:
+        (checkpoint filename or None, append), output files of the run are
+        appended if its log still exists, otherwise new .partNNNN files
+        are written
+    """
+    dest_dir = dest_dir or '.'
+    if not has_checkpoint(dest_dir):
+        return None, True
+    append = os.path.exists(os.path.join(dest_dir, LOG_FILE))
+    logger.debug(f"resume from {CPT_FILE} in {dest_dir}, append: {append}")
+    return CPT_FILE, append
+
+
+def get_extend_tpr_args(extend_time, time_unit='ps'):
+    """
+    argv of gmx convert-tpr lengthening topol.tpr by extend_time
+    """
+    extend_time = extend_time * atomtools.unit.trans_time(time_unit, 'ps')
+    return ['gmx', 'convert-tpr', '-s', TPR_FILE, '-extend',
+            f'{extend_time:g}', '-o', TPR_FILE]
+
+
+def exec_extend_tpr(extend_time, time_unit='ps', dest_dir='.'):
+    """
+    gmx convert-tpr -extend, lengthen the run of topol.tpr in place
+    Input:
+        extend_time: time added to the run
+        time_unit: unit of extend_time, default ps
+        dest_dir: destination directory
+    """
+    dest_dir = dest_dir or '.'
+    cmd = get_extend_tpr_args(extend_time, time_unit)
+    logger.debug(f'convert-tpr cmd: \n{" ".join(cmd)}')
+    with open(os.path.join(dest_dir, 'log_convert-tpr.log'), 'w') as stdout, \
+            open(os.path.join(dest_dir, 'log_convert-tpr.err'), 'w') as stderr:
+        exit_code = subprocess.call(cmd, cwd=dest_dir, stdin=subprocess.DEVNULL,
+                                    stdout=stdout, stderr=stderr)
     if exit_code != 0:
-        raise OSError('mdrun error')
+        raise OSError('convert-tpr error')
+    record_extension(extend_time, time_unit, dest_dir)
+
+
+def record_extension(extend_time, time_unit='ps', dest_dir='.'):
+    """
+    add the steps of an extension to nsteps of the mdp file of dest_dir,
+    so that it describes the extended topol.tpr, e.g. for the progress
+    """
+    mdrun_filename = os.path.join(dest_dir or '.', MDRUN_FILE)
+    if not os.path.exists(mdrun_filename):
+        return
+    options = read_mdp_options(mdrun_filename)
+    try:
+        nsteps = int(options['nsteps'].split()[0])
+        # default time step of gromacs
+        dt = float(options.get('dt', '0.001').split()[0])
+    except (KeyError, ValueError, IndexError):
+        return
+    if nsteps < 0:
+        return
+    extend_time = extend_time * atomtools.unit.trans_time(time_unit, 'ps')
+    set_mdp_options(mdrun_filename,
+                    {'nsteps': nsteps + int(round(extend_time / dt))})
+
+
+def get_mdrun_output(dest_dir='.'):
     trr_filename = os.path.realpath(f"{dest_dir}/{TRR_FILE}")
     edr_filename = os.path.realpath(f"{dest_dir}/{EDR_FILE}")
     xtc_filename = os.path.realpath(f"{dest_dir}/{XTC_FILE}")
+    log_filename = os.path.realpath(f"{dest_dir}/{LOG_FILE}")
     return {
         'trr_filename': trr_filename,
         'edr_filename': edr_filename,
-        'xtc_filename': xtc_filename
+        'xtc_filename': xtc_filename,
+        'log_filename': log_filename,
     }
 
 
-def gromacs_extract_data(cmd, data_filename,
-                         error_msg='', debug_msg=''):
-    import pandas as pd
-    logger.debug(debug_msg)
-    exit_code, output = subprocess.getstatusoutput(cmd)
-    logger.debug(f"extract_data: {cmd}, \n{output}")
-    if exit_code != 0:
-        raise OSError(error_msg)
-    with open(data_filename) as fd:
-        line = fd.read()
-    datablock = re.match(r'^[\s\S]*?\n\s*(\d+[\s\S]*)$', line)[1].strip()
-    logger.debug(datablock)
-    res = pd.read_csv(StringIO(datablock), sep=r'\s+',
-                      header=None, index_col=0).values
-    if res.ndim == 1:
-        res = np.array([res])
-    return res
-
-
-def exec_get_trajectory(outgro_filename=OUTPUT_GRO, dest_dir='.'):
+def get_output_parts(filename):
+    """
+    filename and the .partNNNN files of resumed runs (mdrun -noappend),
+    in the order they were written
+    """
+    stem, ext = os.path.splitext(filename)
+    parts = sorted(glob.glob(
+        f'{glob.escape(stem)}.part[0-9][0-9][0-9][0-9]{ext}'))
+    if os.path.exists(filename):
+        parts.insert(0, filename)
+    return parts
+
+
+def select_part_frames(part_steps):
+    """
+    frames of each part that are not written again by a later part,
+    a resumed run writes its frames from the checkpoint step on
+    Input:
+        part_steps: list of steps of the frames of each part
+    Output:
+        list of boolean masks, one per part
+    """
+    masks = list()
+    for i, steps in enumerate(part_steps):
+        steps = np.asarray(steps, dtype=int)
+        next_steps = [x[0] for x in part_steps[i+1:] if len(x)]
+        if next_steps:
+            masks.append(steps < next_steps[0])
+        else:
+            masks.append(np.ones(len(steps), dtype=bool))
+    return masks
+
+
+def select_indexed_frames(filenames, keys=None, frames=None):
+    """
+    select frames of a file and its .partNNNN files read as one trajectory
+    Input:
+        filenames: see get_output_parts
+        keys: trr blocks the frames must have, see frameindex
+        frames: None(all)/int/slice/list of int
+    Output:
+        list of (filename, positions of the frames in the file)
+    """
+    masks = select_part_frames([frameindex.read_frame_steps(x, keys)
+                                for x in filenames])
+    empty = [np.empty(0, dtype=int)]
+    parts = np.concatenate([np.full(mask.sum(), i, dtype=int)
+                            for i, mask in enumerate(masks)] + empty)
+    positions = np.concatenate([np.flatnonzero(mask) for mask in masks] +
+                               empty)
+    selection = list()
+    for i in edr.select_frames(len(parts), frames):
+        if not selection or selection[-1][0] != filenames[parts[i]]:
+            selection.append((filenames[parts[i]], list()))
+        selection[-1][1].append(positions[i])
+    return selection
+
+
+def start_mdrun(maxcore=4, device='cpu', dest_dir='.', cores=None,
+                resume=False, layout=None, rerun=None):
+    """
+    start mdrun in background
+    Input:
+        maxcore: int, max core using
+        device: str: default cpu, also gpu/auto
+        dest_dir: destination directory
+        cores: affinity.CoreReservation to pin to
+        resume: continue from topol.cpt of dest_dir if it exists
+        layout: thread layout, see get_mdrun_args
+        rerun: trajectory to rerun, relative to dest_dir
+    Output:
+        subprocess.Popen of gmx mdrun
+    """
     dest_dir = dest_dir or '.'
-    # outgro_filename = os.path.realpath(f'{outgro_filename}')
-    all_traj_filenames = ['topol.xtc', 'traj.trr']
-    for traj_filename in all_traj_filenames:
-        cmd = f'cd {dest_dir}; gmx trjconv -f {traj_filename} \
--o {outgro_filename} << EOF\n0 EOF \
->/dev/null 2>&1'
-        logger.debug(f"trjconv cmd:\n {cmd}")
-        exit_code, output = subprocess.getstatusoutput(cmd)
-        if exit_code == 0:
-            #     logger.warning(output)
-            #     raise OSError('trjcov error')
-            outgro_filename = os.path.realpath(f"{dest_dir}/{outgro_filename}")
-            return outgro_filename
-    logger.warning(output)
-    raise OSError('trjcov error')
-
-
-def get_gromacs_legends(filename):
-    with open(filename, 'r') as fd:
-        _string = fd.read()
-        legends = re.findall(r'@ s\d+ legend "(.*)"', _string)
-    return legends
-
-
-def extract_forces(trr_filename=TRR_FILE, dest_dir='.'):
+    checkpoint, append = find_checkpoint(dest_dir) if resume else (None, True)
+    args = get_mdrun_args(maxcore, device, cores, checkpoint, append, layout,
+                          rerun)
+    logger.debug(f"mdrun cmd:\n{' '.join(args)}")
+    with open(os.path.join(dest_dir, 'log_mdrun.log'), 'w') as stdout, \
+            open(os.path.join(dest_dir, 'log_mdrun.err'), 'w') as stderr:
+        return subprocess.Popen(args, cwd=dest_dir, stdin=subprocess.DEVNULL,
+                                stdout=stdout, stderr=stderr)
+
+
+def get_mdrun_progress(dest_dir='.', callback=None):
+    """
+    telemetry.MdrunProgress of the mdrun of dest_dir,
+    nsteps and dt are read from its mdp file
+    """
     dest_dir = dest_dir or '.'
-    cmd = f'cd {dest_dir}; gmx traj -f {trr_filename} -of <<EOF\n0 EOF\
->/dev/null 2>&1'
-    debug_msg = f"extract_forces cmd: {cmd}"
-    error_msg = 'extract_forces gmx traj error'
-    force_fname = f'{dest_dir}/force.xvg'
-    forces = gromacs_extract_data(cmd, force_fname, error_msg, debug_msg)
-    forces = forces.reshape((len(forces), -1, 3))
+    nsteps, dt = None, None
+    mdrun_filename = os.path.join(dest_dir, MDRUN_FILE)
+    if os.path.exists(mdrun_filename):
+        options = read_mdp_options(mdrun_filename)
+        try:
+            nsteps = int(options.get('nsteps', '').split()[0]) or None
+            dt = float(options.get('dt', '').split()[0])
+        except (ValueError, IndexError):
+            pass
+    return telemetry.MdrunProgress(
+        os.path.join(dest_dir, 'log_mdrun.err'), nsteps, dt, callback)
+
+
+def exec_mdrun(maxcore=4, device='cpu', dest_dir='.', resume=False,
+               progress=None, layout=None, rerun=None):
+    """
+    execute mdrun, the main part of MD simulation
+    Input:
+        maxcore: int, max core using
+        device: str: default cpu, also gpu/auto
+        dest_dir: destination directory
+        resume: continue from topol.cpt of dest_dir if it exists
+        progress: callable, called every PROGRESS_INTERVAL seconds with a
+            new step with the progress dict of telemetry.MdrunProgress
+        layout: thread layout, see get_mdrun_args
+        rerun: trajectory to rerun, relative to dest_dir
+    Output:
+        dict: including trr_filename, edr_filename, xtc_filename
+    """
+    dest_dir = dest_dir or '.'
+    with affinity.reserved_cores(maxcore) as cores:
+        process = start_mdrun(maxcore, device, dest_dir, cores, resume,
+                              layout, rerun)
+        try:
+            if progress is not None:
+                follower = get_mdrun_progress(dest_dir, progress)
+                while process.poll() is None:
+                    time.sleep(PROGRESS_INTERVAL)
+                    follower.poll()
+                follower.poll()
+            exit_code = process.wait()
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        if exit_code != 0:
+            raise OSError('mdrun error')
+    return get_mdrun_output(dest_dir)
+
+
+def extract_performance(log_filename=LOG_FILE, dest_dir='.'):
+    """
+    ns/day, hours/ns, time and cycle accounting of a finished mdrun,
+    from the last part of its log, see telemetry.read_performance
+    """
+    dest_dir = dest_dir or '.'
+    log_filenames = get_output_parts(os.path.join(dest_dir, log_filename))
+    if not log_filenames:
+        return dict()
+    return telemetry.read_performance(log_filenames[-1])
+
+
+def allocate_forces(shape, dtype, out_filename=None):
+    """
+    empty forces in memory, or memory mapped from out_filename
+    """
+    if out_filename:
+        return np.lib.format.open_memmap(
+            out_filename, mode='w+', dtype=dtype, shape=shape)
+    return np.empty(shape, dtype=dtype)
+
+
+def extract_forces(trr_filename=TRR_FILE, dest_dir='.',
+                   dtype=np.float64, mmap=False, frames=None, atoms=None):
+    """
+    read forces from trr file, in eV/Ang
+    Input:
+        trr_filename: trr file, relative to dest_dir
+        dest_dir: destination directory
+        dtype: dtype of forces, e.g. np.float32 to halve the memory
+        mmap: if True, forces are memory mapped from dest_dir/forces.npy
+        frames: None(all)/int/slice/list of int, frames with forces to read
+        atoms: None(all)/int/slice/list of int, atoms to read
+    Output:
+        (nframes, natoms, 3) array
+    """
+    dest_dir = dest_dir or '.'
+    trr_filename = os.path.join(dest_dir, trr_filename)
+    logger.debug(f"extract_forces: {trr_filename}")
     utrans = float(atomtools.unit.trans_energy('kJ/mol', 'eV') /
                    atomtools.unit.trans_length('nm', 'Ang'))
-    forces = forces * utrans
+    out_filename = os.path.join(dest_dir, FORCES_NPY) if mmap else None
+    trr_filenames = get_output_parts(trr_filename)
+    if frames is not None or atoms is not None:
+        # only the selected frames are read, by the frame index, and
+        # written to the output FORCES_CHUNK_FRAMES at a time
+        selection = select_indexed_frames(trr_filenames, ['f'], frames)
+        nframes = sum(len(positions) for _, positions in selection)
+        forces, start = None, 0
+        for filename, positions in selection:
+            for i in range(0, len(positions), FORCES_CHUNK_FRAMES):
+                chunk = frameindex.read_trr_frames(
+                    filename, ['f'], positions[i:i+FORCES_CHUNK_FRAMES],
+                    atoms, dtype, utrans)[1]['f']
+                if forces is None:
+                    forces = allocate_forces((nframes,) + chunk.shape[1:],
+                                             dtype, out_filename)
+                forces[start:start+len(chunk)] = chunk
+                start += len(chunk)
+        if forces is None:
+            forces = allocate_forces((0, 0, 3), dtype, out_filename)
+        if out_filename:
+            forces.flush()
+        return forces
+    if len(trr_filenames) <= 1:
+        return trr.read_trr(trr_filename, key='f', dtype=dtype, scale=utrans,
+                            out_filename=out_filename)
+    part_headers = [[x for x in trr.read_trr_headers(filename)
+                     if x['f'] is not None] for filename in trr_filenames]
+    masks = select_part_frames(
+        [[x['step'] for x in headers] for headers in part_headers])
+    natoms = next((headers[0]['natoms'] for headers in part_headers
+                   if headers), 0)
+    shape = (int(sum(mask.sum() for mask in masks)), natoms, 3)
+    forces = allocate_forces(shape, dtype, out_filename)
+    start = 0
+    for filename, mask in zip(trr_filenames, masks):
+        if not mask.any():
+            continue
+        part = trr.read_trr(filename, key='f', dtype=dtype, scale=utrans)
+        forces[start:start+mask.sum()] = part[mask]
+        start += mask.sum()
+    if out_filename:
+        forces.flush()
     return forces
 
 
-def extract_energies_dict(edr_filename=EDR_FILE, dest_dir='.'):
-    """
--------------------------------------------------------------------
-  1  Bond             2  G96Angle         3  LJ-(SR)          4  Disper.-corr.
-  5  Coulomb-(SR)     6  Potential        7  Kinetic-En.      8  Total-Energy
-  9  Conserved-En.   10  Temperature     11  Pres.-DC        12  Pressure
- 13  Vir-XX          14  Vir-XY          15  Vir-XZ          16  Vir-YX
- 17  Vir-YY          18  Vir-YZ          19  Vir-ZX          20  Vir-ZY
- 21  Vir-ZZ          22  Pres-XX         23  Pres-XY         24  Pres-XZ
- 25  Pres-YX         26  Pres-YY         27  Pres-YZ         28  Pres-ZX
- 29  Pres-ZY         30  Pres-ZZ         31  #Surf*SurfTen   32  T-System
-
-    Selelcting system is changing frequently, so we get all data and make a dictionary
-    """
-    numbers = list(map(str, range(1, 100)))
-    numcmd = ' \n'.join(numbers)
-    cmd = f'cd {dest_dir}; gmx energy -f {edr_filename} -o <<EOF\n'+numcmd+'\n\n EOF \
->/dev/null 2>&1'
-    debug_msg = f"extract_energies cmd: {cmd}"
-    error_msg = 'extract_energies with gmx energy failed'
-    energies_fname = f'{dest_dir}/energy.xvg'
-    energies = gromacs_extract_data(cmd, energies_fname, error_msg, debug_msg)
-    legends = get_gromacs_legends(energies_fname)
-    energies = energies.T
+def extract_energies_dict(edr_filename=EDR_FILE, dest_dir='.',
+                          terms=None, frames=None):
+    """
+    read energies from edr file, energies in kJ/mol are converted to eV
+    Input:
+        edr_filename: edr file, relative to dest_dir
+        dest_dir: destination directory
+        terms: list of names of terms, e.g. ['Potential'], default all
+        frames: None(all)/int/slice/list of int, frames to read, by the
+            frame index of the edr file
+    Output:
+        dict, {name: (nframes,) array}
+    """
+    dest_dir = dest_dir or '.'
+    edr_filename = os.path.join(dest_dir, edr_filename)
+    logger.debug(f"extract_energies: {edr_filename}")
+    edr_filenames = get_output_parts(edr_filename)
+    if frames is not None:
+        # only the selected frames are read, by the frame index
+        parts = [frameindex.read_edr_frames(filename, terms, positions)
+                 for filename, positions in select_indexed_frames(
+                     edr_filenames, frames=frames)]
+        if not parts:
+            parts = [frameindex.read_edr_frames(edr_filename, terms, [])]
+        data = {key: np.concatenate([x[key] for x in parts])
+                for key in ['time', 'step', 'energies']}
+        data.update(names=parts[0]['names'], units=parts[0]['units'])
+    elif len(edr_filenames) <= 1:
+        data = edr.read_edr(edr_filename, terms=terms)
+    else:
+        parts = [edr.read_edr(filename, terms=terms)
+                 for filename in edr_filenames]
+        masks = select_part_frames([x['step'] for x in parts])
+        data = {key: np.concatenate([x[key][mask] for x, mask in
+                                     zip(parts, masks)])
+                for key in ['time', 'step', 'energies']}
+        data.update(names=parts[0]['names'], units=parts[0]['units'])
     utrans = float(atomtools.unit.trans_energy('kJ/mol', 'eV'))
-    if 'Temperature' in legends:
-        energies[:legends.index('Temperature')] *= utrans
-    energies_dict = dict(zip(legends, energies))
+    energies_dict = dict()
+    for name, unit, energies in zip(
+            data['names'], data['units'], data['energies'].T):
+        if unit == 'kJ/mol':
+            energies = energies * utrans
+        energies_dict[name] = energies
     return energies_dict
 
 # def old_extract_structures(output_gro=OUTPUT_GRO):
@@ -397,10 +815,90 @@ def extract_energies_dict(edr_filename=EDR_FILE, dest_dir='.'):
 #     return structures
 
 
-def extract_structures(output_gro=OUTPUT_GRO):
-    try:
-        import gaseio
-        return gaseio.read(output_gro, index=':')
-    except:
-        import chemio
-        return chemio.read(output_gro, index=":")
+def get_itp_element_symbols(itp_filename=ITP_FILE):
+    """
+    element symbols of the atoms of an itp file,
+    from the leading letters of atom types, checked by masses
+    """
+    return load_topology(itp_filename).symbols
+
+
+def build_structure(symbols, positions, box, **info):
+    """
+    structure arrays from gromacs coordinates and box in nm
+    """
+    utrans = float(atomtools.unit.trans_length('nm', 'Ang'))
+    arrays = {
+        'symbols': list(symbols),
+        'positions': np.asarray(positions, dtype=float) * utrans,
+        'cell': np.asarray(box, dtype=float) * utrans,
+        'pbc': np.array([True, True, True]),
+    }
+    arrays.update(info)
+    return arrays
+
+
+def iextract_trajectory_structures(xtc_filename=XTC_FILE,
+                                   trr_filename=TRR_FILE,
+                                   itp_filename=ITP_FILE, dest_dir='.',
+                                   frames=None, atoms=None):
+    """
+    iterate structures of the trajectory, decoded from xtc,
+    or trr if xtc has no frames; .partNNNN files of resumed runs are
+    read as one trajectory. Frames are read by their frame index, only the
+    selected ones are decoded
+    Input:
+        xtc_filename/trr_filename/itp_filename: relative to dest_dir
+        dest_dir: destination directory
+        frames: None(all)/int/slice/list of int, frames to read
+        atoms: None(all)/int/slice/list of int, atoms to read
+    Output:
+        generator of structure arrays
+    """
+    dest_dir = dest_dir or '.'
+    xtc_filename = os.path.join(dest_dir, xtc_filename)
+    trr_filename = os.path.join(dest_dir, trr_filename)
+    symbols = get_itp_element_symbols(os.path.join(dest_dir, itp_filename))
+    if atoms is not None:
+        symbols = list(np.array(symbols, dtype=object)[atoms])
+    xtc_filenames = get_output_parts(xtc_filename)
+    if any(len(frameindex.read_frame_steps(x)) for x in xtc_filenames):
+        for filename, positions in select_indexed_frames(
+                xtc_filenames, frames=frames):
+            for header, coords in frameindex.read_xtc_frames(
+                    filename, positions, atoms):
+                yield build_structure(symbols, coords, header['box'],
+                                      step=header['step'],
+                                      time=header['time'])
+        return
+    trr_filenames = get_output_parts(trr_filename)
+    if not trr_filenames:
+        raise OSError(f'no trajectory in {dest_dir}')
+    for filename, positions in select_indexed_frames(
+            trr_filenames, ['x', 'box'], frames):
+        headers, values = frameindex.read_trr_frames(
+            filename, ['x', 'box'], positions, atoms)
+        for header, coords, box in zip(headers, values['x'], values['box']):
+            yield build_structure(symbols, coords, box,
+                                  step=header['step'], time=header['t'])
+
+
+def extract_trajectory_structures(xtc_filename=XTC_FILE,
+                                  trr_filename=TRR_FILE,
+                                  itp_filename=ITP_FILE, dest_dir='.',
+                                  frames=None, atoms=None):
+    return list(iextract_trajectory_structures(
+        xtc_filename, trr_filename, itp_filename, dest_dir, frames, atoms))
+
+
+def extract_structures(output_gro=OUTPUT_GRO, frames=None, atoms=None):
+    """
+    structures of the frames of a gro file, e.g. output.gro of trjconv
+    Input:
+        frames: None(all)/int/slice/list of int, frames to read, by the
+            frame index of the gro file
+        atoms: None(all)/int/slice/list of int, atoms to read
+    Output:
+        list of structure arrays, see fileio.parse_gro_frame
+    """
+    return frameindex.read_gro_frames(output_gro, frames, atoms)
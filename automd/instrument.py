@@ -0,0 +1,105 @@
+"""
+
+resource usage of the stages of a run
+
+Every stage records its wall time, cpu time of automd and of gromacs child
+processes, the peak RSS so far and the bytes of files written to dest_dir
+(new files and the growth of existing ones), collected in
+out_dict['timings'] of `run`. Counters of resource.getrusage are process
+wide, stages of concurrent runs in one process overlap.
+
+
+"""
+
+import os
+import sys
+import time
+import resource
+import contextlib
+
+import modlog
+from timer import timer
+
+
+logger = modlog.getLogger(__name__)
+# ru_maxrss is in bytes on macOS, KiB elsewhere
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def get_file_states(dest_dir='.'):
+    """
+    {name: (size, mtime_ns)} of the files of dest_dir
+    """
+    states = dict()
+    try:
+        with os.scandir(dest_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    states[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        pass
+    return states
+
+
+def get_growth(before, after):
+    """
+    bytes written to a file between two (size, mtime_ns) states, the
+    size of a new file, the growth of an existing modified one
+    """
+    if before is None:
+        return after[0]
+    if before == after:
+        return 0
+    return max(0, after[0] - before[0])
+
+
+def get_usage():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        'wall_time': time.perf_counter(),
+        'cpu_time': own.ru_utime + own.ru_stime,
+        'child_cpu_time': children.ru_utime + children.ru_stime,
+        'peak_rss': max(own.ru_maxrss, children.ru_maxrss) * RSS_UNIT,
+    }
+
+
+class StageTimings:
+    """
+    resource usage per stage of a run in dest_dir
+    Output of to_dict:
+        {stage: {wall_time, cpu_time, child_cpu_time (s), peak_rss,
+                 bytes_written (bytes)}}
+    """
+
+    def __init__(self, dest_dir='.'):
+        self.dest_dir = dest_dir or '.'
+        self.stages = dict()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        files = get_file_states(self.dest_dir)
+        start = get_usage()
+        try:
+            with timer(name):
+                yield
+        finally:
+            end = get_usage()
+            bytes_written = sum(
+                get_growth(files.get(fname), state) for fname, state in
+                get_file_states(self.dest_dir).items())
+            record = {key: end[key] - start[key] for key in
+                      ['wall_time', 'cpu_time', 'child_cpu_time']}
+            record['peak_rss'] = end['peak_rss']
+            record['bytes_written'] = bytes_written
+            if name in self.stages:
+                # a stage entered more than once adds up
+                for key in ['wall_time', 'cpu_time', 'child_cpu_time',
+                            'bytes_written']:
+                    record[key] += self.stages[name][key]
+            self.stages[name] = record
+            logger.debug(f"stage {name}: {record}")
+
+    def to_dict(self):
+        return {name: dict(record) for name, record in self.stages.items()}
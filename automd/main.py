@@ -6,18 +6,33 @@ main executor of automd
 """
 
 import os
+import time
 import shutil
 import json
 import modlog
-import pdb
-from timer import timer
 
+from . import affinity
+from . import instrument
 from . import gromacs_utils
+from . import xtc
+from . import results
+from .autotune import get_thread_layout
+from .dedup import deduplicate
+from .topology import load_topology
 # from .default_config import default_mdrun_config
 
 logger = modlog.getLogger(__name__)
 DEFAULT_MAX_CORE = 4
-gromacs_utils.test_gromacs()
+# every frame of a rerun is written to the edr and (with forces) trr file
+RERUN_MDP_OPTIONS = {
+    'integrator': 'md',
+    'nstcalcenergy': 1,
+    'nstenergy': 1,
+    'nstfout': 1,
+    'nstxout': 0,
+    'nstvout': 0,
+    'nstxout-compressed': 0,
+}
 
 
 def generate_gromacs_topfile_itpfile(
@@ -26,18 +41,19 @@ def generate_gromacs_topfile_itpfile(
         use_geom_angle=False,
         use_geom_dihedral=False,
         use_harmonic_angle=False,
-
+        obgmx_method='exe',
 ):
     """
     generate topfile with the given outfilename
     Input:
         input_file: filename of structure file
+        obgmx_method: exe/python, see obgmx.generate_gromacs_obgmx_UFF_topfile
     Output:
         abspath of topfile
     """
     os.makedirs(dest_dir, exist_ok=True)
     topfile, itpfile = gromacs_utils.generate_gromacs_topfile(
-        input_file, dest_dir=dest_dir,
+        input_file, obgmx_method=obgmx_method, dest_dir=dest_dir,
         use_geom_bond=use_geom_bond,
         use_geom_angle=use_geom_angle,
         use_geom_dihedral=use_geom_dihedral,
@@ -49,79 +65,344 @@ def generate_gromacs_topfile_itpfile(
     return os.path.realpath(topfile), os.path.realpath(itpfile)
 
 
-def run(input_file, runtype='md', mdrun_file=None, dest_dir='.',
-        max_core: int = DEFAULT_MAX_CORE, device: str = 'cpu',
-        extract_forces: bool = False, topfile=None, itpfile=None,
-        dry_run: bool = False, **args):
+def prepare_inputs(input_file, runtype='md', mdrun_file=None, dest_dir='.',
+                   topfile=None, itpfile=None, obgmx_method='exe',
+                   timings=None, **args):
     """
-    run automd
+    prepare gro/top/itp/mdp files for grompp
     Input:
         input_file: filename of input
+        runtype: md/emin
+        mdrun_file: given mdp file
         dest_dir: directory where output will be saved
-        max_core: maximum number of cores
-        device: str, default cpu, but also gpu/auto
-        extract_forces: extract forces with output
-        topfile: run gromacs with given topfile
-        dry_run: bool, do not execute gromacs if true
+        topfile/itpfile: run gromacs with given topfile
+        obgmx_method: exe/python, generator of UFF topology
+        timings: instrument.StageTimings to record the stages in
+        **args: arguments for MD simulation
     Output:
-        dict, including all the calculated properties
+        dict, including grofile, topfile, itpfile, mdrunfile
     """
     if isinstance(input_file, str) and os.path.exists(input_file):
         input_file = os.path.abspath(input_file)
     assert runtype in ['md', 'emin'], 'runtype must be either md or emin'
-    max_core = max_core or DEFAULT_MAX_CORE
-    logger.debug(f"max_core: {max_core}")
+    gromacs_utils.test_gromacs()
     logger.debug(f"input_file: {input_file}, \nargs: {args}")
     # main part
     out_dict = dict()
     os.makedirs(dest_dir, exist_ok=True)
-    if input_file.endswith('.gro'):
-        grofile = input_file
-    else:
-        grofile = gromacs_utils.generate_gromacs_grofile(
-            input_file, dest_dir=dest_dir)
+    timings = timings or instrument.StageTimings(dest_dir)
+    with timings.stage('conversion'):
+        if input_file.endswith('.gro') and topfile:
+            structure = None
+        else:
+            # one parse of the input for both the gro file and obgmx
+            structure = gromacs_utils.read_structure(input_file)
+        if input_file.endswith('.gro'):
+            grofile = input_file
+        else:
+            grofile = gromacs_utils.generate_gromacs_grofile(
+                input_file, dest_dir=dest_dir, structure=structure)
     if not topfile:
-        topfile, itpfile = gromacs_utils.generate_gromacs_topfile(
-            input_file, dest_dir=dest_dir)
+        with timings.stage('topology'):
+            topfile, itpfile = gromacs_utils.generate_gromacs_topfile(
+                input_file, obgmx_method=obgmx_method, dest_dir=dest_dir,
+                structure=structure)
     else:
         if not itpfile:
             itpfile = os.path.splitext(topfile)[0] + '.itp'
-    mdrunfile = gromacs_utils.generate_mdrun_file(
-        mdrun_file, runtype=runtype, dest_dir=dest_dir, **args)
+    with timings.stage('mdp'):
+        mdrunfile = gromacs_utils.generate_mdrun_file(
+            mdrun_file, runtype=runtype, dest_dir=dest_dir, **args)
     # pdb.set_trace()
-    gromacs_utils.set_gro_element_name_with_top(
-        grofile, topfile, itpfile)
-    mdrunfile = gromacs_utils.exec_grompp(
-        mdrunfile, topfile, grofile, dest_dir=dest_dir)
+    with timings.stage('gro_naming'):
+        topology = load_topology(itpfile)
+        gromacs_utils.set_gro_element_name_with_top(
+            grofile, topfile, itpfile, topology=topology)
     out_dict['grofile'] = grofile
     out_dict['topfile'] = topfile
     out_dict['itpfile'] = itpfile
     out_dict['mdrunfile'] = mdrunfile
-    out_dict['mdrunfile'] = mdrunfile
-    logger.debug(f"{json.dumps(out_dict, indent=4)}")
-    if not dry_run:
-        _fdict = gromacs_utils.exec_mdrun(
-            max_core, device=device, dest_dir=dest_dir)
-        out_dict.update(_fdict)
-        # import pdb; pdb.set_trace()
-        output_gro = gromacs_utils.exec_get_trajectory(dest_dir=dest_dir)
-        out_dict['output_gro'] = output_gro
-        logger.debug(f"{json.dumps(out_dict, indent=4)}")
+    return out_dict
+
+
+def load_inputs(input_file, dest_dir='.', topfile=None, itpfile=None):
+    """
+    out_dict of the gro/top/itp/mdp files of the checkpointed run of
+    dest_dir, which are not generated again when the run is continued
+    Output:
+        dict as prepare_inputs, None if a file is missing
+    """
+    dest_dir = dest_dir or '.'
+    if isinstance(input_file, str) and input_file.endswith('.gro') and \
+            topfile:
+        grofile = input_file
+    else:
+        grofile = os.path.join(dest_dir, gromacs_utils.GRO_FILE)
+    topfile = topfile or os.path.join(dest_dir, gromacs_utils.TOP_FILE)
+    itpfile = itpfile or os.path.splitext(topfile)[0] + '.itp'
+    out_dict = {
+        'grofile': grofile,
+        'topfile': topfile,
+        'itpfile': itpfile,
+        'mdrunfile': os.path.join(dest_dir, gromacs_utils.MDRUN_FILE),
+    }
+    if not all(os.path.exists(x) for x in out_dict.values()):
+        return None
+    return {key: os.path.realpath(x) for key, x in out_dict.items()}
+
+
+def prepare_continued(input_file, runtype='md', mdrun_file=None,
+                      dest_dir='.', topfile=None, itpfile=None,
+                      timings=None, **args):
+    """
+    inputs of a run continued from its checkpoint: the files of dest_dir,
+    prepared again only if one is missing
+    """
+    out_dict = load_inputs(input_file, dest_dir, topfile, itpfile)
+    if out_dict is None:
+        logger.warning(f'inputs of the checkpoint of {dest_dir} are '
+                       'missing, they are generated again')
+        out_dict = prepare_inputs(input_file, runtype, mdrun_file, dest_dir,
+                                  topfile, itpfile, timings=timings, **args)
+    return out_dict
+
+
+def prepare_run(input_file, runtype='md', mdrun_file=None, dest_dir='.',
+                topfile=None, itpfile=None, timings=None, **args):
+    """
+    prepare gro/top/itp/mdp files and topol.tpr for mdrun
+    Input:
+        see prepare_inputs
+    Output:
+        dict, including grofile, topfile, itpfile, mdrunfile
+    """
+    timings = timings or instrument.StageTimings(dest_dir)
+    out_dict = prepare_inputs(input_file, runtype, mdrun_file, dest_dir,
+                              topfile, itpfile, timings=timings, **args)
+    with timings.stage('grompp'):
+        gromacs_utils.exec_grompp(
+            out_dict['mdrunfile'], out_dict['topfile'], out_dict['grofile'],
+            dest_dir=dest_dir)
+    return out_dict
+
+
+def collect_outputs(out_dict, dest_dir='.', extract_forces=False,
+                    timings=None):
+    """
+    energies (and forces) of a finished mdrun into out_dict
+    """
+    timings = timings or instrument.StageTimings(dest_dir)
+    with timings.stage('energies'):
         energies_dict = gromacs_utils.extract_energies_dict(
             edr_filename=out_dict['edr_filename'], dest_dir=dest_dir)
-        out_dict['energies_dict'] = energies_dict
-        out_dict['potential_energy'] = energies_dict['Potential']
-        if extract_forces:
+    out_dict['energies_dict'] = energies_dict
+    out_dict['potential_energy'] = energies_dict['Potential']
+    if extract_forces:
+        with timings.stage('forces'):
             forces = gromacs_utils.extract_forces(
                 trr_filename=out_dict['trr_filename'], dest_dir=dest_dir)
-            out_dict['forces'] = forces
+        out_dict['forces'] = forces
+    out_dict['performance'] = gromacs_utils.extract_performance(
+        dest_dir=dest_dir)
+    return out_dict
+
+
+def collect_isomers(out_dict, dest_dir='.', dedup=None,
+                    dedup_threshold=None, dedup_mode='dedup'):
+    """
+    structures of the trajectory of a finished run, optionally deduplicated
+    """
+    res = gromacs_utils.extract_trajectory_structures(
+        out_dict['xtc_filename'], out_dict['trr_filename'],
+        out_dict['itpfile'], dest_dir=dest_dir)
+    if dedup:
+        res = deduplicate(res, method=dedup, threshold=dedup_threshold,
+                          mode=dedup_mode)
+    logger.debug(f"get_isomers: {len(res)} structures")
+    return res
+
+
+def check_resume(dest_dir='.', resume=False, extend_time=None):
+    """
+    Output:
+        (resume, continued), continued if the run of dest_dir is continued
+        from its checkpoint
+    """
+    resume = resume or bool(extend_time)
+    continued = resume and gromacs_utils.has_checkpoint(dest_dir)
+    if extend_time and not continued:
+        raise ValueError(f'no checkpoint of a run to extend in {dest_dir}')
+    return resume, continued
+
+
+def lookup_result(input_file, runtype, mdrun_file, topfile, extract_forces,
+                  dest_dir='.', timings=None, **args):
+    """
+    stored result of an identical run, see results
+    Output:
+        (result_key, out_dict or None)
+    """
+    with timings.stage('result_cache'):
+        result_key = results.get_result_key(
+            input_file, runtype, mdrun_file, topfile, extract_forces, **args)
+        out_dict = results.load_result(result_key, dest_dir)
+    if out_dict is not None:
+        out_dict['timings'] = timings.to_dict()
+    return result_key, out_dict
+
+
+def finish_run(out_dict, dest_dir='.', extract_forces=False, timings=None,
+               result_key=None):
+    """
+    outputs of a finished mdrun into out_dict, stored if result_key
+    """
+    collect_outputs(out_dict, dest_dir, extract_forces, timings)
+    if result_key:
+        out_dict['timings'] = timings.to_dict()
+        results.save_result(result_key, out_dict, dest_dir)
+    return out_dict
+
+
+def get_layout_summary(layout):
+    return layout and {key: layout[key] for key in ['ntmpi', 'ntomp']}
+
+
+def run(input_file, runtype='md', mdrun_file=None, dest_dir='.',
+        max_core: int = DEFAULT_MAX_CORE, device: str = 'cpu',
+        extract_forces: bool = False, topfile=None, itpfile=None,
+        dry_run: bool = False, cache_results: bool = False,
+        resume: bool = False, extend_time=None, progress=None,
+        autotune: bool = False, **args):
+    """
+    run automd
+    Input:
+        input_file: filename of input
+        dest_dir: directory where output will be saved
+        max_core: maximum number of cores
+        device: str, default cpu, but also gpu/auto
+        extract_forces: extract forces with output
+        topfile: run gromacs with given topfile
+        dry_run: bool, do not execute gromacs if true
+        cache_results: return the stored result of an identical run,
+            and store the result of this one
+        resume: continue the run of dest_dir from its topol.cpt,
+            a new run is started if there is no checkpoint
+        extend_time: lengthen the finished run of dest_dir by extend_time
+            (in time_unit) and continue it from its checkpoint
+        progress: callable, called with the progress of mdrun (step,
+            nsteps, fraction, remaining, ns_per_day...) while it runs
+        autotune: benchmark -ntmpi/-ntomp layouts if none is stored for
+            this host and system size, stored layouts are always used
+    Output:
+        dict, including all the calculated properties, the performance
+        summary of the mdrun log in 'performance' and the resource
+        usage of every stage in 'timings', see instrument.StageTimings
+    """
+    max_core = max_core or DEFAULT_MAX_CORE
+    resume, continued = check_resume(dest_dir, resume, extend_time)
+    result_key = None
+    timings = instrument.StageTimings(dest_dir)
+    if cache_results and not dry_run and not resume:
+        result_key, out_dict = lookup_result(
+            input_file, runtype, mdrun_file, topfile, extract_forces,
+            dest_dir, timings, **args)
+        if out_dict is not None:
+            return out_dict
+    logger.debug(f"max_core: {max_core}")
+    if continued:
+        # topol.tpr belongs to the checkpoint, its inputs are kept
+        out_dict = prepare_continued(
+            input_file, runtype, mdrun_file, dest_dir, topfile, itpfile,
+            timings=timings, **args)
+    else:
+        out_dict = prepare_run(input_file, runtype, mdrun_file, dest_dir,
+                               topfile, itpfile, timings=timings, **args)
+    logger.debug(f"{json.dumps(out_dict, indent=4)}")
+    if not dry_run:
+        if extend_time:
+            with timings.stage('extend_tpr'):
+                gromacs_utils.exec_extend_tpr(
+                    extend_time, args.get('time_unit', 'ps'),
+                    dest_dir=dest_dir)
+        with timings.stage('thread_layout'):
+            layout = get_thread_layout(out_dict['grofile'], max_core, device,
+                                       dest_dir, autotune)
+        out_dict['thread_layout'] = get_layout_summary(layout)
+        with timings.stage('mdrun'):
+            _fdict = gromacs_utils.exec_mdrun(
+                max_core, device=device, dest_dir=dest_dir, resume=continued,
+                progress=progress, layout=layout)
+        out_dict.update(_fdict)
+        logger.debug(f"{json.dumps(out_dict, indent=4)}")
+        finish_run(out_dict, dest_dir, extract_forces, timings, result_key)
+    out_dict['timings'] = timings.to_dict()
     logger.debug(f"{out_dict}")
     return out_dict
 
 
+def rerun_energies(structures, topfile, itpfile=None, dest_dir='.',
+                   mdrun_file=None, max_core: int = DEFAULT_MAX_CORE,
+                   device: str = 'cpu', **args):
+    """
+    energies and forces of many structures of one topology, e.g. the
+    isomers of get_isomers, by a single `gmx mdrun -rerun` of all of them
+    as frames of one trajectory against one tpr
+    Input:
+        structures: list of structure arrays, positions (and cell) in
+            Angstrom, atoms in the order of topfile; structures without
+            cell are centered in a cell of their extent
+        topfile/itpfile: topology of the structures
+        dest_dir: directory where output will be saved
+        mdrun_file: given mdp file, its output options are overridden
+        max_core: maximum number of cores
+        device: cpu/gpu/auto
+        **args: arguments for the mdp file, see run
+    Output:
+        dict, including energies_dict ({name: (nstructures,)}),
+        potential_energy (nstructures,) in eV, forces
+        (nstructures, natoms, 3) in eV/Ang and timings
+    """
+    frames = gromacs_utils.get_rerun_structures(structures)
+    if not frames:
+        raise ValueError('no structures to rerun')
+    # grompp runs in dest_dir
+    topfile = os.path.abspath(topfile)
+    itpfile = itpfile and os.path.abspath(itpfile)
+    os.makedirs(dest_dir, exist_ok=True)
+    timings = instrument.StageTimings(dest_dir)
+    with timings.stage('conversion'):
+        grofile = gromacs_utils.generate_gromacs_grofile(
+            None, dest_dir=dest_dir, notcenter=True, structure=frames[0])
+        rerun_filename = gromacs_utils.write_rerun_trajectory(
+            frames, dest_dir)
+    out_dict = prepare_inputs(grofile, 'md', mdrun_file, dest_dir, topfile,
+                              itpfile, timings=timings, **args)
+    out_dict['rerun_filename'] = rerun_filename
+    gromacs_utils.set_mdp_options(out_dict['mdrunfile'], RERUN_MDP_OPTIONS)
+    with timings.stage('grompp'):
+        gromacs_utils.exec_grompp(
+            out_dict['mdrunfile'], out_dict['topfile'], out_dict['grofile'],
+            dest_dir=dest_dir)
+    with timings.stage('thread_layout'):
+        layout = get_thread_layout(grofile, max_core, device, dest_dir)
+    with timings.stage('mdrun'):
+        out_dict.update(gromacs_utils.exec_mdrun(
+            max_core, device=device, dest_dir=dest_dir, layout=layout,
+            rerun=gromacs_utils.RERUN_TRR))
+    collect_outputs(out_dict, dest_dir, True, timings)
+    nframes = [len(out_dict['potential_energy']), len(out_dict['forces'])]
+    if nframes != [len(frames)] * 2:
+        raise OSError(f'rerun of {len(frames)} structures wrote '
+                      f'{nframes[0]} energy and {nframes[1]} force frames')
+    out_dict['timings'] = timings.to_dict()
+    return out_dict
+
+
 def get_isomers(input_file, mdrun_file=None, dest_dir='.', max_core=DEFAULT_MAX_CORE,
                 device: str = 'cpu', extract_forces=False, topfile=None,
-                dry_run=False, **args):
+                dry_run=False, dedup=None, dedup_threshold=None,
+                dedup_mode='dedup', replicas: int = 1,
+                replica_temperatures=None, **args):
     """
     get_isomers:
     Input:
@@ -132,14 +413,88 @@ def get_isomers(input_file, mdrun_file=None, dest_dir='.', max_core=DEFAULT_MAX_
         extract_forces: whether forces extracted
         topfile: given topology file, if None then will be generated automatically
         dry_run: whether to run
+        dedup: None/fingerprint/rmsd, keep one structure per cluster
+        dedup_threshold: threshold of dedup in Angstrom
+        dedup_mode: dedup/cluster, see dedup.cluster_positions
+        replicas: number of independent runs with different gen_seed,
+            run concurrently in dest_dir/replica_XX, frames merged,
+            cache_results/resume/extend_time are not supported then
+        replica_temperatures: optional temperature (K) of each replica
         **args: arguments for MD simulation
     Output:
         isomers: json format
     """
-    out_dict = run(input_file, mdrun_file, dest_dir, max_core, device,
-                   extract_forces, topfile=topfile,
+    if replicas > 1:
+        from .replicas import get_replica_isomers
+        return get_replica_isomers(
+            input_file, replicas, dedup=dedup,
+            dedup_threshold=dedup_threshold, dedup_mode=dedup_mode,
+            mdrun_file=mdrun_file, dest_dir=dest_dir, max_core=max_core,
+            device=device, extract_forces=extract_forces, topfile=topfile,
+            dry_run=dry_run, temperatures=replica_temperatures, **args)
+    out_dict = run(input_file, mdrun_file=mdrun_file, dest_dir=dest_dir,
+                   max_core=max_core, device=device,
+                   extract_forces=extract_forces, topfile=topfile,
                    dry_run=dry_run, **args)
-    output_gro = out_dict['output_gro']
-    res = gromacs_utils.extract_structures(output_gro)
-    logger.debug(f"get_isomers: {res}")
-    return res
+    if dry_run:
+        return []
+    return collect_isomers(out_dict, dest_dir, dedup, dedup_threshold,
+                           dedup_mode)
+
+
+def iter_isomers(input_file, mdrun_file=None, dest_dir='.',
+                 max_core=DEFAULT_MAX_CORE, device: str = 'cpu',
+                 topfile=None, poll_interval: float = 1.0, **args):
+    """
+    iter_isomers: yield structures while mdrun is still running
+    Input:
+        input_file: filename of inputfile
+        dest_dir: directory of destination
+        max_core: maximum core available
+        device: cpu/gpu/auto
+        topfile: given topology file, if None then will be generated automatically
+        poll_interval: seconds between two reads of the growing xtc file
+        **args: arguments for MD simulation
+    Output:
+        generator of structures, mdrun is killed if the generator is closed
+    """
+    out_dict = prepare_run(input_file, mdrun_file=mdrun_file,
+                           dest_dir=dest_dir, topfile=topfile, **args)
+    out_dict.update(gromacs_utils.get_mdrun_output(dest_dir))
+    symbols = gromacs_utils.get_itp_element_symbols(out_dict['itpfile'])
+    if os.path.exists(out_dict['xtc_filename']):
+        os.remove(out_dict['xtc_filename'])
+    follower = xtc.XTCFollower(out_dict['xtc_filename'])
+    nframes = 0
+    max_core = max_core or DEFAULT_MAX_CORE
+    cores = affinity.acquire_cores(max_core)
+    try:
+        process = gromacs_utils.start_mdrun(
+            max_core, device=device, dest_dir=dest_dir, cores=cores)
+    except Exception:
+        affinity.release_cores(cores)
+        raise
+    try:
+        while True:
+            finished = process.poll() is not None
+            for header, coords in follower.read():
+                nframes += 1
+                yield gromacs_utils.build_structure(
+                    symbols, coords, header['box'],
+                    step=header['step'], time=header['time'])
+            if finished:
+                break
+            time.sleep(poll_interval)
+    finally:
+        if process.poll() is None:
+            logger.debug("iter_isomers closed, kill mdrun")
+            process.kill()
+            process.wait()
+        affinity.release_cores(cores)
+    if process.returncode != 0:
+        raise OSError('mdrun error')
+    if nframes == 0:
+        # no xtc output, e.g. nstxout_compressed = 0
+        yield from gromacs_utils.iextract_trajectory_structures(
+            out_dict['xtc_filename'], out_dict['trr_filename'],
+            out_dict['itpfile'], dest_dir=dest_dir)
@@ -0,0 +1,84 @@
+"""
+
+
+topology cache of OBGMX output
+
+
+Topologies are keyed by elements, connectivity and the OBGMX switches,
+so the same molecule is typed only once.
+
+
+"""
+
+
+import os
+import shutil
+
+import numpy as np
+import modlog
+
+from ..cache import DiskCache, hash_key
+from .perception import get_bonds
+
+
+logger = modlog.getLogger(__name__)
+TOPOLOGY_CACHE = DiskCache('topology', max_size=64 * 1024 ** 2)
+TOPOLOGY_FILES = ['obgmx.top', 'obgmx.itp']
+POSITION_DECIMALS = 4
+
+
+def get_topology_key(symbols, positions, obgmx_method='exe',
+                     use_geom_bond=False,
+                     use_geom_angle=False,
+                     use_geom_dihedral=False,
+                     use_harmonic_angle=False):
+    """
+    cache key of a topology
+    Input:
+        symbols: element symbols
+        positions: (natoms, 3) positions in Angstrom
+        obgmx_method/use_*: switches of OBGMX
+    Output:
+        str, key of TOPOLOGY_CACHE
+    """
+    bonds = get_bonds(symbols, positions)
+    parts = {
+        'symbols': list(symbols),
+        'bonds': bonds.tolist(),
+        'obgmx_method': obgmx_method,
+        'use_geom_bond': use_geom_bond,
+        'use_geom_angle': use_geom_angle,
+        'use_geom_dihedral': use_geom_dihedral,
+        'use_harmonic_angle': use_harmonic_angle,
+    }
+    if use_geom_bond or use_geom_angle or use_geom_dihedral:
+        # equilibrium values are taken from the geometry
+        parts['positions'] = np.round(
+            positions, POSITION_DECIMALS).tolist()
+    return hash_key('obgmx', parts)
+
+
+def load_topology(key, dest_dir='.'):
+    """
+    copy cached obgmx.top/obgmx.itp to dest_dir
+    Output:
+        (top_filename, itp_filename), None if not cached
+    """
+    entry = TOPOLOGY_CACHE.get(key)
+    if entry is None:
+        return None
+    filenames = list()
+    for fname in TOPOLOGY_FILES:
+        dest_fname = os.path.realpath(os.path.join(dest_dir, fname))
+        try:
+            shutil.copyfile(os.path.join(entry, fname), dest_fname)
+        except FileNotFoundError:
+            return None
+        filenames.append(dest_fname)
+    logger.debug(f"topology cache hit: {key}")
+    return tuple(filenames)
+
+
+def save_topology(key, top_filename, itp_filename):
+    TOPOLOGY_CACHE.put(key, dict(zip(
+        TOPOLOGY_FILES, [top_filename, itp_filename])))
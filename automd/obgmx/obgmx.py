@@ -18,12 +18,15 @@ import atomtools.filetype
 import pdb
 import chemio
 
+from .cache import get_topology_key, load_topology, save_topology
+from .uff import generate_uff_topfile
+
 
 BASEDIR = os.path.dirname(os.path.realpath(__file__))
 linuxdist = distro.linux_distribution(full_distribution_name=False)[0]
 
 
-SUPPORTED_OBGMX_METHODS = ['online', 'exe']
+SUPPORTED_OBGMX_METHODS = ['online', 'exe', 'python']
 OBGMX_EXE_FNAME = os.path.join(BASEDIR, 'exe', 'obgmx')
 
 logger = modlog.getLogger(__name__)
@@ -162,45 +165,74 @@ def generate_gromacs_obgmx_UFF_topfile(
         use_geom_angle=False,
         use_geom_dihedral=False,
         use_harmonic_angle=False,
+        use_cache=True,
+        structure=None,
 ):
     """
     generate gromacs UFF top/itp file with OBGMX
     Input:
-        filename: structure file
+        filename: structure file, a .xyz file is passed to obgmx as is
         input_format: format of the input
-        obgmx_method: must be exe
+        obgmx_method: exe, the obgmx executable
+                      python, in-process UFF of automd.obgmx.uff
         dest_dir: destination directory, default is '.'
+        use_cache: reuse topology of the same molecule from topology cache
+        structure: parsed arrays of filename, read from filename if None
     Output:
         realpath of obgmx.top file
     """
-    # import chemio
-    assert obgmx_method == 'exe', 'obgmx_method must be "exe"'
-    xyzfilename = filename
-    xyzfilename = os.path.join(dest_dir, xyzfilename)
-    rm_flag = False
-    if isinstance(xyzfilename, str) and not xyzfilename.endswith('.xyz'):
-        xyzfilename = tempfile.mktemp(suffix='.xyz', prefix='automd')
-    if not os.path.exists(xyzfilename):
-        # format_convert(filename, xyzfilename, outputformat='xyz')
-        rm_flag = True
-        chemio.convert(filename, xyzfilename,
-                       read_format=input_format, write_format='xyz')
+    from ..gromacs_utils import INPUT_XYZ
+    from ..fileio import read_structure, write_xyz
+    assert obgmx_method in ['exe', 'python'], \
+        'obgmx_method must be "exe" or "python"'
+    if structure is None:
+        structure = read_structure(filename, input_format)
+    if use_cache:
+        cache_key = get_topology_key(
+            structure['symbols'], structure['positions'], obgmx_method,
+            use_geom_bond, use_geom_angle,
+            use_geom_dihedral, use_harmonic_angle)
+        filenames = load_topology(cache_key, dest_dir)
+        if filenames:
+            return filenames
+    if obgmx_method == 'python':
+        top_filename, itp_filename = generate_uff_topfile(
+            structure['symbols'], structure['positions'], dest_dir,
+            use_geom_bond, use_geom_angle,
+            use_geom_dihedral, use_harmonic_angle)
+        if use_cache:
+            save_topology(cache_key, top_filename, itp_filename)
+        return top_filename, itp_filename
+    if isinstance(filename, str) and filename.endswith('.xyz') and \
+            input_format in [None, 'xyz']:
+        xyzfilename = os.path.abspath(filename)
+    else:
+        xyzfilename = os.path.abspath(os.path.join(dest_dir, INPUT_XYZ))
+        write_xyz(xyzfilename, structure)
     geom_switch = 0
     geom_switch += 1 if use_geom_bond else 0
     geom_switch += 2 if use_geom_angle else 0
     geom_switch += 4 if use_geom_dihedral else 0
+    cmd = [OBGMX_EXE_FNAME, '-d', '-G', str(geom_switch), xyzfilename]
     if use_harmonic_angle:
-        cmd = f"cd {dest_dir}; {OBGMX_EXE_FNAME} -H -d -G {geom_switch} {xyzfilename}"
-    else:
-        cmd = f"cd {dest_dir}; {OBGMX_EXE_FNAME} -d -G {geom_switch} {xyzfilename}"
-    logger.info(cmd)
-    status, stdout = subprocess.getstatusoutput(cmd)
-    if rm_flag:
-        os.remove(xyzfilename)
-    if status != 0:
-        raise RuntimeError(stdout)
+        cmd.insert(1, '-H')
     top_filename = os.path.realpath(os.path.join(dest_dir, 'obgmx.top'))
     itp_filename = os.path.realpath(os.path.join(dest_dir, 'obgmx.itp'))
+    # the obgmx wrapper exits with 0 even if obgmx failed
+    for fname in [top_filename, itp_filename]:
+        if os.path.exists(fname):
+            os.remove(fname)
+    logger.info(' '.join(cmd))
+    proc = subprocess.run(cmd, cwd=dest_dir, stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT, universal_newlines=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stdout)
+    for fname in [top_filename, itp_filename]:
+        if not os.path.exists(fname) or os.path.getsize(fname) == 0:
+            raise RuntimeError(f'obgmx wrote no {os.path.basename(fname)}:'
+                               f'\n{proc.stdout}')
+    if use_cache:
+        save_topology(cache_key, top_filename, itp_filename)
     return top_filename, itp_filename
 
 
@@ -0,0 +1,107 @@
+"""
+
+
+perception of bonds from geometry, the same rule as Open Babel
+
+
+"""
+
+
+import os
+import functools
+import itertools
+
+import numpy as np
+
+
+BASEDIR = os.path.dirname(os.path.realpath(__file__))
+ELEMENT_FNAME = os.path.join(BASEDIR, 'exe', 'openbabel-data', 'element.txt')
+BOND_TOLERANCE = 0.45
+MIN_BOND_LENGTH = 0.4
+UNKNOWN_COVALENT_RADIUS = 1.6
+
+
+@functools.lru_cache(maxsize=None)
+def get_element_table():
+    """
+    element table of Open Babel
+    Output:
+        dict, {symbol: {'number', 'rcov', 'maxbond', 'mass', 'elneg'}}
+    """
+    table = dict()
+    with open(ELEMENT_FNAME) as fd:
+        for line in fd:
+            if line.startswith('#') or not line.strip():
+                continue
+            fields = line.split()
+            table[fields[1]] = {
+                'number': int(fields[0]),
+                'rcov': float(fields[3]),
+                'maxbond': int(fields[6]),
+                'mass': float(fields[7]),
+                'elneg': float(fields[8]),
+            }
+    return table
+
+
+def get_covalent_radii(symbols):
+    table = get_element_table()
+    return np.array([table[s]['rcov'] if s in table
+                     else UNKNOWN_COVALENT_RADIUS for s in symbols])
+
+
+def get_neighbor_pairs(positions, cutoff):
+    """
+    pairs of atoms closer than cutoff, by a cell list of cutoff sized
+    cells, without the (natoms, natoms) distance matrix
+    Input:
+        positions: (natoms, 3) positions
+        cutoff: float, same unit as positions
+    Output:
+        (npairs, 2) int array, i < j, sorted, and (npairs,) distances
+    """
+    positions = np.asarray(positions, dtype=float).reshape((-1, 3))
+    natoms = len(positions)
+    pairs = [np.empty((0, 2), dtype=int)]
+    if natoms > 1:
+        cells = np.floor((positions - positions.min(axis=0)) /
+                         cutoff).astype(np.int64) + 1
+        # one empty layer of cells around, so every neighbour cell exists
+        dims = cells.max(axis=0) + 2
+        keys = np.ravel_multi_index(cells.T, dims)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        for offset in itertools.product([-1, 0, 1], repeat=3):
+            neighbors = np.ravel_multi_index((cells + offset).T, dims)
+            start = np.searchsorted(sorted_keys, neighbors, 'left')
+            counts = np.searchsorted(sorted_keys, neighbors, 'right') - start
+            i = np.repeat(np.arange(natoms), counts)
+            first = np.repeat(start - np.cumsum(counts) + counts, counts)
+            j = order[first + np.arange(counts.sum())]
+            pairs.append(np.stack([i, j], axis=1)[i < j])
+    pairs = np.concatenate(pairs)
+    pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+    dist = np.linalg.norm(positions[pairs[:, 0]] - positions[pairs[:, 1]],
+                          axis=1)
+    keep = dist < cutoff
+    return pairs[keep], dist[keep]
+
+
+def get_bonds(symbols, positions):
+    """
+    bonds perceived from geometry:
+        MIN_BOND_LENGTH < d_ij < rcov_i + rcov_j + BOND_TOLERANCE
+    Input:
+        symbols: list of element symbols
+        positions: (natoms, 3) positions in Angstrom
+    Output:
+        (nbonds, 2) int array, i < j, sorted
+    """
+    radii = get_covalent_radii(symbols)
+    if len(radii) < 2:
+        return np.empty((0, 2), dtype=int)
+    pairs, dist = get_neighbor_pairs(
+        positions, 2 * radii.max() + BOND_TOLERANCE)
+    cutoff = radii[pairs[:, 0]] + radii[pairs[:, 1]] + BOND_TOLERANCE
+    bonded = (dist > MIN_BOND_LENGTH) & (dist < cutoff)
+    return pairs[bonded].astype(int)
@@ -0,0 +1,473 @@
+"""
+
+
+in-process UFF topology, an alternative to the obgmx executable
+
+
+Bonds are perceived from geometry, UFF atom types are assigned from
+coordination, ring planarity and bond lengths, and the parameters are
+computed from the UFF table bundled with openbabel-data (UFF.prm).
+
+Charges are zero, UFF itself has no charge model.
+
+
+"""
+
+
+import os
+import re
+import functools
+
+import numpy as np
+import modlog
+
+from .perception import BASEDIR, get_bonds, get_element_table
+
+
+logger = modlog.getLogger(__name__)
+UFF_PRM_FNAME = os.path.join(BASEDIR, 'exe', 'openbabel-data', 'UFF.prm')
+UFF_PARAM_KEYS = ['r1', 'theta0', 'x1', 'D1', 'zeta', 'Z1',
+                  'Vi', 'Uj', 'Xi', 'Hard', 'Radius']
+KCAL_TO_KJ = 4.184
+ANG_TO_NM = 0.1
+BOND_ORDER_CONSTANT = 0.1332
+FORCE_CONSTANT = 664.12
+LINEAR_ANGLE = 175.0
+GROUP16 = ['O', 'S', 'Se', 'Te', 'Po']
+MOLECULE_NAME = 'MOL'
+
+
+@functools.lru_cache(maxsize=None)
+def get_uff_parameters():
+    """
+    UFF parameters of UFF.prm
+    Output:
+        names: list of atom types
+        params: (ntypes, len(UFF_PARAM_KEYS)) array
+        generic_types: {atomic number: generic atom type}
+    """
+    names, params, generic_types = list(), list(), dict()
+    with open(UFF_PRM_FNAME) as fd:
+        for line in fd:
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0] == 'atom':
+                match = re.match(r'^\[#(\d+)\]$', fields[1])
+                if match:
+                    generic_types.setdefault(int(match[1]), fields[2])
+            elif fields[0] == 'param':
+                names.append(fields[1])
+                params.append([float(x) for x in fields[2:13]])
+    return names, np.array(params), generic_types
+
+
+def get_type_params(atomtypes):
+    """
+    (natoms,) structured view of UFF parameters of atomtypes
+    Output:
+        dict, {key of UFF_PARAM_KEYS: (natoms,) array}
+    """
+    names, params, _ = get_uff_parameters()
+    index = [names.index(x) for x in atomtypes]
+    return dict(zip(UFF_PARAM_KEYS, params[index].T))
+
+
+def get_neighbors(natoms, bonds):
+    neighbors = [list() for _ in range(natoms)]
+    for i, j in bonds:
+        neighbors[i].append(j)
+        neighbors[j].append(i)
+    return neighbors
+
+
+def get_angle(positions, i, j, k):
+    """
+    angle i-j-k in degree
+    """
+    v1 = positions[i] - positions[j]
+    v2 = positions[k] - positions[j]
+    cos = v1 @ v2 / np.linalg.norm(v1) / np.linalg.norm(v2)
+    return np.degrees(np.arccos(np.clip(cos, -1, 1)))
+
+
+def get_dihedral(positions, i, j, k, l):
+    """
+    dihedral i-j-k-l in degree, IUPAC convention as gromacs
+    """
+    b1 = positions[j] - positions[i]
+    b2 = positions[k] - positions[j]
+    b3 = positions[l] - positions[k]
+    n1 = np.cross(b1, b2)
+    n2 = np.cross(b2, b3)
+    m1 = np.cross(n1, b2 / np.linalg.norm(b2))
+    return np.degrees(np.arctan2(m1 @ n2, n1 @ n2))
+
+
+def find_rings(neighbors, max_size=6):
+    """
+    simple cycles of at most max_size atoms, as sorted tuples
+    """
+    rings = set()
+
+    def walk(path):
+        for nxt in neighbors[path[-1]]:
+            if nxt == path[0] and len(path) >= 3:
+                rings.add(tuple(sorted(path)))
+            elif nxt > path[0] and nxt not in path and len(path) < max_size:
+                walk(path + [nxt])
+
+    for start in range(len(neighbors)):
+        walk([start])
+    return [list(ring) for ring in rings]
+
+
+def is_planar(positions, atoms, tolerance=0.1):
+    coords = positions[atoms] - positions[atoms].mean(axis=0)
+    # smallest singular value ~ deviation from the best plane
+    return np.linalg.svd(coords, compute_uv=False)[-1] < \
+        tolerance * np.sqrt(len(atoms))
+
+
+def get_aromatic_rings(symbols, positions, neighbors):
+    aromatic = list()
+    allowed_degrees = {'C': [3], 'N': [2, 3], 'O': [2], 'S': [2],
+                       'B': [3], 'P': [2, 3]}
+    for ring in find_rings(neighbors):
+        if len(ring) not in [5, 6]:
+            continue
+        if all(len(neighbors[i]) in allowed_degrees.get(symbols[i], [])
+               for i in ring) and is_planar(positions, ring):
+            aromatic.append(ring)
+    return aromatic
+
+
+def is_linear(positions, center, neighbors):
+    return len(neighbors) == 2 and \
+        get_angle(positions, neighbors[0], center, neighbors[1]) > 155
+
+
+def is_pyramidal(positions, center, neighbors):
+    angles = [get_angle(positions, a, center, b)
+              for n, a in enumerate(neighbors) for b in neighbors[n+1:]]
+    return sum(angles) < 350
+
+
+def assign_atomtypes(symbols, positions, neighbors, aromatic_atoms):
+    """
+    UFF atom types from coordination and geometry
+    """
+    table = get_element_table()
+    names, _, generic_types = get_uff_parameters()
+    atomtypes = list()
+    for i, symbol in enumerate(symbols):
+        nbrs = neighbors[i]
+        degree = len(nbrs)
+        atomtype = None
+        if symbol == 'H':
+            atomtype = 'H_b' if degree == 2 else 'H_'
+        elif symbol == 'C':
+            if i in aromatic_atoms:
+                atomtype = 'C_R'
+            elif degree >= 4:
+                atomtype = 'C_3'
+            elif degree == 3:
+                atomtype = 'C_2'
+            elif is_linear(positions, i, nbrs) or degree == 1:
+                atomtype = 'C_1'
+            else:
+                atomtype = 'C_2'
+        elif symbol == 'N':
+            if i in aromatic_atoms:
+                atomtype = 'N_R'
+            elif degree >= 4:
+                atomtype = 'N_3'
+            elif degree == 3:
+                atomtype = 'N_3' if is_pyramidal(positions, i, nbrs) \
+                    else 'N_2'
+            elif is_linear(positions, i, nbrs) or degree == 1:
+                atomtype = 'N_1'
+            else:
+                atomtype = 'N_2'
+        elif symbol == 'O':
+            if i in aromatic_atoms:
+                atomtype = 'O_R'
+            elif degree == 1 and symbols[nbrs[0]] != 'H':
+                atomtype = 'O_2'
+            elif is_linear(positions, i, nbrs):
+                atomtype = 'O_1'
+            else:
+                atomtype = 'O_3'
+        elif symbol == 'S':
+            if i in aromatic_atoms:
+                atomtype = 'S_R'
+            elif degree == 1:
+                atomtype = 'S_2'
+            elif degree == 3:
+                atomtype = 'S_3+4'
+            elif degree >= 4:
+                atomtype = 'S_3+6'
+            else:
+                atomtype = 'S_3+2'
+        elif symbol == 'P':
+            atomtype = 'P_3+5' if degree >= 4 else 'P_3+3'
+        elif symbol == 'B':
+            atomtype = 'B_3' if degree >= 4 else 'B_2'
+        else:
+            atomtype = generic_types.get(table[symbol]['number'])
+        if atomtype not in names:
+            raise ValueError(f'no UFF atom type for atom {i+1} {symbol}')
+        atomtypes.append(atomtype)
+    return atomtypes
+
+
+def get_hybridization(atomtype):
+    """
+    1/2/3 for sp/sp2/sp3, 2 for resonant, 0 for others
+    """
+    if len(atomtype) > 2 and atomtype[1] == '_' and atomtype[2] in '123R':
+        return 2 if atomtype[2] == 'R' else int(atomtype[2])
+    return 0
+
+
+def get_bond_orders(bonds, atomtypes, positions, params, aromatic_rings):
+    """
+    bond orders from hybridization and bond lengths
+    """
+    orders = np.ones(len(bonds))
+    for n, (i, j) in enumerate(bonds):
+        hi = get_hybridization(atomtypes[i])
+        hj = get_hybridization(atomtypes[j])
+        if hi in [0, 3] or hj in [0, 3]:
+            continue
+        if atomtypes[i].endswith('_R') and atomtypes[j].endswith('_R') and \
+                any(i in ring and j in ring for ring in aromatic_rings):
+            orders[n] = 1.5
+            continue
+        rsum = params['r1'][i] + params['r1'][j]
+        dist = np.linalg.norm(positions[i] - positions[j])
+        estimate = np.exp((rsum - dist) / (BOND_ORDER_CONSTANT * rsum))
+        max_order = 3 if hi == 1 and hj == 1 else 2
+        orders[n] = min(max_order, max(1, round(estimate)))
+    return orders
+
+
+def get_bond_length(i, j, order, params):
+    """
+    UFF natural bond length in Angstrom
+    """
+    ri, rj = params['r1'][i], params['r1'][j]
+    xi, xj = params['Xi'][i], params['Xi'][j]
+    r_bo = -BOND_ORDER_CONSTANT * (ri + rj) * np.log(order)
+    r_en = ri * rj * (np.sqrt(xi) - np.sqrt(xj)) ** 2 / (xi * ri + xj * rj)
+    return ri + rj + r_bo - r_en
+
+
+def get_torsion(j, k, order, atomtypes, symbols, params):
+    """
+    UFF torsion about bond j-k
+    Output:
+        (V in kcal/mol, n, phi0 in degree), None if no torsion
+    """
+    hj = get_hybridization(atomtypes[j])
+    hk = get_hybridization(atomtypes[k])
+    if hj in [0, 1] or hk in [0, 1]:
+        return None
+    if hj == 3 and hk == 3:
+        if symbols[j] in GROUP16 and symbols[k] in GROUP16:
+            vj = 2.0 if symbols[j] == 'O' else 6.8
+            vk = 2.0 if symbols[k] == 'O' else 6.8
+            return np.sqrt(vj * vk), 2, 90.0
+        return np.sqrt(params['Vi'][j] * params['Vi'][k]), 3, 180.0
+    if hj == 2 and hk == 2:
+        return 5 * np.sqrt(params['Uj'][j] * params['Uj'][k]) * \
+            (1 + 4.18 * np.log(order)), 2, 180.0
+    sp3 = j if hj == 3 else k
+    if symbols[sp3] in GROUP16:
+        return 5 * np.sqrt(params['Uj'][j] * params['Uj'][k]) * \
+            (1 + 4.18 * np.log(order)), 2, 90.0
+    return 1.0, 6, 0.0
+
+
+def get_uff_topology(symbols, positions,
+                     use_geom_bond=False,
+                     use_geom_angle=False,
+                     use_geom_dihedral=False,
+                     use_harmonic_angle=False):
+    """
+    UFF topology of a molecule
+    Input:
+        symbols: element symbols
+        positions: (natoms, 3) positions in Angstrom
+        use_geom_*: take equilibrium values from the geometry
+        use_harmonic_angle: harmonic angles instead of G96 angles
+    Output:
+        dict of atomtypes/atoms/bonds/pairs/angles/dihedrals tables,
+        units of gromacs (nm, degree, kJ/mol)
+    """
+    positions = np.asarray(positions, dtype=float)
+    natoms = len(symbols)
+    table = get_element_table()
+    bonds = get_bonds(symbols, positions)
+    neighbors = get_neighbors(natoms, bonds)
+    aromatic_rings = get_aromatic_rings(symbols, positions, neighbors)
+    aromatic_atoms = set(i for ring in aromatic_rings for i in ring)
+    atomtypes = assign_atomtypes(symbols, positions, neighbors,
+                                 aromatic_atoms)
+    params = get_type_params(atomtypes)
+    orders = get_bond_orders(bonds, atomtypes, positions, params,
+                             aromatic_rings)
+    bond_order = dict()
+    lengths = dict()
+    topology = {'atomtypes': dict(), 'atoms': list(), 'bonds': list(),
+                'pairs': list(), 'angles': list(), 'dihedrals': list()}
+    for i, (symbol, atomtype) in enumerate(zip(symbols, atomtypes)):
+        sigma = params['x1'][i] * ANG_TO_NM / 2 ** (1 / 6)
+        epsilon = params['D1'][i] * KCAL_TO_KJ
+        topology['atomtypes'][atomtype] = (
+            table[symbol]['number'], table[symbol]['mass'], sigma, epsilon)
+        topology['atoms'].append((atomtype, f'{symbol}{i+1}',
+                                  0.0, table[symbol]['mass']))
+    for (i, j), order in zip(bonds, orders):
+        r0 = get_bond_length(i, j, order, params)
+        bond_order[i, j] = bond_order[j, i] = order
+        lengths[i, j] = lengths[j, i] = r0
+        zi, zj = params['Z1'][i], params['Z1'][j]
+        kb = FORCE_CONSTANT * zi * zj / r0 ** 3
+        if use_geom_bond:
+            r0 = np.linalg.norm(positions[i] - positions[j])
+        topology['bonds'].append(
+            (i, j, 1, r0 * ANG_TO_NM, kb * KCAL_TO_KJ / ANG_TO_NM ** 2))
+    for j in range(natoms):
+        for n, i in enumerate(neighbors[j]):
+            for k in neighbors[j][n+1:]:
+                theta0 = params['theta0'][j]
+                cos0 = np.cos(np.radians(theta0))
+                rij, rjk = lengths[i, j], lengths[j, k]
+                rik2 = rij ** 2 + rjk ** 2 - 2 * rij * rjk * cos0
+                ka = FORCE_CONSTANT * \
+                    params['Z1'][i] * params['Z1'][k] / rik2 ** 2.5 * \
+                    (3 * rij * rjk * (1 - cos0 ** 2) - rik2 * cos0)
+                if use_geom_angle:
+                    theta0 = get_angle(positions, i, j, k)
+                ka *= KCAL_TO_KJ
+                if use_harmonic_angle or theta0 > LINEAR_ANGLE:
+                    topology['angles'].append((i, j, k, 1, theta0, ka))
+                else:
+                    ka /= np.sin(np.radians(theta0)) ** 2
+                    topology['angles'].append((i, j, k, 2, theta0, ka))
+    pairs = set()
+    for j, k in bonds:
+        torsion = get_torsion(j, k, bond_order[j, k], atomtypes,
+                              symbols, params)
+        nj, nk = len(neighbors[j]) - 1, len(neighbors[k]) - 1
+        for i in neighbors[j]:
+            for l in neighbors[k]:
+                if i in [j, k] or l in [j, k] or i == l:
+                    continue
+                pair = (min(i, l), max(i, l))
+                if l not in neighbors[i] and pair not in pairs:
+                    pairs.add(pair)
+                if torsion is None:
+                    continue
+                barrier, multiplicity, phi0 = torsion
+                kd = barrier / 2 / (nj * nk) * KCAL_TO_KJ
+                # 1/2 V [1 - cos(n phi0) cos(n phi)] = kd (1 + cos(n phi - phis))
+                phis = 0.0 if np.cos(np.radians(multiplicity * phi0)) < 0 \
+                    else 180.0
+                if use_geom_dihedral:
+                    phi = get_dihedral(positions, i, j, k, l)
+                    phis = (multiplicity * phi) % 360 - 180.0
+                topology['dihedrals'].append(
+                    (i, j, k, l, 1, phis, kd, multiplicity))
+    for i, atomtype in enumerate(atomtypes):
+        if len(neighbors[i]) != 3 or atomtype not in \
+                ['C_2', 'C_R', 'N_2', 'N_R']:
+            continue
+        kinv = 6.0
+        if atomtype.startswith('C') and \
+                any(atomtypes[x] == 'O_2' for x in neighbors[i]):
+            kinv = 50.0
+        j, k, l = neighbors[i]
+        topology['dihedrals'].append((i, j, k, l, 2, 0.0, kinv * KCAL_TO_KJ))
+    topology['pairs'] = sorted(pairs)
+    return topology
+
+
+def format_itp(topology, name=MOLECULE_NAME):
+    """
+    itp string of a topology of get_uff_topology
+    """
+    lines = ['; UFF topology generated by automd', '',
+             '[ atomtypes ]',
+             '; name  at.num      mass    charge ptype       sigma     epsilon']
+    for atomtype, (number, mass, sigma, epsilon) in \
+            topology['atomtypes'].items():
+        lines.append(f'{atomtype:<7s} {number:6d} {mass:10.5f} {0:9.4f} '
+                     f'{"A":>5s} {sigma:11.5e} {epsilon:11.5e}')
+    lines += ['', '[ moleculetype ]', '; name  nrexcl', f'{name}  3',
+              '', '[ atoms ]',
+              ';   nr    type  resnr  residue  atom   cgnr     charge'
+              '       mass']
+    for i, (atomtype, atomname, charge, mass) in \
+            enumerate(topology['atoms']):
+        lines.append(f'{i+1:6d} {atomtype:>7s} {1:6d} {name:>8s} '
+                     f'{atomname:>5s} {i+1:6d} {charge:10.5f} {mass:10.5f}')
+    lines += ['', '[ bonds ]', ';  ai    aj funct         b0         kb']
+    for i, j, funct, b0, kb in topology['bonds']:
+        lines.append(f'{i+1:5d} {j+1:5d} {funct:5d} {b0:10.5f} {kb:12.3f}')
+    lines += ['', '[ pairs ]', ';  ai    aj funct']
+    for i, l in topology['pairs']:
+        lines.append(f'{i+1:5d} {l+1:5d} {1:5d}')
+    lines += ['', '[ angles ]',
+              ';  ai    aj    ak funct     theta0         ktheta']
+    for i, j, k, funct, theta0, ka in topology['angles']:
+        lines.append(f'{i+1:5d} {j+1:5d} {k+1:5d} {funct:5d} '
+                     f'{theta0:10.4f} {ka:14.4f}')
+    lines += ['', '[ dihedrals ]',
+              ';  ai    aj    ak    al funct        phi          k  mult']
+    for dihedral in topology['dihedrals']:
+        i, j, k, l, funct, phi, kd = dihedral[:7]
+        line = f'{i+1:5d} {j+1:5d} {k+1:5d} {l+1:5d} {funct:5d} ' \
+            f'{phi:10.4f} {kd:10.5f}'
+        if funct == 1:
+            line += f' {dihedral[7]:5d}'
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+def format_top(itp_basename, name=MOLECULE_NAME):
+    """
+    top string including itp_basename
+    """
+    return '\n'.join([
+        '; UFF topology generated by automd', '',
+        '[ defaults ]',
+        '; nbfunc  comb-rule  gen-pairs  fudgeLJ  fudgeQQ',
+        '1         3          yes        1.0      1.0', '',
+        f'#include "{itp_basename}"', '',
+        '[ system ]', name, '',
+        '[ molecules ]', f'{name}  1', ''])
+
+
+def generate_uff_topfile(symbols, positions, dest_dir='.',
+                         use_geom_bond=False,
+                         use_geom_angle=False,
+                         use_geom_dihedral=False,
+                         use_harmonic_angle=False):
+    """
+    write obgmx.top/obgmx.itp of a molecule without the obgmx executable
+    Output:
+        realpath of top file and itp file
+    """
+    topology = get_uff_topology(
+        symbols, positions, use_geom_bond, use_geom_angle,
+        use_geom_dihedral, use_harmonic_angle)
+    top_filename = os.path.realpath(os.path.join(dest_dir, 'obgmx.top'))
+    itp_filename = os.path.realpath(os.path.join(dest_dir, 'obgmx.itp'))
+    with open(itp_filename, 'w') as fd:
+        fd.write(format_itp(topology))
+    with open(top_filename, 'w') as fd:
+        fd.write(format_top(os.path.basename(itp_filename)))
+    logger.debug(f"uff topology: {top_filename}")
+    return top_filename, itp_filename
@@ -0,0 +1,160 @@
+"""
+
+independent MD replicas of one molecule
+
+The gro/top/itp files are prepared once in dest_dir, every replica gets its
+own mdp (gen-vel with its own gen-seed, optionally its own temperature),
+tpr and trajectory in dest_dir/replica_XX, and the replicas run
+concurrently with the cores split between them.
+
+
+"""
+
+import os
+import random
+import concurrent.futures
+
+import modlog
+
+from . import gromacs_utils
+from . import main
+from .autotune import get_thread_layout
+
+
+logger = modlog.getLogger(__name__)
+REPLICA_DIR_FORMAT = 'replica_{:02d}'
+# options of automd.run that replicas do not support
+UNSUPPORTED_OPTIONS = ['cache_results', 'resume', 'extend_time']
+
+
+def get_replica_dir(dest_dir, index):
+    return os.path.join(dest_dir, REPLICA_DIR_FORMAT.format(index))
+
+
+def get_replica_seeds(replicas, gen_seed=-1):
+    """
+    gen-seed of each replica, consecutive from gen_seed, random if -1
+    """
+    if gen_seed is None or gen_seed == -1:
+        gen_seed = random.SystemRandom().randrange(2 ** 30)
+    return [gen_seed + i for i in range(replicas)]
+
+
+def prepare_replicas(input_file, replicas, mdrun_file=None, dest_dir='.',
+                     topfile=None, itpfile=None, temperatures=None,
+                     gen_seed=-1, **args):
+    """
+    shared gro/top/itp and one mdp/tpr per replica
+    Input:
+        input_file: filename of input
+        replicas: number of replicas
+        mdrun_file: given mdp file, velocity options are set per replica
+        temperatures: list of temperatures (K) of the replicas,
+            default the temperature of the mdrun config for all
+        gen_seed: seed of the first replica, random if -1
+        **args: arguments for MD simulation, see prepare_inputs
+    Output:
+        list of out_dict of replicas, including replica, gen_seed,
+        temperature and dest_dir
+    """
+    if temperatures is not None and len(temperatures) != replicas:
+        raise ValueError('one temperature per replica is required')
+    shared = main.prepare_inputs(input_file, 'md', mdrun_file, dest_dir,
+                                 topfile, itpfile, **args)
+    if temperatures is None:
+        options = gromacs_utils.read_mdp_options(shared['mdrunfile'])
+        temperatures = [float(options.get('ref-t', '300').split()[0])] * \
+            replicas
+    out_dicts = list()
+    for index, (seed, temperature) in enumerate(zip(
+            get_replica_seeds(replicas, gen_seed), temperatures)):
+        replica_dir = get_replica_dir(dest_dir, index)
+        os.makedirs(replica_dir, exist_ok=True)
+        mdrunfile = gromacs_utils.generate_mdrun_file(
+            mdrun_file, runtype='md', dest_dir=replica_dir, **args)
+        gromacs_utils.set_mdp_options(mdrunfile, {
+            'gen-vel': 'yes',
+            'gen-seed': seed,
+            'gen-temp': temperature,
+            'ref-t': temperature,
+        })
+        gromacs_utils.exec_grompp(
+            mdrunfile, shared['topfile'], shared['grofile'],
+            dest_dir=replica_dir)
+        out_dict = dict(shared, mdrunfile=mdrunfile, replica=index,
+                        gen_seed=seed, temperature=temperature,
+                        dest_dir=os.path.realpath(replica_dir))
+        out_dicts.append(out_dict)
+    return out_dicts
+
+
+def run_replicas(input_file, replicas, mdrun_file=None, dest_dir='.',
+                 max_core: int = main.DEFAULT_MAX_CORE, device: str = 'cpu',
+                 extract_forces: bool = False, topfile=None, itpfile=None,
+                 dry_run: bool = False, temperatures=None, gen_seed=-1,
+                 progress=None, autotune: bool = False, **args):
+    """
+    run replicas concurrently, max_core split evenly between them
+    Input:
+        progress: callable, called with the progress dict of each replica,
+            including its replica index
+        autotune: benchmark the thread layout of a replica once, all
+            replicas use it
+        see prepare_replicas and automd.run, cache_results, resume and
+        extend_time are not supported
+    Output:
+        list of out_dict of replicas
+    """
+    unsupported = [key for key in UNSUPPORTED_OPTIONS if args.get(key)]
+    if unsupported:
+        raise ValueError(f'{", ".join(unsupported)} not supported with '
+                         f'replicas')
+    max_core = max_core or main.DEFAULT_MAX_CORE
+    out_dicts = prepare_replicas(
+        input_file, replicas, mdrun_file, dest_dir, topfile, itpfile,
+        temperatures, gen_seed, **args)
+    if dry_run:
+        return out_dicts
+    threads = max(1, max_core // replicas)
+    # same system and cores for all replicas, tuned in the first one
+    layout = get_thread_layout(out_dicts[0]['grofile'], threads, device,
+                               out_dicts[0]['dest_dir'], autotune)
+
+    def run_replica(out_dict):
+        replica_progress = None
+        if progress is not None:
+            def replica_progress(info):
+                progress(dict(info, replica=out_dict['replica']))
+        out_dict['thread_layout'] = main.get_layout_summary(layout)
+        out_dict.update(gromacs_utils.exec_mdrun(
+            threads, device=device, dest_dir=out_dict['dest_dir'],
+            progress=replica_progress, layout=layout))
+        return main.collect_outputs(
+            out_dict, out_dict['dest_dir'], extract_forces)
+
+    with concurrent.futures.ThreadPoolExecutor(replicas) as executor:
+        return list(executor.map(run_replica, out_dicts))
+
+
+def get_replica_isomers(input_file, replicas, dedup=None,
+                        dedup_threshold=None, dedup_mode='dedup', **args):
+    """
+    structures of all replicas merged into one list, each with its replica
+    index, optionally deduplicated across replicas
+    Input:
+        see run_replicas and automd.get_isomers
+    """
+    out_dicts = run_replicas(input_file, replicas, **args)
+    if args.get('dry_run'):
+        return []
+    structures = list()
+    for out_dict in out_dicts:
+        for structure in main.collect_isomers(out_dict, out_dict['dest_dir']):
+            structure['replica'] = out_dict['replica']
+            structures.append(structure)
+    if dedup:
+        structures = main.deduplicate(
+            structures, method=dedup, threshold=dedup_threshold,
+            mode=dedup_mode)
+    logger.debug(f"{replicas} replicas: {len(structures)} structures")
+    return structures
@@ -0,0 +1,113 @@
+"""
+
+result store of whole runs
+
+The out_dict of `run` and its output files are stored on disk, keyed by the
+canonical structure, the normalized mdrun config, the given mdp/top files
+and the gromacs binary, so a resubmitted run returns without gromacs.
+
+
+"""
+
+import os
+import shutil
+
+import numpy as np
+import modlog
+import json_tricks
+
+from . import capability
+from .cache import DiskCache, hash_key, hash_files
+from .default_config import default_mdrun_config
+from .fileio import read_structure
+from .topology import read_with_includes
+
+
+logger = modlog.getLogger(__name__)
+RESULT_CACHE = DiskCache('results', max_size=1024 ** 3)
+RESULT_JSON = 'out_dict.json'
+# keys of out_dict that are files in dest_dir
+RESULT_FILE_KEYS = ['grofile', 'topfile', 'itpfile', 'mdrunfile',
+                    'trr_filename', 'edr_filename', 'xtc_filename',
+                    'log_filename']
+# arguments of `run` besides the mdrun config changing its results, with
+# their defaults
+RESULT_ARGS = {'obgmx_method': 'exe'}
+POSITION_DECIMALS = 6
+
+
+def get_result_key(input_file, runtype='md', mdrun_file=None, topfile=None,
+                   extract_forces=False, **args):
+    """
+    cache key of a run
+    Input:
+        arguments of `run`, only the mdrun config and RESULT_ARGS of args
+        are part of the key
+    Output:
+        str, key of RESULT_CACHE
+    """
+    from .gromacs_utils import regularize_mdrun_config
+    structure = read_structure(input_file)
+    mdrun_config = default_mdrun_config.copy()
+    mdrun_config.update({key: value for key, value in args.items()
+                         if key in mdrun_config})
+    # options like debug or profile of the cli do not change the result
+    others = {key: args.get(key, default)
+              for key, default in RESULT_ARGS.items()}
+    gmx_capability = capability.get_capability()
+    parts = {
+        'symbols': list(structure['symbols']),
+        'positions': np.round(np.asarray(structure['positions'], dtype=float),
+                              POSITION_DECIMALS).tolist(),
+        'runtype': runtype,
+        'mdrun_config': regularize_mdrun_config(mdrun_config),
+        'mdrun_file': hash_files(mdrun_file) if mdrun_file else None,
+        'topfile': hash_key(read_with_includes(topfile)) if topfile else None,
+        'extract_forces': extract_forces,
+        'args': others,
+        'gmx': [gmx_capability.gmx_path, gmx_capability.version],
+    }
+    return hash_key('result', parts)
+
+
+def load_result(key, dest_dir='.'):
+    """
+    copy the stored output files to dest_dir
+    Output:
+        out_dict with paths in dest_dir, None if not stored
+    """
+    entry = RESULT_CACHE.get(key)
+    if entry is None:
+        return None
+    try:
+        with open(os.path.join(entry, RESULT_JSON)) as fd:
+            out_dict = json_tricks.loads(fd.read())
+        os.makedirs(dest_dir, exist_ok=True)
+        for fkey in RESULT_FILE_KEYS:
+            if fkey not in out_dict:
+                continue
+            fname = os.path.basename(out_dict[fkey])
+            dest_fname = os.path.realpath(os.path.join(dest_dir, fname))
+            if os.path.exists(os.path.join(entry, fname)):
+                shutil.copyfile(os.path.join(entry, fname), dest_fname)
+            out_dict[fkey] = dest_fname
+    except (OSError, ValueError) as e:
+        logger.warning(f"broken result cache entry {key}: {e}")
+        return None
+    logger.debug(f"result cache hit: {key}")
+    return out_dict
+
+
+def save_result(key, out_dict, dest_dir='.'):
+    """
+    store out_dict of a run and its output files
+    """
+    filenames = dict()
+    for fkey in RESULT_FILE_KEYS:
+        if fkey in out_dict and os.path.exists(out_dict[fkey]):
+            filenames[os.path.basename(out_dict[fkey])] = out_dict[fkey]
+    json_filename = os.path.join(dest_dir, RESULT_JSON)
+    with open(json_filename, 'w') as fd:
+        fd.write(json_tricks.dumps(out_dict, allow_nan=True))
+    filenames[RESULT_JSON] = json_filename
+    return RESULT_CACHE.put(key, filenames)
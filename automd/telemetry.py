@@ -0,0 +1,162 @@
+"""
+
+progress and performance of mdrun
+
+`gmx mdrun -v` reports `step N, will finish <date>` or `step N, remaining
+wall clock time: T s` on stderr, MdrunProgress follows these lines in the
+log file while mdrun is running. After the run, read_performance parses
+the time, ns/day and cycle accounting tables at the end of topol.log.
+
+
+"""
+
+import os
+import re
+import time
+
+import modlog
+
+
+logger = modlog.getLogger(__name__)
+PROGRESS_PATTERN = re.compile(
+    r'step\s+(\d+)(?:,\s+will finish\s+(.+?)\s*$|'
+    r',\s+remaining wall clock time:\s+(\d+)\s*s)?')
+CYCLE_PATTERN = re.compile(
+    r'^\s(\S.*?)\s+(?:(\d+)\s+(\d+)\s+(\d+)\s+)?'
+    r'([-\d.]+)\s+([-\d.]+)\s+([-\d.]+)\s*$')
+
+
+def parse_progress(text):
+    """
+    last progress report of a chunk of `mdrun -v` output
+    Output:
+        dict of step, finish (str) and remaining (s), None if no report
+    """
+    for line in reversed(re.split(r'[\r\n]', text)):
+        match = PROGRESS_PATTERN.search(line)
+        if match:
+            return {
+                'step': int(match[1]),
+                'finish': match[2],
+                'remaining': float(match[3]) if match[3] else None,
+            }
+    return None
+
+
+class MdrunProgress:
+    """
+    progress of a running mdrun from its -v output
+    Input:
+        filename: file the stderr of mdrun is written to
+        nsteps: number of steps of the run, if known
+        dt: time step in ps, if known
+        callback: called with the progress dict on every new step
+    """
+
+    def __init__(self, filename, nsteps=None, dt=None, callback=None):
+        self.filename = filename
+        self.nsteps = nsteps
+        self.dt = dt
+        self.callback = callback
+        self.offset = 0
+        self.start = time.monotonic()
+        self.first = None
+        self.progress = None
+
+    def poll(self):
+        """
+        read the output written since the last poll
+        Output:
+            the latest progress dict, None before the first report:
+                step, nsteps, fraction, elapsed (s), remaining (s),
+                finish (str, by mdrun), ns_per_day (estimated)
+        """
+        if not os.path.exists(self.filename):
+            return self.progress
+        with open(self.filename, 'rb') as fd:
+            fd.seek(self.offset)
+            data = fd.read()
+        # a partial last line is read again on the next poll
+        end = max(data.rfind(b'\r'), data.rfind(b'\n')) + 1
+        self.offset += end
+        report = parse_progress(data[:end].decode(errors='replace'))
+        if report is None or (self.progress and
+                              report['step'] == self.progress['step']):
+            return self.progress
+        now = time.monotonic()
+        if self.first is None:
+            self.first = (now, report['step'])
+        progress = dict(report, nsteps=self.nsteps, fraction=None,
+                        elapsed=now - self.start, ns_per_day=None)
+        if self.nsteps:
+            progress['fraction'] = min(1.0, report['step'] / self.nsteps)
+        rate = (report['step'] - self.first[1]) / (now - self.first[0]) \
+            if now > self.first[0] else 0
+        if rate > 0:
+            if progress['remaining'] is None and self.nsteps:
+                progress['remaining'] = \
+                    max(0, self.nsteps - report['step']) / rate
+            if self.dt:
+                progress['ns_per_day'] = rate * self.dt * 86400 / 1000
+        self.progress = progress
+        logger.debug(f"mdrun progress: {progress}")
+        if self.callback:
+            self.callback(progress)
+        return progress
+
+
+def parse_cycles(lines):
+    """
+    rows of the `R E A L   C Y C L E` table
+    Output:
+        {name: {ranks, threads, count, wall_time, gcycles, percent}}
+    """
+    cycles = dict()
+    for line in lines:
+        match = CYCLE_PATTERN.match(line)
+        if not match:
+            continue
+        cycles[match[1]] = {
+            'ranks': int(match[2]) if match[2] else None,
+            'threads': int(match[3]) if match[3] else None,
+            'count': int(match[4]) if match[4] else None,
+            'wall_time': float(match[5]),
+            'gcycles': float(match[6]),
+            'percent': float(match[7]),
+        }
+    return cycles
+
+
+def read_performance(log_filename):
+    """
+    performance summary at the end of a mdrun log
+    Output:
+        dict: core_time, wall_time (s), core_percent, ns_per_day,
+            hours_per_ns and cycles (see parse_cycles),
+            empty if the run did not finish
+    """
+    if not os.path.exists(log_filename):
+        return dict()
+    with open(log_filename, errors='replace') as fd:
+        lines = fd.read().splitlines()
+    performance = dict()
+    cycle_start = None
+    for i, line in enumerate(lines):
+        if 'R E A L   C Y C L E' in line:
+            cycle_start = i
+        fields = line.split()
+        if line.strip().startswith('Time:') and len(fields) >= 4:
+            performance['core_time'] = float(fields[1])
+            performance['wall_time'] = float(fields[2])
+            performance['core_percent'] = float(fields[3])
+        elif line.strip().startswith('Performance:') and len(fields) >= 3:
+            performance['ns_per_day'] = float(fields[1])
+            performance['hours_per_ns'] = float(fields[2])
+    if cycle_start is not None:
+        # rows between the first two dashed lines of the table
+        dashes = [i for i in range(cycle_start, len(lines))
+                  if lines[i].startswith('-----')]
+        if len(dashes) >= 2:
+            performance['cycles'] = parse_cycles(
+                lines[dashes[0]+1:dashes[1]])
+    return performance
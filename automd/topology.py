@@ -0,0 +1,266 @@
+"""
+
+gromacs topology (.itp/.top) of one molecule
+
+The [ atoms ] table is a numpy structured array and every interaction
+section (bonds, pairs, angles, dihedrals, ...) is an integer atom index
+array with a function type array and a float parameter array, so a
+topology is parsed once and shared by gro naming, trajectory decoding and
+energy evaluation.
+
+
+"""
+
+import os
+import re
+import functools
+
+import numpy as np
+import modlog
+
+
+logger = modlog.getLogger(__name__)
+ATOMS_DTYPE = [('nr', 'i4'), ('type', 'U16'), ('resnr', 'i4'),
+               ('residue', 'U16'), ('name', 'U16'), ('cgnr', 'i4'),
+               ('charge', 'f8'), ('mass', 'f8')]
+INTERACTION_NATOMS = {
+    'bonds': 2,
+    'pairs': 2,
+    'constraints': 2,
+    'angles': 3,
+    'dihedrals': 4,
+}
+TOP_SECTIONS = ['defaults', 'system', 'molecules']
+SECTION_PATTERN = re.compile(r'^\s*\[\s*(\w+)\s*\]')
+
+
+class Interactions:
+    """
+    table of an interaction section
+    Attributes:
+        atoms: (n, natoms) int array, 0-based atom indices
+        funct: (n,) int array, function types
+        params: (n, nparams) float array, nan where a line has less params
+    """
+
+    def __init__(self, atoms, funct, params):
+        self.atoms = atoms
+        self.funct = funct
+        self.params = params
+
+    @classmethod
+    def from_lines(cls, lines, natoms):
+        fields = [line.split() for line in lines]
+        atoms = np.array([x[:natoms] for x in fields],
+                         dtype=int).reshape((-1, natoms)) - 1
+        funct = np.array([x[natoms] if len(x) > natoms else 1
+                          for x in fields], dtype=int)
+        nparams = max([len(x) - natoms - 1 for x in fields] + [0])
+        params = np.full((len(fields), nparams), np.nan)
+        for i, x in enumerate(fields):
+            values = x[natoms+1:]
+            params[i, :len(values)] = [float(v) for v in values]
+        return cls(atoms, funct, params)
+
+    def to_lines(self):
+        lines = list()
+        for atoms, funct, params in zip(self.atoms + 1, self.funct,
+                                        self.params):
+            values = ' '.join(f'{x:.10g}' for x in params[~np.isnan(params)])
+            lines.append(''.join(f'{x:6d}' for x in atoms) +
+                         f'{funct:6d} {values}'.rstrip())
+        return lines
+
+    def __len__(self):
+        return len(self.funct)
+
+
+class Topology:
+    """
+    topology of one moleculetype
+    Attributes:
+        name: name of the moleculetype
+        nrexcl: number of excluded neighbours
+        atomtypes: {type: fields of [ atomtypes ] line}
+        atoms: structured array of ATOMS_DTYPE
+        interactions: {section: Interactions}
+        extra: [(section, lines)] of other sections, kept verbatim
+    """
+
+    def __init__(self, name, nrexcl, atoms, interactions=None,
+                 atomtypes=None, extra=None):
+        self.name = name
+        self.nrexcl = nrexcl
+        self.atoms = atoms
+        self.interactions = dict(interactions or {})
+        self.atomtypes = dict(atomtypes or {})
+        self.extra = list(extra or [])
+
+    @property
+    def natoms(self):
+        return len(self.atoms)
+
+    @property
+    def symbols(self):
+        """
+        element symbols, from the leading letters of atom types,
+        checked by masses
+        """
+        from .obgmx.perception import get_element_table
+        table = get_element_table()
+        masses = {symbol: x['mass'] for symbol, x in table.items()
+                  if x['number'] > 0}
+        symbols = list()
+        for atomtype, mass in zip(self.atoms['type'], self.atoms['mass']):
+            match = re.match(r'[A-Z][a-z]?', atomtype)
+            symbol = match[0] if match else None
+            if symbol not in masses or abs(masses[symbol] - mass) > 1.0:
+                symbol = min(masses, key=lambda x: abs(masses[x] - mass))
+            symbols.append(symbol)
+        return symbols
+
+    def __getattr__(self, key):
+        # topology.bonds/angles/... for the interaction tables
+        if key != 'interactions' and key in self.interactions:
+            return self.interactions[key]
+        raise AttributeError(key)
+
+    @classmethod
+    def from_string(cls, string):
+        sections = split_sections(string)
+        atomtypes = dict()
+        for line in sections.pop('atomtypes', []):
+            fields = line.split()
+            atomtypes[fields[0]] = fields[1:]
+        moleculetype = sections.pop('moleculetype', [])
+        if not moleculetype:
+            raise ValueError('no [ moleculetype ] in topology')
+        if len(moleculetype) > 1:
+            logger.warning('only the first moleculetype is read')
+        name, nrexcl = moleculetype[0].split()[:2]
+        atoms = parse_atoms(sections.pop('atoms', []), atomtypes)
+        interactions = dict()
+        extra = list()
+        for section, lines in sections.items():
+            if section in TOP_SECTIONS:
+                continue
+            if section in INTERACTION_NATOMS:
+                interactions[section] = Interactions.from_lines(
+                    lines, INTERACTION_NATOMS[section])
+            else:
+                extra.append((section, lines))
+        return cls(name, int(nrexcl), atoms, interactions, atomtypes, extra)
+
+    @classmethod
+    def from_file(cls, filename):
+        """
+        read an itp file, or a top file with its local #include files
+        """
+        return cls.from_string(read_with_includes(filename))
+
+    def to_itp(self):
+        """
+        itp string of the topology
+        """
+        lines = list()
+        if self.atomtypes:
+            lines += ['[ atomtypes ]'] + \
+                [' '.join([key] + fields)
+                 for key, fields in self.atomtypes.items()] + ['']
+        lines += ['[ moleculetype ]', f'{self.name}  {self.nrexcl}', '',
+                  '[ atoms ]']
+        for atom in self.atoms:
+            lines.append(
+                f"{atom['nr']:6d} {atom['type']:>7s} {atom['resnr']:6d} "
+                f"{atom['residue']:>8s} {atom['name']:>5s} {atom['cgnr']:6d} "
+                f"{atom['charge']:10.5f} {atom['mass']:10.5f}")
+        for section, table in self.interactions.items():
+            lines += ['', f'[ {section} ]'] + table.to_lines()
+        for section, section_lines in self.extra:
+            lines += ['', f'[ {section} ]'] + section_lines
+        return '\n'.join(lines) + '\n'
+
+    def write_itp(self, filename):
+        with open(filename, 'w') as fd:
+            fd.write(self.to_itp())
+
+    def __repr__(self):
+        tables = ', '.join(f'{key}={len(value)}'
+                           for key, value in self.interactions.items())
+        return f"Topology({self.name}, natoms={self.natoms}, {tables})"
+
+
+def split_sections(string):
+    """
+    {section: data lines} of a topology string, comments and
+    preprocessor lines removed; sections of the same name are joined
+    """
+    sections = dict()
+    lines = None
+    for line in string.split('\n'):
+        line = line.split(';')[0].strip()
+        if not line or line.startswith('#'):
+            continue
+        match = SECTION_PATTERN.match(line)
+        if match:
+            lines = sections.setdefault(match[1].lower(), list())
+        elif lines is not None:
+            lines.append(line)
+    return sections
+
+
+def parse_atoms(lines, atomtypes=None):
+    """
+    structured array of [ atoms ] lines, charge and mass default to
+    those of the atomtype
+    """
+    atomtypes = atomtypes or {}
+    atoms = np.zeros(len(lines), dtype=ATOMS_DTYPE)
+    for i, line in enumerate(lines):
+        fields = line.split()
+        # atomtypes line: [at.num] mass charge ptype sigma epsilon
+        values = atomtypes.get(fields[1], [])
+        mass, charge = values[-5:-3] if len(values) >= 5 else ('0', '0')
+        if len(fields) < 7:
+            fields.append(charge)
+        if len(fields) < 8:
+            fields.append(mass)
+        atoms[i] = tuple(fields[:8])
+    return atoms
+
+
+def read_with_includes(filename):
+    """
+    content of a topology file with #include of existing local files
+    expanded in place
+    """
+    dirname = os.path.dirname(os.path.realpath(filename))
+    lines = list()
+    with open(filename) as fd:
+        for line in fd:
+            match = re.match(r'^\s*#include\s+["<](.+)[">]', line)
+            if match:
+                include = os.path.join(dirname, match[1])
+                if os.path.exists(include):
+                    lines.append(read_with_includes(include))
+                else:
+                    # e.g. force fields of GMXLIB, resolved by grompp only
+                    logger.warning(f"{filename}: #include {match[1]} not "
+                                   "found, not read")
+                continue
+            lines.append(line)
+    return ''.join(lines)
+
+
+@functools.lru_cache(maxsize=64)
+def _load_topology(content):
+    return Topology.from_string(content)
+
+
+def load_topology(filename):
+    """
+    Topology of an itp/top file, parsed once per file content (with its
+    #include files); the returned object is shared, copy it before
+    modifying
+    """
+    return _load_topology(read_with_includes(filename))
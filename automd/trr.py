@@ -0,0 +1,164 @@
+"""
+
+reader of gromacs full precision trajectories (.trr)
+
+Coordinate, velocity and force blocks are read directly into numpy arrays,
+optionally into a memory mapped .npy file. write_trr writes coordinate
+frames, e.g. as input of `mdrun -rerun`.
+
+
+"""
+
+import os
+import mmap
+import struct
+
+import numpy as np
+import modlog
+
+from .xdr import XDRBuffer
+
+
+logger = modlog.getLogger(__name__)
+TRR_MAGIC = 1993
+TRR_VERSION = 'GMX_trn_file'
+TRR_SIZE_KEYS = ['ir_size', 'e_size', 'box_size', 'vir_size', 'pres_size',
+                 'top_size', 'sym_size', 'x_size', 'v_size', 'f_size']
+TRR_BLOCKS = ['box', 'vir', 'pres', 'x', 'v', 'f']
+
+
+class TRRError(ValueError):
+    pass
+
+
+def get_real_size(header):
+    for key, nitems in [('box_size', 9), ('x_size', header['natoms'] * 3),
+                        ('v_size', header['natoms'] * 3),
+                        ('f_size', header['natoms'] * 3)]:
+        if header[key] and nitems:
+            return header[key] // nitems
+    raise TRRError('cannot determine precision of trr frame')
+
+
+def read_frame_header(xdr):
+    """
+    read a frame header and skip its data
+    Output:
+        dict, including natoms, step, t, real_size and offsets of
+        box/vir/pres/x/v/f blocks (None if missing)
+    """
+    if xdr.int() != TRR_MAGIC:
+        raise TRRError('trr magic number mismatch, this is not a trr file')
+    xdr.int()  # length of version string with \0
+    if xdr.string() != TRR_VERSION:
+        raise TRRError('trr version string mismatch')
+    header = dict(zip(TRR_SIZE_KEYS, xdr.unpack('>10i')))
+    header['natoms'], header['step'], header['nre'] = xdr.unpack('>3i')
+    real_size = get_real_size(header)
+    header['real_size'] = real_size
+    header['t'] = xdr.real(real_size)
+    header['lambda'] = xdr.real(real_size)
+    for key in TRR_BLOCKS:
+        size = header[f'{key}_size']
+        header[key] = xdr.offset if size else None
+        xdr.skip(size)
+    return header
+
+
+def read_trr_headers(filename):
+    """
+    headers of all complete frames of a trr file
+    """
+    headers = list()
+    if os.path.getsize(filename) == 0:
+        return headers
+    with open(filename, 'rb') as fd, \
+            mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        xdr = XDRBuffer(data)
+        while not xdr.eof():
+            try:
+                header = read_frame_header(xdr)
+            except struct.error:
+                logger.warning(f'{filename}: incomplete last frame')
+                break
+            if xdr.offset > len(data):
+                logger.warning(f'{filename}: incomplete last frame')
+                break
+            headers.append(header)
+    return headers
+
+
+def read_trr(filename, key='f', dtype=np.float64, scale=1.0,
+             out_filename=None):
+    """
+    read a block of all frames of a trr file having it
+    Input:
+        filename: trr filename
+        key: x/v/f/box, block to read
+        dtype: dtype of the output
+        scale: factor multiplied to the values, e.g. for unit conversion
+        out_filename: if given, output is a memory mapped .npy file
+    Output:
+        (nframes, natoms, 3) array, (nframes, 3, 3) for box
+    """
+    headers = [h for h in read_trr_headers(filename) if h[key] is not None]
+    natoms = headers[0]['natoms'] if headers else 0
+    shape = (len(headers), 3 if key == 'box' else natoms, 3)
+    if out_filename:
+        output = np.lib.format.open_memmap(
+            out_filename, mode='w+', dtype=dtype, shape=shape)
+    else:
+        output = np.empty(shape, dtype=dtype)
+    if not headers:
+        return output
+    with open(filename, 'rb') as fd, \
+            mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for i, header in enumerate(headers):
+            if header['natoms'] != natoms:
+                raise TRRError('number of atoms changes in trr file')
+            real_dtype = '>f4' if header['real_size'] == 4 else '>f8'
+            values = np.frombuffer(
+                data, dtype=real_dtype, count=shape[1] * 3,
+                offset=header[key]).reshape(shape[1:])
+            output[i] = values * scale
+            del values
+    if out_filename:
+        output.flush()
+    return output
+
+
+def pack_string(value):
+    data = value.encode()
+    return struct.pack('>i', len(data)) + data + \
+        b'\0' * ((4 - len(data) % 4) % 4)
+
+
+def pack_frame(step, t, box, x):
+    """
+    bytes of a single precision trr frame with box and coordinates in nm
+    """
+    natoms = len(x)
+    sizes = dict.fromkeys(TRR_SIZE_KEYS, 0)
+    sizes.update(box_size=9 * 4, x_size=natoms * 3 * 4)
+    data = struct.pack('>ii', TRR_MAGIC, len(TRR_VERSION) + 1)
+    data += pack_string(TRR_VERSION)
+    data += struct.pack('>10i', *(sizes[key] for key in TRR_SIZE_KEYS))
+    data += struct.pack('>3i2f', natoms, step, 0, t, 0.0)
+    data += np.asarray(box, dtype='>f4').tobytes()
+    data += np.asarray(x, dtype='>f4').tobytes()
+    return data
+
+
+def write_trr(filename, positions, boxes, steps=None, times=None):
+    """
+    write coordinate frames to a trr file
+    Input:
+        positions: (nframes, natoms, 3) in nm
+        boxes: (nframes, 3, 3) in nm
+        steps/times: (nframes,), default the frame numbers
+    """
+    steps = np.arange(len(positions)) if steps is None else steps
+    times = np.arange(len(positions)) if times is None else times
+    with open(filename, 'wb') as fd:
+        for step, t, box, x in zip(steps, times, boxes, positions):
+            fd.write(pack_frame(int(step), float(t), box, x))
@@ -0,0 +1,50 @@
+"""
+
+XDR decoding shared by the readers of gromacs binary files
+
+
+"""
+
+import struct
+
+
+class XDRBuffer:
+    """
+    big endian XDR decoder over bytes/mmap
+    """
+
+    def __init__(self, data, offset=0):
+        self.data = data
+        self.offset = offset
+
+    def unpack(self, fmt):
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def int(self):
+        return self.unpack('>i')[0]
+
+    def int64(self):
+        return self.unpack('>q')[0]
+
+    def float(self):
+        return self.unpack('>f')[0]
+
+    def double(self):
+        return self.unpack('>d')[0]
+
+    def real(self, real_size):
+        return self.float() if real_size == 4 else self.double()
+
+    def string(self):
+        length = self.int()
+        value = self.data[self.offset:self.offset+length]
+        self.offset += (length + 3) // 4 * 4
+        return bytes(value).decode()
+
+    def skip(self, nbytes):
+        self.offset += nbytes
+
+    def eof(self):
+        return self.offset >= len(self.data)
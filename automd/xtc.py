@@ -0,0 +1,427 @@
+"""
+
+reader of gromacs compressed trajectories (.xtc)
+
+The compressed coordinates are decoded in-process, the same algorithm as
+xdrfile_decompress_coord_float of xdrfile. The bit stream of a frame is
+walked in python, the integers of frames of NUMPY_MIN_ATOMS atoms or more
+are then unpacked with numpy.
+
+
+"""
+
+import os
+import mmap
+import struct
+
+import numpy as np
+import modlog
+
+from .xdr import XDRBuffer
+
+
+logger = modlog.getLogger(__name__)
+XTC_MAGIC = 1995
+XTC_MAGIC_LARGE = 2023
+MAX_UNCOMPRESSED_ATOMS = 9
+FIRSTIDX = 9
+# frames of fewer atoms are decoded bit by bit, numpy has more overhead
+NUMPY_MIN_ATOMS = 32
+MAGICINTS = [
+    0, 0, 0, 0, 0, 0, 0, 0, 0, 8, 10, 12, 16, 20, 25, 32, 40, 50, 64,
+    80, 101, 128, 161, 203, 256, 322, 406, 512, 645, 812, 1024, 1290,
+    1625, 2048, 2580, 3250, 4096, 5060, 6501, 8192, 10321, 13003,
+    16384, 20642, 26007, 32768, 41285, 52015, 65536, 82570, 104031,
+    131072, 165140, 208063, 262144, 330280, 416127, 524287, 660561,
+    832255, 1048576, 1321122, 1664510, 2097152, 2642245, 3329021,
+    4194304, 5284491, 6658042, 8388607, 10568983, 13316085, 16777216,
+]
+
+
+class XTCError(ValueError):
+    pass
+
+
+class BitReader:
+    """
+    MSB first bit stream over bytes
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, nbits):
+        if nbits == 0:
+            return 0
+        start = self.pos >> 3
+        end = (self.pos + nbits + 7) >> 3
+        value = int.from_bytes(self.data[start:end], 'big')
+        shift = (end << 3) - self.pos - nbits
+        self.pos += nbits
+        return (value >> shift) & ((1 << nbits) - 1)
+
+    def read_ints(self, nbits, sizes):
+        """
+        decodeints of xdrfile: mixed radix integers packed in nbits
+        """
+        value = 0
+        shift = 0
+        while nbits > 8:
+            value |= self.read(8) << shift
+            shift += 8
+            nbits -= 8
+        if nbits > 0:
+            value |= self.read(nbits) << shift
+        z = value % sizes[2]
+        value //= sizes[2]
+        y = value % sizes[1]
+        return value // sizes[1], y, z
+
+
+def read_bits(data, offsets, nbits):
+    """
+    bit fields of nbits <= 8 at bit offsets, MSB first
+    Input:
+        data: uint8 array, padded with a zero byte
+        offsets: int array of bit offsets
+    """
+    start = offsets >> 3
+    words = (data[start].astype(np.int64) << 8) | data[start + 1]
+    return (words >> (16 - (offsets & 7) - nbits)) & ((1 << nbits) - 1)
+
+
+def read_large_ints(data, offsets, nbits):
+    """
+    integers of nbits at bit offsets, MSB first
+    """
+    values = np.zeros(len(offsets), dtype=np.int64)
+    for shift in range(0, nbits, 8):
+        size = min(8, nbits - shift)
+        values = (values << size) | read_bits(data, offsets + shift, size)
+    return values
+
+
+def read_mixed_ints(data, offsets, nbits, sizes):
+    """
+    decodeints of xdrfile: mixed radix integer triples packed in nbits
+    bytes, least significant byte first, at bit offsets
+    Output:
+        (n, 3) int array
+    """
+    # base 256 digits, the last one holds the remaining 1 to 8 bits
+    nfull = (nbits - 1) // 8
+    digits = [read_bits(data, offsets + 8 * j, 8) for j in range(nfull)]
+    digits.append(read_bits(data, offsets + 8 * nfull, nbits - 8 * nfull))
+    ints = np.empty((len(offsets), 3), dtype=np.int64)
+    for k in [2, 1]:
+        # long division by sizes[k] < 2**24 from the most significant digit
+        remainder = np.zeros(len(offsets), dtype=np.int64)
+        for j in reversed(range(len(digits))):
+            value = (remainder << 8) | digits[j]
+            digits[j], remainder = np.divmod(value, sizes[k])
+        ints[:, k] = remainder
+    ints[:, 0] = 0
+    for digit in reversed(digits):
+        ints[:, 0] = (ints[:, 0] << 8) | digit
+    return ints
+
+
+def decompress_coords_python(data, natoms, minint, maxint, smallidx):
+    """
+    decode compressed integer coordinates bit by bit, faster than numpy
+    for a few atoms
+    Output:
+        (natoms, 3) int array, coordinates * precision
+    """
+    sizeint = [maxint[k] - minint[k] + 1 for k in range(3)]
+    large = (sizeint[0] | sizeint[1] | sizeint[2]) > 0xffffff
+    if large:
+        bitsizeint = [size.bit_length() for size in sizeint]
+    else:
+        bitsize = (sizeint[0] * sizeint[1] * sizeint[2]).bit_length()
+    smaller = MAGICINTS[max(FIRSTIDX, smallidx - 1)] // 2
+    smallnum = MAGICINTS[smallidx] // 2
+    sizesmall = [MAGICINTS[smallidx]] * 3
+    bits = BitReader(data)
+    coords = np.empty((natoms, 3), dtype=np.int64)
+    i = 0
+    n = 0
+    run = 0
+    while i < natoms:
+        if large:
+            x, y, z = (bits.read(size) for size in bitsizeint)
+        else:
+            x, y, z = bits.read_ints(bitsize, sizeint)
+        i += 1
+        prev = [x + minint[0], y + minint[1], z + minint[2]]
+        is_smaller = 0
+        if bits.read(1):
+            run = bits.read(5)
+            is_smaller = run % 3
+            run -= is_smaller
+            is_smaller -= 1
+        if run > 0:
+            for k in range(0, run, 3):
+                dx, dy, dz = bits.read_ints(smallidx, sizesmall)
+                i += 1
+                this = [dx + prev[0] - smallnum, dy + prev[1] - smallnum,
+                        dz + prev[2] - smallnum]
+                if k == 0:
+                    # first and second atom are interchanged (water)
+                    this, prev = prev, this
+                    coords[n] = prev
+                    n += 1
+                else:
+                    prev = this
+                coords[n] = this
+                n += 1
+        else:
+            coords[n] = prev
+            n += 1
+        smallidx += is_smaller
+        if is_smaller < 0:
+            smallnum = smaller
+            smaller = MAGICINTS[smallidx - 1] // 2 \
+                if smallidx > FIRSTIDX else 0
+        elif is_smaller > 0:
+            smaller = smallnum
+            smallnum = MAGICINTS[smallidx] // 2
+        sizesmall = [MAGICINTS[smallidx]] * 3
+    if n != natoms:
+        raise XTCError('corrupted xtc frame')
+    return coords
+
+
+def decompress_coords_numpy(data, natoms, minint, maxint, smallidx):
+    """
+    decode compressed integer coordinates
+
+    Only the bit offsets and run lengths are followed atom group by atom
+    group in python, the integers are then unpacked with numpy.
+    Output:
+        (natoms, 3) int array, coordinates * precision
+    """
+    sizeint = [maxint[k] - minint[k] + 1 for k in range(3)]
+    large = (sizeint[0] | sizeint[1] | sizeint[2]) > 0xffffff
+    if large:
+        bitsizeint = [size.bit_length() for size in sizeint]
+        bitsize = sum(bitsizeint)
+    else:
+        bitsize = (sizeint[0] * sizeint[1] * sizeint[2]).bit_length()
+    smaller = MAGICINTS[max(FIRSTIDX, smallidx - 1)] // 2
+    smallnum = MAGICINTS[smallidx] // 2
+    array = np.frombuffer(bytes(data) + b'\0\0', dtype=np.uint8)
+    words = ((array[:-1].astype(np.int64) << 8) | array[1:]).tolist()
+    # bit offsets of the large triples, and per group with small triples
+    # its number, (number of small triples, their bit size, the offset
+    # subtracted from them and the bit offset of the first)
+    offsets = list()
+    runs = list()
+    pos = 0
+    i = 0
+    run = 0
+    try:
+        while i < natoms:
+            offsets.append(pos)
+            pos += bitsize
+            i += 1
+            is_smaller = 0
+            # flag bit and 5 bits of run length
+            word = (words[pos >> 3] >> (10 - (pos & 7))) & 63
+            pos += 1
+            if word >> 5:
+                run = word & 31
+                pos += 5
+                is_smaller = run % 3
+                run -= is_smaller
+                is_smaller -= 1
+            if run > 0:
+                runs.append((len(offsets) - 1, run // 3, smallidx, smallnum,
+                             pos))
+                pos += run // 3 * smallidx
+                i += run // 3
+            smallidx += is_smaller
+            if is_smaller < 0:
+                smallnum = smaller
+                smaller = MAGICINTS[smallidx - 1] // 2 \
+                    if smallidx > FIRSTIDX else 0
+            elif is_smaller > 0:
+                smaller = smallnum
+                smallnum = MAGICINTS[smallidx] // 2
+    except IndexError:
+        raise XTCError('corrupted xtc frame')
+    if i != natoms or pos > len(data) * 8:
+        raise XTCError('corrupted xtc frame')
+    offsets = np.array(offsets, dtype=np.int64)
+    groups, counts, smallidxs, smallnums, small_offsets = \
+        np.array(runs, dtype=np.int64).reshape((-1, 5)).T
+    if large:
+        bitoffsets = np.cumsum([0] + bitsizeint[:2])
+        ints = np.stack([read_large_ints(array, offsets + bitoffset, size)
+                         for bitoffset, size in zip(bitoffsets, bitsizeint)],
+                        axis=1)
+    else:
+        ints = read_mixed_ints(array, offsets, bitsize, sizeint)
+    # every group is a chain of its large triple and its small triples,
+    # each relative to the one before
+    sizes = np.ones(len(offsets), dtype=np.int64)
+    sizes[groups] += counts
+    starts = np.cumsum(sizes) - sizes
+    steps = np.zeros((natoms, 3), dtype=np.int64)
+    steps[starts] = ints + minint
+    # small triples, by run
+    run_ids = np.repeat(np.arange(len(groups)), counts)
+    ranks = np.arange(len(run_ids)) - (np.cumsum(counts) - counts)[run_ids]
+    small = starts[groups][run_ids] + 1 + ranks
+    small_offsets = small_offsets[run_ids] + ranks * smallidxs[run_ids]
+    for idx in np.unique(smallidxs):
+        selected = smallidxs[run_ids] == idx
+        steps[small[selected]] = read_mixed_ints(
+            array, small_offsets[selected], int(idx),
+            [MAGICINTS[idx]] * 3) - smallnums[run_ids[selected], None]
+    coords = np.cumsum(steps, axis=0)
+    coords -= (coords[starts] - steps[starts]).repeat(sizes, axis=0)
+    # first and second atom of a group are interchanged (water)
+    swapped = starts[groups]
+    coords[swapped], coords[swapped + 1] = \
+        coords[swapped + 1].copy(), coords[swapped].copy()
+    return coords
+
+
+def decompress_coords(data, natoms, minint, maxint, smallidx):
+    """
+    decode compressed integer coordinates
+    Output:
+        (natoms, 3) int array, coordinates * precision
+    """
+    if natoms < NUMPY_MIN_ATOMS:
+        return decompress_coords_python(data, natoms, minint, maxint,
+                                        smallidx)
+    return decompress_coords_numpy(data, natoms, minint, maxint, smallidx)
+
+
+def read_frame_header(xdr):
+    """
+    read a frame header and skip its data
+    Output:
+        dict, including natoms, step, time, box, offset of coordinates
+    """
+    magic = xdr.int()
+    if magic not in [XTC_MAGIC, XTC_MAGIC_LARGE]:
+        raise XTCError('xtc magic number mismatch, this is not a xtc file')
+    natoms, step = xdr.unpack('>2i')
+    header = {'natoms': natoms, 'step': step, 'time': xdr.float()}
+    header['box'] = np.array(xdr.unpack('>9f')).reshape((3, 3))
+    header['magic'] = magic
+    header['offset'] = xdr.offset
+    if xdr.int() != natoms:
+        raise XTCError('number of atoms mismatch in xtc frame')
+    if natoms <= MAX_UNCOMPRESSED_ATOMS:
+        xdr.skip(natoms * 3 * 4)
+    else:
+        xdr.skip(4 + 12 + 12 + 4)
+        nbytes = xdr.int64() if magic == XTC_MAGIC_LARGE else xdr.int()
+        xdr.skip((nbytes + 3) // 4 * 4)
+    return header
+
+
+def read_frame_coords(data, header):
+    """
+    coordinates of a frame in nm
+    Input:
+        data: bytes/mmap of the xtc file
+        header: frame header
+    Output:
+        (natoms, 3) float array
+    """
+    natoms = header['natoms']
+    xdr = XDRBuffer(data, header['offset'] + 4)
+    if natoms <= MAX_UNCOMPRESSED_ATOMS:
+        return np.array(xdr.unpack(f'>{natoms*3}f')).reshape((natoms, 3))
+    precision = xdr.float()
+    minint = xdr.unpack('>3i')
+    maxint = xdr.unpack('>3i')
+    smallidx = xdr.int()
+    nbytes = xdr.int64() if header['magic'] == XTC_MAGIC_LARGE \
+        else xdr.int()
+    compressed = bytes(data[xdr.offset:xdr.offset+nbytes])
+    coords = decompress_coords(compressed, natoms, minint, maxint, smallidx)
+    return coords / precision
+
+
+def read_xtc_headers(filename):
+    """
+    headers of all complete frames of a xtc file
+    """
+    headers = list()
+    if os.path.getsize(filename) == 0:
+        return headers
+    with open(filename, 'rb') as fd, \
+            mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        xdr = XDRBuffer(data)
+        while not xdr.eof():
+            try:
+                header = read_frame_header(xdr)
+            except struct.error:
+                logger.warning(f'{filename}: incomplete last frame')
+                break
+            if xdr.offset > len(data):
+                logger.warning(f'{filename}: incomplete last frame')
+                break
+            headers.append(header)
+    return headers
+
+
+def iread_xtc(filename, headers=None):
+    """
+    iterate frames of a xtc file
+    Input:
+        filename: xtc filename
+        headers: headers of the frames to decode, default all frames
+    Output:
+        generator of (header, (natoms, 3) coordinates in nm)
+    """
+    if headers is None:
+        headers = read_xtc_headers(filename)
+    if not headers:
+        return
+    with open(filename, 'rb') as fd, \
+            mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for header in headers:
+            yield header, read_frame_coords(data, header)
+
+
+class XTCFollower:
+    """
+    read frames appended to a growing xtc file, e.g. while mdrun is running
+    """
+
+    def __init__(self, filename, offset=0):
+        self.filename = filename
+        self.offset = offset
+
+    def read(self):
+        """
+        complete frames written since the last read
+        Output:
+            generator of (header, (natoms, 3) coordinates in nm)
+        """
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, 'rb') as fd:
+            fd.seek(self.offset)
+            data = fd.read()
+        xdr = XDRBuffer(data)
+        while not xdr.eof():
+            start = xdr.offset
+            try:
+                header = read_frame_header(xdr)
+            except struct.error:
+                break
+            if xdr.offset > len(data):
+                break
+            coords = read_frame_coords(data, header)
+            header['offset'] += self.offset
+            self.offset += xdr.offset - start
+            yield header, coords
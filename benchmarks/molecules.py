@@ -0,0 +1,54 @@
+"""
+
+synthetic molecules for the benchmarks
+
+Linear alkanes C(n)H(2n+2) in an all-trans zigzag, 3n+2 atoms, so the
+sizes of the suite (10 to 10k atoms) are one molecule each.
+
+
+"""
+
+import numpy as np
+
+
+CC_X = 1.26
+CC_Y = 0.89
+CH_Y = 0.63
+CH_Z = 0.89
+CH_END = 1.09
+
+
+def get_alkane(natoms):
+    """
+    alkane with about natoms atoms
+    Output:
+        symbols, (natoms, 3) positions in Angstrom
+    """
+    ncarbons = max(1, round((natoms - 2) / 3))
+    symbols, positions = list(), list()
+    for i in range(ncarbons):
+        x, y = i * CC_X, (i % 2) * CC_Y
+        side = -1 if i % 2 == 0 else 1
+        symbols.append('C')
+        positions.append([x, y, 0.0])
+        for z in [CH_Z, -CH_Z]:
+            symbols.append('H')
+            positions.append([x, y + side * CH_Y, z])
+    symbols += ['H', 'H']
+    positions.append([-CH_END, 0.0, 0.0])
+    last = ncarbons - 1
+    positions.append([last * CC_X + CH_END, (last % 2) * CC_Y, 0.0])
+    return symbols, np.array(positions)
+
+
+def write_alkane(filename, natoms):
+    """
+    write the alkane of get_alkane as xyz
+    """
+    symbols, positions = get_alkane(natoms)
+    lines = [str(len(symbols)), f'alkane C{symbols.count("C")}']
+    lines += [f'{s:2s} {x:14.8f} {y:14.8f} {z:14.8f}'
+              for s, (x, y, z) in zip(symbols, positions)]
+    with open(filename, 'w') as fd:
+        fd.write('\n'.join(lines) + '\n')
+    return filename
@@ -0,0 +1,156 @@
+"""
+
+end-to-end benchmark of the automd pipeline
+
+Every stage of a run is timed on synthetic alkanes of 10 to 10k atoms.
+gromacs is replaced by the stand-in benchmarks/bin/gmx unless --real-gmx is
+given, so the numbers are the python side overhead of automd. The obgmx
+stage runs the obgmx executable, the default obgmx_method, and is skipped
+where its binary is not installed; uff_python is the in-process generator
+whose topology the later stages use.
+
+    python benchmarks/run_benchmarks.py --sizes 10 100 1000 --repeat 3
+    python benchmarks/run_benchmarks.py --json bench.json
+
+
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path[:0] = [BENCH_DIR, os.path.dirname(BENCH_DIR)]
+import molecules  # noqa: E402
+
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+STAGES = ['conversion', 'obgmx', 'uff_python', 'gro_naming', 'mdp',
+          'grompp', 'mdrun', 'energies', 'forces', 'structures']
+
+
+@contextlib.contextmanager
+def timed(timings, stage):
+    start = time.perf_counter()
+    yield
+    timings[stage] = time.perf_counter() - start
+
+
+def has_obgmx_exe():
+    """
+    whether the binary run by the obgmx wrapper script is installed
+    """
+    from automd.obgmx.obgmx import OBGMX_EXE_FNAME
+    return os.path.isfile(OBGMX_EXE_FNAME + '.exe')
+
+
+def run_stages(input_file, dest_dir, max_core=1):
+    """
+    time every stage of a run of input_file in dest_dir
+    Output:
+        {stage: seconds}, without obgmx if its binary is not installed
+    """
+    from automd import gromacs_utils
+    timings = dict()
+    with timed(timings, 'conversion'):
+        structure = gromacs_utils.read_structure(input_file)
+        grofile = gromacs_utils.generate_gromacs_grofile(
+            input_file, dest_dir=dest_dir, structure=structure)
+    if has_obgmx_exe():
+        # own directory, its topology is not used by the later stages
+        exe_dir = os.path.join(dest_dir, 'obgmx_exe')
+        os.makedirs(exe_dir)
+        with timed(timings, 'obgmx'):
+            gromacs_utils.generate_gromacs_topfile(
+                input_file, obgmx_method='exe', dest_dir=exe_dir,
+                use_cache=False, structure=structure)
+    with timed(timings, 'uff_python'):
+        topfile, itpfile = gromacs_utils.generate_gromacs_topfile(
+            input_file, obgmx_method='python', dest_dir=dest_dir,
+            use_cache=False, structure=structure)
+    with timed(timings, 'gro_naming'):
+        gromacs_utils.set_gro_element_name_with_top(grofile, topfile, itpfile)
+    with timed(timings, 'mdp'):
+        mdrunfile = gromacs_utils.generate_mdrun_file(dest_dir=dest_dir)
+    with timed(timings, 'grompp'):
+        gromacs_utils.exec_grompp(mdrunfile, topfile, grofile,
+                                  dest_dir=dest_dir, use_cache=False)
+    with timed(timings, 'mdrun'):
+        gromacs_utils.exec_mdrun(max_core, dest_dir=dest_dir)
+    with timed(timings, 'energies'):
+        gromacs_utils.extract_energies_dict(dest_dir=dest_dir)
+    with timed(timings, 'forces'):
+        gromacs_utils.extract_forces(dest_dir=dest_dir)
+    with timed(timings, 'structures'):
+        gromacs_utils.extract_trajectory_structures(
+            itp_filename=itpfile, dest_dir=dest_dir)
+    return timings
+
+
+def benchmark(sizes, repeat=3, workdir=None, max_core=1):
+    """
+    Output:
+        {natoms: {stage: best seconds of repeat runs}}
+    """
+    results = dict()
+    for size in sizes:
+        best = dict()
+        for i in range(repeat):
+            dest_dir = os.path.join(workdir, f'{size}_{i}')
+            os.makedirs(dest_dir)
+            input_file = molecules.write_alkane(
+                os.path.join(workdir, f'alkane_{size}.xyz'), size)
+            for stage, seconds in run_stages(
+                    input_file, dest_dir, max_core).items():
+                best[stage] = min(best.get(stage, seconds), seconds)
+            shutil.rmtree(dest_dir)
+        results[size] = best
+        print_row(size, best)
+    return results
+
+
+def print_header():
+    print(f'{"natoms":>7s}' + ''.join(f'{x:>11s}' for x in STAGES) +
+          f'{"total":>11s}   (ms, best of repeats)')
+
+
+def print_row(size, timings):
+    print(f'{size:7d}' + ''.join(f'{timings[x] * 1000:11.1f}' if x in timings
+                                 else f'{"-":>11s}' for x in STAGES) +
+          f'{sum(timings.values()) * 1000:11.1f}', flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split(
+        '\n')[0])
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES,
+                        help='numbers of atoms of the molecules')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max_core', type=int, default=1)
+    parser.add_argument('--json', default=None,
+                        help='write the results to this json file')
+    parser.add_argument('--real-gmx', action='store_true',
+                        help='use gmx of PATH instead of the stand-in')
+    args = parser.parse_args()
+    if not args.real_gmx:
+        os.environ['PATH'] = os.path.join(BENCH_DIR, 'bin') + os.pathsep + \
+            os.environ['PATH']
+    with tempfile.TemporaryDirectory(prefix='automd-bench-') as workdir:
+        # caches of a previous benchmark run must not hit
+        os.environ['AUTOMD_CACHE_DIR'] = os.path.join(workdir, 'cache')
+        print_header()
+        results = benchmark(args.sizes, args.repeat, workdir, args.max_core)
+    if args.json:
+        with open(args.json, 'w') as fd:
+            json.dump({'gmx': 'real' if args.real_gmx else 'stand-in',
+                       'repeat': args.repeat, 'results': results},
+                      fd, indent=4)
+
+
+if __name__ == '__main__':
+    main()
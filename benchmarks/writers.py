@@ -0,0 +1,188 @@
+"""
+
+writers of canned gromacs outputs for the benchmarks
+
+edr/trr/xtc files in the layout read by automd.edr/trr/xtc, xvg as written
+by `gmx energy` and multi-frame gro as written by `gmx trjconv`. Single
+precision only, xtc coordinates are compressed without run length coding.
+
+
+"""
+
+import struct
+
+import numpy as np
+
+
+ENERGY_TERMS = [
+    ('Bond', 'kJ/mol'), ('Angle', 'kJ/mol'), ('Proper Dih.', 'kJ/mol'),
+    ('LJ (SR)', 'kJ/mol'), ('Coulomb (SR)', 'kJ/mol'),
+    ('Potential', 'kJ/mol'), ('Kinetic En.', 'kJ/mol'),
+    ('Total Energy', 'kJ/mol'), ('Temperature', 'K'), ('Pressure', 'bar'),
+]
+XTC_PRECISION = 1000.0
+XTC_FIRSTIDX = 9
+
+
+def pack_string(value):
+    data = value.encode()
+    return struct.pack('>i', len(data)) + data + \
+        b'\0' * ((4 - len(data) % 4) % 4)
+
+
+class BitWriter:
+    """
+    MSB first bit stream, the counterpart of automd.xtc.BitReader
+    """
+
+    def __init__(self):
+        self.value = 0
+        self.nbits = 0
+
+    def write(self, value, nbits):
+        self.value = (self.value << nbits) | (value & ((1 << nbits) - 1))
+        self.nbits += nbits
+
+    def write_ints(self, nbits, sizes, values):
+        """
+        encodeints of xdrfile, mixed radix integers packed in nbits
+        """
+        value = (values[0] * sizes[1] + values[1]) * sizes[2] + values[2]
+        while nbits > 8:
+            self.write(value & 0xff, 8)
+            value >>= 8
+            nbits -= 8
+        if nbits > 0:
+            self.write(value, nbits)
+
+    def to_bytes(self):
+        nbytes = (self.nbits + 7) // 8
+        return (self.value << (nbytes * 8 - self.nbits)).to_bytes(
+            nbytes, 'big')
+
+
+def compress_coords(coords):
+    """
+    integer coordinates to (minint, maxint, smallidx, bytes), every atom is
+    written as a large integer triple
+    """
+    minint = coords.min(axis=0)
+    maxint = coords.max(axis=0)
+    sizeint = [int(x) for x in maxint - minint + 1]
+    large = (sizeint[0] | sizeint[1] | sizeint[2]) > 0xffffff
+    bitsize = (sizeint[0] * sizeint[1] * sizeint[2]).bit_length()
+    bits = BitWriter()
+    for atom in (coords - minint).tolist():
+        if large:
+            for value, size in zip(atom, sizeint):
+                bits.write(value, size.bit_length())
+        else:
+            bits.write_ints(bitsize, sizeint, atom)
+        bits.write(0, 1)
+    return minint.tolist(), maxint.tolist(), XTC_FIRSTIDX, bits.to_bytes()
+
+
+def xtc_frame(step, time, box, positions):
+    natoms = len(positions)
+    data = struct.pack('>3if', 1995, natoms, step, time)
+    data += struct.pack('>9f', *np.asarray(box, dtype=float).flatten())
+    data += struct.pack('>i', natoms)
+    if natoms <= 9:
+        return data + struct.pack(f'>{natoms*3}f', *positions.flatten())
+    coords = np.rint(positions * XTC_PRECISION).astype(np.int64)
+    minint, maxint, smallidx, compressed = compress_coords(coords)
+    data += struct.pack('>f3i3iii', XTC_PRECISION, *minint, *maxint,
+                        smallidx, len(compressed))
+    return data + compressed + b'\0' * ((4 - len(compressed) % 4) % 4)
+
+
+def write_xtc(filename, steps, times, box, positions):
+    """
+    Input:
+        steps/times: (nframes,)
+        box: (3, 3) in nm
+        positions: (nframes, natoms, 3) in nm
+    """
+    with open(filename, 'wb') as fd:
+        for step, time, frame in zip(steps, times, positions):
+            fd.write(xtc_frame(step, time, box, frame))
+
+
+def trr_frame(step, time, box, x=None, f=None):
+    natoms = len(x if x is not None else f)
+    block_size = natoms * 3 * 4
+    sizes = [0, 0, 36, 0, 0, 0, 0, block_size if x is not None else 0, 0,
+             block_size if f is not None else 0]
+    data = struct.pack('>ii', 1993, 13) + pack_string('GMX_trn_file')
+    data += struct.pack('>10i', *sizes)
+    data += struct.pack('>3iff', natoms, step, 0, time, 0.0)
+    data += np.asarray(box, dtype='>f4').tobytes()
+    for block in [x, f]:
+        if block is not None:
+            data += np.asarray(block, dtype='>f4').tobytes()
+    return data
+
+
+def write_trr(filename, steps, times, box, positions=None, forces=None):
+    """
+    Input:
+        steps/times: (nframes,)
+        box: (3, 3) in nm
+        positions/forces: (nframes, natoms, 3), nm and kJ/mol/nm
+    """
+    nframes = len(steps)
+    with open(filename, 'wb') as fd:
+        for i in range(nframes):
+            fd.write(trr_frame(
+                steps[i], times[i], box,
+                positions[i] if positions is not None else None,
+                forces[i] if forces is not None else None))
+
+
+def write_edr(filename, steps, times, energies, terms=ENERGY_TERMS):
+    """
+    Input:
+        steps/times: (nframes,)
+        energies: (nframes, nterms) in the units of terms
+    """
+    with open(filename, 'wb') as fd:
+        fd.write(struct.pack('>3i', -55555, 5, len(terms)))
+        for name, unit in terms:
+            fd.write(pack_string(name) + pack_string(unit))
+        for step, time, values in zip(steps, times, energies):
+            fd.write(struct.pack('>fiidqiqdiii', -2e10, -7777777, 5, time,
+                                 step, 0, 0, 0.0, len(terms), 0, 0))
+            fd.write(struct.pack('>3i', 0, 0, 0))
+            fd.write(np.asarray(values, dtype='>f4').tobytes())
+
+
+def write_xvg(filename, times, energies, terms=ENERGY_TERMS):
+    """
+    energies in the format of `gmx energy -o`
+    """
+    lines = ['# This file was created by a stand-in gmx energy',
+             '@    title "GROMACS Energies"',
+             '@    xaxis  label "Time (ps)"',
+             '@TYPE xy']
+    for i, (name, unit) in enumerate(terms):
+        lines.append(f'@ s{i} legend "{name}"')
+    for time, values in zip(times, energies):
+        lines.append(f'{time:12.6f}' + ''.join(f'  {x:12.6f}' for x in values))
+    with open(filename, 'w') as fd:
+        fd.write('\n'.join(lines) + '\n')
+
+
+def write_gro_frames(filename, names, box, positions, times):
+    """
+    frames in the format of `gmx trjconv -o x.gro`
+    """
+    lines = list()
+    for time, frame in zip(times, positions):
+        lines.append(f'Generated by trjconv : MOL t= {time:10.5f}')
+        lines.append(f'{len(frame):5d}')
+        for i, (name, (x, y, z)) in enumerate(zip(names, frame)):
+            lines.append(f'{1:5d}{"MOL":<5s}{name:>5s}{(i+1) % 100000:5d}'
+                         f'{x:8.3f}{y:8.3f}{z:8.3f}')
+        lines.append(''.join(f'{x:10.5f}' for x in np.diag(box)))
+    with open(filename, 'w') as fd:
+        fd.write('\n'.join(lines) + '\n')
@@ -0,0 +1,58 @@
+import os
+import sys
+import shutil
+
+import pytest
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data')
+# make_fixtures has the formulas of the expected values
+sys.path.insert(0, DATA_DIR)
+
+
+@pytest.fixture
+def datafile(tmp_path):
+    """
+    copy of a fixture file in tmp_path, its frame index is written there
+    """
+    def copy(name):
+        return str(shutil.copy(os.path.join(DATA_DIR, name), tmp_path))
+    return copy
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('AUTOMD_CACHE_DIR', str(tmp_path / 'cache'))
+    return tmp_path / 'cache'
+
+
+@pytest.fixture(autouse=True)
+def affinity_file(tmp_path, monkeypatch):
+    """
+    core reservations of the test only, not those of other automd runs
+    """
+    from automd import affinity
+    filename = str(tmp_path / 'affinity.json')
+    monkeypatch.setattr(affinity, 'AFFINITY_FILE', filename)
+    return filename
+
+
+@pytest.fixture
+def gmx(monkeypatch):
+    """
+    the stand-in gmx of benchmarks/bin first in PATH
+    """
+    bin_dir = os.path.join(DATA_DIR, '..', '..', 'benchmarks', 'bin')
+    monkeypatch.setenv('PATH', os.path.realpath(bin_dir) + os.pathsep +
+                       os.environ['PATH'])
+    return shutil.which('gmx')
+
+
+@pytest.fixture
+def alkane(tmp_path):
+    """
+    xyz file of a 29 atom alkane
+    """
+    import make_fixtures as fixtures
+    filename = str(tmp_path / 'alkane.xyz')
+    fixtures.molecules.write_alkane(filename, 29)
+    return filename
@@ -0,0 +1,97 @@
+"""
+
+writes the small fixtures of the tests with known values
+
+The values follow the formulas below, exact in single precision, so the
+tests compare decoded values exactly. The xdrfile_* trajectories are
+written by mdtraj, whose xtc/trr writer is the xdrfile library of
+gromacs, independent of benchmarks/writers.py.
+
+    python tests/data/make_fixtures.py
+
+
+"""
+
+import os
+import sys
+
+import numpy as np
+
+DATA_DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DATA_DIR, '..', '..', 'benchmarks'))
+import writers  # noqa: E402
+import molecules  # noqa: E402
+
+
+BOX = np.eye(3) * 2.5
+EDR_FRAMES = 5
+TRR_FRAMES = 3
+TRR_ATOMS = 12
+XTC_FRAMES = 4
+XTC_ATOMS = [20, 40]
+XDRFILE_FRAMES = 4
+XDRFILE_ATOMS = 302
+
+
+def get_energies(nframes=EDR_FRAMES):
+    nterms = len(writers.ENERGY_TERMS)
+    return 10.0 * np.arange(nframes)[:, None] + np.arange(nterms) + 0.5
+
+
+def get_trr_positions(nframes=TRR_FRAMES, natoms=TRR_ATOMS):
+    return np.arange(nframes)[:, None, None] + \
+        0.125 * np.arange(natoms * 3).reshape((natoms, 3))
+
+
+def get_trr_forces(nframes=TRR_FRAMES, natoms=TRR_ATOMS):
+    return -2 * get_trr_positions(nframes, natoms)
+
+
+def get_xtc_positions(natoms, nframes=XTC_FRAMES):
+    ints = np.arange(nframes)[:, None, None] * 100 + \
+        np.arange(natoms * 3).reshape((natoms, 3)) * 7
+    return ints / writers.XTC_PRECISION
+
+
+def get_xdrfile_positions(nframes=XDRFILE_FRAMES, natoms=XDRFILE_ATOMS):
+    """
+    a vibrating alkane in nm, float32 as written by mdtraj
+    """
+    _, positions = molecules.get_alkane(natoms)
+    rng = np.random.default_rng(1)
+    noise = rng.normal(scale=0.005, size=(nframes, len(positions), 3))
+    return (np.asarray(positions) / 10 + 1 + noise).astype(np.float32)
+
+
+def write_xdrfile_fixtures():
+    from mdtraj.formats import TRRTrajectoryFile, XTCTrajectoryFile
+    positions = get_xdrfile_positions()
+    steps = np.arange(XDRFILE_FRAMES) * 500
+    boxes = np.array([BOX] * XDRFILE_FRAMES, dtype=np.float32)
+    with TRRTrajectoryFile(os.path.join(DATA_DIR, 'xdrfile.trr'), 'w') as fd:
+        fd.write(positions, time=steps * 0.002, step=steps, box=boxes)
+    with XTCTrajectoryFile(os.path.join(DATA_DIR, 'xdrfile.xtc'), 'w') as fd:
+        fd.write(positions, time=steps * 0.002, step=steps, box=boxes)
+
+
+def main():
+    steps = np.arange(EDR_FRAMES) * 100
+    writers.write_edr(os.path.join(DATA_DIR, 'topol.edr'), steps,
+                      steps * 0.002, get_energies())
+    # forces in frames 0 and 2 only, as written by nstfout = 2 * nstxout
+    positions, forces = get_trr_positions(), get_trr_forces()
+    with open(os.path.join(DATA_DIR, 'traj.trr'), 'wb') as fd:
+        for i in range(TRR_FRAMES):
+            fd.write(writers.trr_frame(
+                i * 10, i * 0.02, BOX, positions[i],
+                forces[i] if i % 2 == 0 else None))
+    for natoms in XTC_ATOMS:
+        steps = np.arange(XTC_FRAMES) * 50
+        writers.write_xtc(os.path.join(DATA_DIR, f'topol_{natoms}.xtc'),
+                          steps, steps * 0.002, BOX,
+                          get_xtc_positions(natoms))
+    write_xdrfile_fixtures()
+
+
+if __name__ == '__main__':
+    main()
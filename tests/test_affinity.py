@@ -0,0 +1,63 @@
+import json
+import subprocess
+
+import pytest
+
+from automd import affinity
+from automd import gromacs_utils
+
+
+@pytest.fixture
+def eight_cores(monkeypatch):
+    monkeypatch.setattr(affinity, 'get_available_cores',
+                        lambda: list(range(8)))
+
+
+def test_find_free_cores():
+    assert affinity.find_free_cores(2, range(8), [0, 1]) == (2, 1)
+    # every other core is used
+    assert affinity.find_free_cores(4, range(8), [0, 2, 4, 6]) == (1, 2)
+    assert affinity.find_free_cores(3, range(4), [1, 2]) is None
+
+
+def test_acquire_release(eight_cores, affinity_file):
+    first = affinity.acquire_cores(4)
+    second = affinity.acquire_cores(2)
+    assert first.cores == [0, 1, 2, 3]
+    assert (second.pinoffset, second.pinstride) == (4, 1)
+    assert affinity.acquire_cores(4) is None
+    affinity.release_cores(first)
+    with affinity.reserved_cores(4) as reservation:
+        assert reservation.cores == [0, 1, 2, 3]
+        with open(affinity_file) as fd:
+            assert len(json.load(fd)) == 2
+    affinity.release_cores(second)
+    with open(affinity_file) as fd:
+        assert json.load(fd) == {}
+
+
+def test_dead_reservations(eight_cores, affinity_file):
+    process = subprocess.Popen(['true'])
+    process.wait()
+    with open(affinity_file, 'w') as fd:
+        json.dump({'dead': {'pid': process.pid,
+                            'cores': list(range(8))}}, fd)
+    # the cores of a process that is gone are free again
+    assert affinity.acquire_cores(8).cores == list(range(8))
+
+
+def test_pin_disabled(monkeypatch, eight_cores):
+    monkeypatch.setattr(affinity, 'PIN_CORES', False)
+    assert affinity.acquire_cores(2) is None
+
+
+def test_mdrun_pin_args(gmx, eight_cores):
+    with affinity.reserved_cores(2) as first, \
+            affinity.reserved_cores(2) as second:
+        args = gromacs_utils.get_mdrun_args(2, cores=second)
+    assert first.cores == [0, 1]
+    index = args.index('-pinoffset')
+    assert args[index-2:index+4] == ['-pin', 'on', '-pinoffset', '2',
+                                     '-pinstride', '1']
+    args = gromacs_utils.get_mdrun_args(2)
+    assert args[args.index('-pin') + 1] == 'auto'
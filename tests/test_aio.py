@@ -0,0 +1,78 @@
+import os
+import time
+import asyncio
+
+import pytest
+
+import automd
+from automd import aio
+
+
+def get_processes(cwd):
+    """
+    pids of the processes running in directory cwd
+    """
+    pids = list()
+    for pid in os.listdir('/proc'):
+        try:
+            if pid.isdigit() and \
+                    os.readlink(f'/proc/{pid}/cwd') == os.path.realpath(cwd):
+                pids.append(int(pid))
+        except OSError:
+            pass
+    return pids
+
+
+def test_arun(gmx, alkane, tmp_path):
+    reports = list()
+    out_dict = asyncio.run(automd.arun(
+        alkane, dest_dir=str(tmp_path / 'run'), max_core=1,
+        obgmx_method='python', progress=reports.append))
+    assert os.path.exists(out_dict['edr_filename'])
+    assert len(out_dict['potential_energy'])
+    assert {'grompp', 'mdrun'} <= set(out_dict['timings'])
+    assert reports and reports[-1]['step'] >= 0
+
+
+def test_aget_isomers(gmx, alkane, tmp_path):
+    async def main():
+        return await asyncio.gather(*[automd.aget_isomers(
+            alkane, dest_dir=str(tmp_path / f'run_{i}'), max_core=1,
+            obgmx_method='python') for i in range(2)])
+
+    for structures in asyncio.run(main()):
+        assert structures
+        assert len(structures[0]['symbols']) == 29
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason='needs /proc')
+def test_arun_cancel(gmx, alkane, tmp_path, monkeypatch):
+    monkeypatch.setenv('GMX_STANDIN_MDRUN_SECONDS', '60')
+    dest_dir = str(tmp_path / 'run')
+
+    async def main():
+        task = asyncio.create_task(automd.arun(
+            alkane, dest_dir=dest_dir, max_core=1, obgmx_method='python'))
+        start = time.monotonic()
+        while not os.path.exists(os.path.join(dest_dir, 'log_mdrun.err')):
+            assert time.monotonic() - start < 30
+            await asyncio.sleep(0.05)
+        assert get_processes(dest_dir)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    start = time.monotonic()
+    asyncio.run(main())
+    assert time.monotonic() - start < 30
+    # mdrun is killed
+    assert get_processes(dest_dir) == []
+
+
+def test_run_subprocess_poll(tmp_path):
+    polls = list()
+    exit_code = asyncio.run(aio.run_subprocess(
+        ['sh', '-c', 'sleep 0.3; exit 3'], cwd=str(tmp_path),
+        poll=lambda: polls.append(1), poll_interval=0.05))
+    assert exit_code == 3
+    assert len(polls) >= 2
@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+
+from automd.archive import ResultArchive, SHARD_FORMAT
+
+
+def get_out_dict(i):
+    return {'status_code': 0, 'natoms': 10 + i,
+            'energies': {'Potential': np.arange(5.0) + i},
+            'forces': np.full((2, 3, 3), i, dtype=np.float32)}
+
+
+def test_archive_column_types(tmp_path):
+    directory = str(tmp_path / 'archive')
+    with ResultArchive(directory) as archive:
+        archive.append('007', {'name': 'nan', 'label': 'inf', 'steps': 10,
+                               'time': 1.5, 'converged': True})
+        archive.append('008', {'name': '12', 'steps': 20, 'time': 2,
+                               'converged': False})
+        archive.append('1e3', ValueError('inf'))
+    rows = ResultArchive(directory).rows
+    assert [row['input_file'] for row in rows] == ['007', '008', '1e3']
+    assert [row['name'] for row in rows] == ['nan', '12', None]
+    assert rows[0]['label'] == 'inf'
+    assert rows[2]['error'] == 'inf'
+    assert [row['steps'] for row in rows] == [10, 20, None]
+    assert [row['time'] for row in rows] == [1.5, 2.0, None]
+    assert isinstance(rows[1]['time'], float)
+    assert [row['converged'] for row in rows] == [True, False, None]
+    assert [row['job'] for row in rows] == [0, 1, 2]
+
+
+def test_archive_without_column_types(tmp_path):
+    directory = tmp_path / 'archive'
+    with ResultArchive(str(directory)) as archive:
+        archive.append('a.xyz', {'energy': -1.5, 'steps': 10})
+    # an archive written before columns.json
+    (directory / 'columns.json').unlink()
+    row = ResultArchive(str(directory)).rows[0]
+    assert row['energy'] == -1.5 and row['steps'] == 10
+    assert row['input_file'] == 'a.xyz'
+
+
+def test_archive_shards(tmp_path):
+    directory = str(tmp_path / 'archive')
+    # one shard per job, the arrays of a job are about 110 bytes
+    with ResultArchive(directory, shard_size=100) as archive:
+        for i in range(3):
+            archive.append(f'{i}.xyz', get_out_dict(i))
+        archive.append('bad.xyz', RuntimeError('grompp failed'))
+    assert sorted(x for x in os.listdir(directory) if x.endswith('.npz')) \
+        == [SHARD_FORMAT.format(i) for i in range(3)]
+    archive = ResultArchive(directory)
+    assert len(archive) == 4
+    assert [row['shard'] for row in archive.rows] == [0, 1, 2, None]
+    # series are in the index by their last frame
+    assert [row['energies.Potential'] for row in archive.rows[:3]] == \
+        [4.0, 5.0, 6.0]
+    rows = archive.select(lambda row: row['natoms'] > 10, status='done')
+    assert [row['job'] for row in rows] == [1, 2]
+    assert archive.open_shards == {}
+    # only the shard of the job is read
+    result = archive[2]
+    np.testing.assert_array_equal(result['forces'], np.full((2, 3, 3), 2))
+    np.testing.assert_array_equal(result['energies']['Potential'],
+                                  np.arange(5.0) + 2)
+    assert list(archive.open_shards) == [2]
+    assert {'forces', 'energies', 'natoms'} <= set(result.keys())
+    assert archive[3]['error'] == 'grompp failed'
+    archive.close()
+
+
+def test_archive_append(tmp_path):
+    directory = str(tmp_path / 'archive')
+    with ResultArchive(directory, compress=True) as archive:
+        archive.append('0.xyz', get_out_dict(0))
+        # arrays of the shard not yet written are read from the buffer
+        np.testing.assert_array_equal(archive[0]['forces'],
+                                      np.zeros((2, 3, 3)))
+    with ResultArchive(directory, compress=True) as archive:
+        assert archive.shard == 1
+        archive.append('1.xyz', get_out_dict(1))
+    archive = ResultArchive(directory)
+    assert [row['shard'] for row in archive.rows] == [0, 1]
+    np.testing.assert_array_equal(archive[0]['forces'], np.zeros((2, 3, 3)))
+    np.testing.assert_array_equal(archive[1]['forces'], np.ones((2, 3, 3)))
+    archive.close()
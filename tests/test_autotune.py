@@ -0,0 +1,62 @@
+import os
+
+import automd
+from automd import autotune
+
+
+def test_get_candidate_layouts():
+    assert autotune.get_candidate_layouts(1) == [(1, 1)]
+    assert autotune.get_candidate_layouts(4) == [
+        (1, 1), (1, 2), (1, 4), (2, 2), (4, 1)]
+    assert autotune.get_candidate_layouts(6) == [
+        (1, 1), (1, 2), (1, 4), (1, 6), (2, 3), (3, 2), (6, 1)]
+
+
+def test_get_size_bucket():
+    assert [autotune.get_size_bucket(n) for n in [0, 1, 29, 32, 33]] == \
+        [1, 1, 32, 32, 64]
+
+
+def test_select_layout(tmp_path):
+    (tmp_path / autotune.AUTOTUNE_DIR / '1x2').mkdir(parents=True)
+    results = {'1x1': 10.0, '1x2': 25.0, '2x1': None}
+    layout = autotune.select_layout(100, results, str(tmp_path))
+    assert layout == {'ntmpi': 1, 'ntomp': 2, 'ns_per_day': 25.0,
+                      'natoms': 100, 'candidates': results}
+    assert not (tmp_path / autotune.AUTOTUNE_DIR).exists()
+    assert autotune.select_layout(100, {'1x1': None}, str(tmp_path)) is None
+
+
+def test_get_benchmark_args(gmx):
+    args = autotune.get_benchmark_args(2, 2)
+    assert args[args.index('-ntmpi') + 1] == '2'
+    assert args[args.index('-ntomp') + 1] == '2'
+    assert '-nt' not in args
+    assert args[args.index('-nsteps') + 1] == str(autotune.TUNE_NSTEPS)
+    assert args[args.index('-maxh') + 1] == str(autotune.TUNE_MAXH)
+    assert '-resethway' in args and '-noconfout' in args
+
+
+def test_read_benchmark_failed(tmp_path):
+    tune_dir = tmp_path / '1x1'
+    tune_dir.mkdir()
+    assert autotune.read_benchmark(1, 1, str(tune_dir), 1) is None
+    assert not tune_dir.exists()
+
+
+def test_autotune_run(gmx, alkane, tmp_path):
+    dest_dir = str(tmp_path / 'first')
+    first = automd.run(alkane, dest_dir=dest_dir, max_core=1,
+                       obgmx_method='python', autotune=True)
+    assert first['thread_layout'] == {'ntmpi': 1, 'ntomp': 1}
+    assert not os.path.exists(os.path.join(dest_dir, autotune.AUTOTUNE_DIR))
+    layout, natoms, _ = autotune.find_layout(first['grofile'], 1)
+    assert natoms == 29
+    assert layout['natoms'] == 29 and layout['ns_per_day'] > 0
+    assert list(layout['candidates']) == ['1x1']
+    # a system of the same size bucket uses the stored layout
+    second = automd.run(alkane, dest_dir=str(tmp_path / 'second'),
+                        max_core=1, obgmx_method='python')
+    assert second['thread_layout'] == first['thread_layout']
+    # no layout is stored for another number of cores
+    assert autotune.find_layout(first['grofile'], 2)[0] is None
@@ -0,0 +1,89 @@
+import os
+import time
+import threading
+
+from automd import batch
+
+import make_fixtures as fixtures
+
+
+def write_alkanes(tmp_path, sizes):
+    filenames = list()
+    for natoms in sizes:
+        filename = str(tmp_path / f'alkane_{natoms}.xyz')
+        fixtures.molecules.write_alkane(filename, natoms)
+        filenames.append(filename)
+    return filenames
+
+
+def test_count_atoms(tmp_path):
+    filename, = write_alkanes(tmp_path, [29])
+    assert batch.count_atoms(filename) == 29
+    gro = tmp_path / 'input.gro'
+    fixtures.writers.write_gro_frames(
+        str(gro), ['C'] * 5, fixtures.BOX, fixtures.get_xtc_positions(5), [0])
+    assert batch.count_atoms(str(gro)) == 5
+    pdb = tmp_path / 'input.pdb'
+    pdb.write_text(
+        'MODEL        1\n' +
+        'ATOM      1  C   MOL     1       0.000   0.000   0.000\n' * 3 +
+        'ENDMDL\nMODEL        2\n' +
+        'ATOM      1  C   MOL     1       0.000   0.000   0.000\n' * 3 +
+        'ENDMDL\n')
+    assert batch.count_atoms(str(pdb)) == 3
+
+
+def test_get_job_threads():
+    assert batch.get_job_threads(10, 8) == 1
+    assert batch.get_job_threads(batch.ATOMS_PER_THREAD * 3 + 1, 8) == 4
+    assert batch.get_job_threads(100000, 8) == 8
+
+
+def test_read_manifest(tmp_path):
+    manifest = tmp_path / 'inputs.txt'
+    manifest.write_text('# isomers\na.xyz\n\n/data/b.xyz  # absolute\n')
+    assert batch.read_manifest(str(manifest)) == [
+        str(tmp_path / 'a.xyz'), '/data/b.xyz']
+
+
+def test_run_many_cores(tmp_path, monkeypatch):
+    """
+    jobs never use more than total_cores together
+    """
+    lock = threading.Lock()
+    used, peak = [0], [0]
+
+    def run(input_file, dest_dir, max_core, **args):
+        with lock:
+            used[0] += max_core
+            peak[0] = max(peak[0], used[0])
+        time.sleep(0.05)
+        with lock:
+            used[0] -= max_core
+        if 'alkane_11' in input_file:
+            raise OSError('mdrun error')
+        return {'dest_dir': dest_dir, 'max_core': max_core}
+
+    monkeypatch.setattr(batch.main, 'run', run)
+    inputs = write_alkanes(tmp_path, [200, 140, 11, 70, 300])
+    inputs.append(str(tmp_path / 'missing.xyz'))
+    results = dict(batch.run_many(inputs, total_cores=6, max_core=4,
+                                  dest_dir=str(tmp_path / 'jobs')))
+    assert set(results) == set(inputs)
+    assert peak[0] <= 6
+    assert isinstance(results[inputs[2]], OSError)
+    assert isinstance(results[inputs[-1]], OSError)
+    assert results[inputs[0]]['max_core'] == 4
+    assert results[inputs[3]]['max_core'] == 2
+    assert os.path.basename(results[inputs[1]]['dest_dir']) == '1_alkane_140'
+
+
+def test_run_many(gmx, tmp_path):
+    inputs = write_alkanes(tmp_path, [11, 29])
+    results = dict(batch.run_many(inputs, total_cores=2,
+                                  dest_dir=str(tmp_path / 'jobs'),
+                                  obgmx_method='python'))
+    for input_file in inputs:
+        out_dict = results[input_file]
+        assert not isinstance(out_dict, Exception), out_dict
+        assert os.path.exists(out_dict['edr_filename'])
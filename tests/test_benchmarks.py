@@ -0,0 +1,27 @@
+import os
+import sys
+import json
+import subprocess
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..',
+                         'benchmarks')
+
+
+def test_run_benchmarks(tmp_path):
+    json_filename = str(tmp_path / 'bench.json')
+    subprocess.run([sys.executable,
+                    os.path.join(BENCH_DIR, 'run_benchmarks.py'),
+                    '--sizes', '10', '20', '--repeat', '1',
+                    '--json', json_filename],
+                   check=True, cwd=str(tmp_path), stdout=subprocess.PIPE)
+    with open(json_filename) as fd:
+        report = json.load(fd)
+    assert report['gmx'] == 'stand-in'
+    assert list(report['results']) == ['10', '20']
+    stages = set(report['results']['20'])
+    # obgmx only where its binary is installed
+    assert {'conversion', 'uff_python', 'grompp', 'mdrun', 'energies',
+            'forces', 'structures'} <= stages
+    assert all(x >= 0 for x in report['results']['20'].values())
+    # the runs are in a temporary directory
+    assert os.listdir(str(tmp_path)) == ['bench.json']
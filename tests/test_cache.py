@@ -0,0 +1,62 @@
+import os
+import time
+
+import pytest
+
+from automd.cache import DiskCache, hash_key, hash_files
+
+
+def put(cache, tmp_path, key, nbytes=1000):
+    filename = tmp_path / f'{key}.dat'
+    filename.write_bytes(b'x' * nbytes)
+    return cache.put(key, {'data': str(filename)})
+
+
+def test_hash_key(tmp_path):
+    assert hash_key('a', {'x': 1, 'y': 2}) == hash_key('a', {'y': 2, 'x': 1})
+    assert hash_key('a', 1) != hash_key('a', 2)
+    first, second = tmp_path / 'first', tmp_path / 'second'
+    first.write_text('same')
+    second.write_text('same')
+    assert hash_files(first) == hash_files(second)
+    second.write_text('other')
+    assert hash_files(first) != hash_files(second)
+
+
+def test_put_get(tmp_path, cache_dir):
+    cache = DiskCache('test', max_size=10000)
+    assert cache.get('a') is None
+    entry = put(cache, tmp_path, 'a')
+    assert entry == os.path.join(str(cache_dir), 'test', 'a')
+    assert cache.get('a') == entry
+    with open(os.path.join(entry, 'data'), 'rb') as fd:
+        assert fd.read() == b'x' * 1000
+
+
+def test_evict_lru(tmp_path):
+    cache = DiskCache('test', max_size=2500)
+    for key in ['a', 'b']:
+        put(cache, tmp_path, key)
+    past = time.time() - 100
+    for offset, key in enumerate(['a', 'b']):
+        os.utime(os.path.join(cache.directory, key),
+                 (past + offset, past + offset))
+    # a was stored first but used last
+    assert cache.get('a') is not None
+    put(cache, tmp_path, 'c')
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+
+
+def test_max_size_env(monkeypatch):
+    monkeypatch.setenv('AUTOMD_TEST_CACHE_SIZE', '123')
+    assert DiskCache('test', max_size=10000).max_size == 123
+
+
+def test_put_missing_file(tmp_path):
+    cache = DiskCache('test', max_size=10000)
+    with pytest.raises(FileNotFoundError):
+        cache.put('a', {'data': str(tmp_path / 'missing.dat')})
+    assert os.listdir(cache.directory) == []
+    assert cache.get('a') is None
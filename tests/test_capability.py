@@ -0,0 +1,50 @@
+import stat
+
+import pytest
+
+from automd import capability
+
+
+def write_gmx(tmp_path, mdrun_help):
+    """
+    gmx printing the version of the stand-in and mdrun_help for mdrun -h
+    """
+    filename = tmp_path / 'gmx'
+    filename.write_text(
+        '#!/bin/sh\n'
+        'if [ "$1" = mdrun ]; then\n'
+        f'    {mdrun_help}\n'
+        'fi\n'
+        'echo "GROMACS version:    2021.4"\n'
+        'echo "Precision:          mixed"\n')
+    filename.chmod(filename.stat().st_mode | stat.S_IEXEC)
+    return str(filename)
+
+
+def test_get_capability(gmx):
+    gmx_capability = capability.get_capability()
+    assert gmx_capability.version == '2020.1'
+    assert gmx_capability.precision == 'single'
+    assert gmx_capability.simd == 'AVX2_256'
+    assert not gmx_capability.double
+    for flag in ['-pme', '-rerun', '-v', '-nov', '-append', '-noappend']:
+        assert gmx_capability.supports(flag)
+    assert not gmx_capability.supports('-gpu_id')
+    # from the disk cache, as in a new process
+    capability._get_capability.cache_clear()
+    assert capability.get_capability().to_dict() == gmx_capability.to_dict()
+
+
+@pytest.mark.parametrize('mdrun_help', [
+    'echo "Fatal error: no mdrun in this build"; exit 1',
+    'exit 0'])
+def test_probe_gromacs_mdrun_failed(tmp_path, cache_dir, mdrun_help):
+    gmx_path = write_gmx(tmp_path, mdrun_help)
+    with pytest.raises(OSError):
+        capability.get_capability(gmx_path)
+    assert not list(cache_dir.glob('capability/*'))
+    gmx_path = write_gmx(tmp_path, 'echo " -pme    <enum>   (auto)"; exit 0')
+    capability._get_capability.cache_clear()
+    gmx_capability = capability.get_capability(gmx_path)
+    assert gmx_capability.version == '2021.4'
+    assert gmx_capability.mdrun_flags == ['-pme']
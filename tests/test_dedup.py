@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from automd import dedup
+
+
+def get_rotation(angle):
+    cos, sin = np.cos(angle), np.sin(angle)
+    return np.array([[cos, -sin, 0], [sin, cos, 0], [0, 0, 1]])
+
+
+@pytest.fixture
+def conformers():
+    rng = np.random.default_rng(0)
+    first = rng.random((8, 3)) * 4
+    second = first.copy()
+    second[:4] += 3
+    return first, second
+
+
+@pytest.mark.parametrize('method', dedup.SUPPORTED_METHODS)
+def test_deduplicate(conformers, method):
+    first, second = conformers
+    positions = [first, first @ get_rotation(0.7).T + 5, second,
+                 first + 0.01, second @ get_rotation(2.0).T]
+    structures = [{'symbols': ['C'] * 8, 'positions': x, 'frame': i}
+                  for i, x in enumerate(positions)]
+    output = dedup.deduplicate(structures, method=method)
+    assert [x['frame'] for x in output] == [0, 2]
+    assert [x['cluster_size'] for x in output] == [3, 2]
+
+
+def test_cluster_rmsd_medoid(conformers):
+    first, _ = conformers
+    shift = np.zeros((8, 3))
+    shift[0, 0] = 0.6
+    positions = np.array([first + shift, first, first - shift])
+    reps, labels = dedup.cluster_positions(positions, method='rmsd',
+                                           threshold=1.0, mode='cluster')
+    np.testing.assert_array_equal(labels, [0, 0, 0])
+    # the member nearest to the aligned mean, not the first frame
+    np.testing.assert_array_equal(reps, [1])
+
+
+def test_cluster_rmsd_rotated(conformers):
+    first, _ = conformers
+    rng = np.random.default_rng(1)
+    noise = rng.normal(scale=0.05, size=(20, 8, 3))
+    noise[7] = 0
+    positions = np.array([(first + x) @ get_rotation(i).T
+                          for i, x in enumerate(noise)])
+    reps, labels = dedup.cluster_positions(positions, method='rmsd',
+                                           threshold=1.0, mode='cluster')
+    np.testing.assert_array_equal(labels, [0] * 20)
+    np.testing.assert_array_equal(reps, [7])
+
+
+def test_align_positions(conformers):
+    first, _ = conformers
+    ref = dedup.center_positions(first)
+    positions = dedup.center_positions(
+        np.array([first @ get_rotation(angle).T for angle in [0.3, 2.5]]))
+    np.testing.assert_allclose(dedup.align_positions(positions, ref),
+                               [ref, ref], atol=1e-10)
+
+
+def test_kabsch_rmsd(conformers):
+    first, second = conformers
+    refs = dedup.center_positions(np.array([first, second]))
+    rotated = dedup.center_positions((first @ get_rotation(1.1).T)[None])[0]
+    rmsd = dedup.kabsch_rmsd(refs, rotated)
+    assert rmsd[0] == pytest.approx(0, abs=1e-6)
+    assert rmsd[1] > 1
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from automd import edr
+from automd import frameindex
+
+import make_fixtures as fixtures
+
+
+def test_read_edr(datafile):
+    data = edr.read_edr(datafile('topol.edr'))
+    terms = fixtures.writers.ENERGY_TERMS
+    assert data['names'] == [name for name, _ in terms]
+    assert data['units'] == [unit for _, unit in terms]
+    np.testing.assert_array_equal(data['step'], np.arange(5) * 100)
+    np.testing.assert_allclose(data['time'], np.arange(5) * 0.2)
+    np.testing.assert_array_equal(data['energies'], fixtures.get_energies())
+
+
+def test_read_edr_terms_frames(datafile):
+    data = edr.read_edr(datafile('topol.edr'), terms=['Potential', 'Bond'],
+                        frames=[-1, 1])
+    assert data['names'] == ['Potential', 'Bond']
+    np.testing.assert_array_equal(data['step'], [400, 100])
+    np.testing.assert_array_equal(data['energies'], [[45.5, 40.5],
+                                                     [15.5, 10.5]])
+    with pytest.raises(KeyError):
+        edr.read_edr(datafile('topol.edr'), terms=['Pot'])
+
+
+def test_read_edr_frames(datafile):
+    filename = datafile('topol.edr')
+    for frames in [None, 2, slice(1, None, 2), [-1, 0]]:
+        data = frameindex.read_edr_frames(filename, ['Temperature'], frames)
+        expected = edr.read_edr(filename, ['Temperature'], frames)
+        np.testing.assert_array_equal(data['step'], expected['step'])
+        np.testing.assert_array_equal(data['energies'],
+                                      expected['energies'])
+
+
+def read_xvg(filename):
+    legends = list()
+    with open(filename) as fd:
+        for line in fd:
+            if line.startswith('@ s') and ' legend ' in line:
+                legends.append(line.split('"')[1])
+    return legends, np.loadtxt(filename, comments=['#', '@'])
+
+
+@pytest.mark.parametrize('name', ['gromacs_cat_small', 'gromacs_4_d'])
+def test_read_edr_gromacs(datafile, name):
+    """
+    files written by gromacs against their `gmx energy` output
+    """
+    data = edr.read_edr(datafile(f'{name}.edr'))
+    legends, values = read_xvg(datafile(f'{name}.xvg'))
+    assert data['names'] == legends
+    np.testing.assert_allclose(data['time'], values[:, 0])
+    # xvg values are printed with 6 significant digits
+    np.testing.assert_allclose(data['energies'], values[:, 1:], rtol=1e-5,
+                               atol=1e-4)
+    indexed = frameindex.read_edr_frames(datafile(f'{name}.edr'),
+                                         frames=[-1])
+    np.testing.assert_array_equal(indexed['energies'], data['energies'][-1:])
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from automd import fileio
+
+import make_fixtures as fixtures
+
+PDB = """\
+CRYST1   20.000   30.000   40.000  90.00  90.00  90.00 P 1           1
+MODEL        1
+ATOM      1  C1  MOL     1       0.000   0.000   0.000  1.00  0.00           C
+ATOM      2 CL1  MOL     1       1.760   0.000   0.000  1.00  0.00
+HETATM    3  H1  MOL     1      -0.360   1.020   0.000  1.00  0.00
+ENDMDL
+MODEL        2
+ATOM      1  C1  MOL     1       0.100   0.000   0.000  1.00  0.00           C
+ATOM      2 CL1  MOL     1       1.860   0.000   0.000  1.00  0.00
+HETATM    3  H1  MOL     1      -0.260   1.020   0.000  1.00  0.00
+ENDMDL
+"""
+
+
+def test_xyz(tmp_path):
+    symbols, positions = fixtures.molecules.get_alkane(11)
+    filename = str(tmp_path / 'a.xyz')
+    fileio.write_xyz(filename, {'symbols': symbols, 'positions': positions})
+    arrays = fileio.read_structure(filename)
+    assert arrays['symbols'] == symbols
+    np.testing.assert_allclose(arrays['positions'], positions, atol=1e-8)
+
+
+def test_pdb(tmp_path):
+    filename = tmp_path / 'a.pdb'
+    filename.write_text(PDB)
+    arrays = fileio.read_structure(str(filename))
+    assert arrays['symbols'] == ['C', 'Cl', 'H']
+    np.testing.assert_allclose(arrays['positions'][1], [1.76, 0, 0])
+    np.testing.assert_allclose(arrays['cell'], np.diag([20, 30, 40]),
+                               atol=1e-12)
+    arrays = fileio.read_pdb(str(filename), index=1)
+    np.testing.assert_allclose(arrays['positions'][:, 0],
+                               [0.1, 1.86, -0.26])
+
+
+@pytest.mark.parametrize('cell', [
+    np.diag([25.0, 25.0, 25.0]),
+    [[25.0, 0, 0], [5.0, 24.0, 0], [3.0, 4.0, 23.0]]])
+def test_gro(tmp_path, cell):
+    filename = str(tmp_path / 'a.gro')
+    positions = fixtures.get_xtc_positions(3)[0] * 10
+    arrays = {'symbols': ['C', 'Cl', 'H'], 'positions': positions,
+              'cell': cell, 'names': ['C_3', 'Cl1', 'H_']}
+    fileio.write_gro(filename, arrays, title='test')
+    arrays = fileio.read_structure(filename)
+    assert arrays['symbols'] == ['C', 'Cl', 'H']
+    assert arrays['comment'] == 'test'
+    # gro positions have 3 decimals in nm
+    np.testing.assert_allclose(arrays['positions'], positions, atol=5e-3)
+    np.testing.assert_allclose(arrays['cell'], cell, atol=5e-5)
+    mdtraj = pytest.importorskip('mdtraj')
+    trajectory = mdtraj.load(filename)
+    np.testing.assert_allclose(arrays['positions'],
+                               trajectory.xyz[0] * 10, atol=1e-5)
+    np.testing.assert_allclose(arrays['cell'],
+                               trajectory.unitcell_vectors[0] * 10, atol=1e-4)
+
+
+def test_center_structure():
+    _, positions = fixtures.molecules.get_alkane(11)
+    arrays = fileio.center_structure({'positions': positions}, margin=5.0)
+    extent = positions.max(axis=0) - positions.min(axis=0)
+    np.testing.assert_allclose(arrays['cell'], np.diag(extent + 10.0))
+    np.testing.assert_allclose(arrays['positions'].mean(axis=0),
+                               (extent + 10.0) / 2)
+    # the cell of the input is kept
+    cell = np.diag([30.0, 30.0, 30.0])
+    arrays = fileio.center_structure({'positions': positions, 'cell': cell})
+    np.testing.assert_allclose(arrays['cell'], cell)
+    np.testing.assert_allclose(arrays['positions'].mean(axis=0), 15.0)
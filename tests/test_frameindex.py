@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+
+from automd import trr
+from automd import frameindex
+
+import make_fixtures as fixtures
+
+
+def write_frames(filename, steps, mode='wb', natoms=100):
+    with open(filename, mode) as fd:
+        for step in steps:
+            fd.write(trr.pack_frame(step, step * 0.1, fixtures.BOX,
+                                    np.full((natoms, 3), step / 8)))
+
+
+def read_x(filename, frames=None):
+    return frameindex.read_trr_frames(filename, keys=['x'],
+                                      frames=frames)[1]['x']
+
+
+def test_frame_index(datafile):
+    filename = datafile('traj.trr')
+    index = frameindex.get_frame_index(filename)
+    assert os.path.exists(frameindex.get_index_filename(filename))
+    np.testing.assert_array_equal(index['step'], [0, 10, 20])
+    assert index['offset'][0] == 0
+    np.testing.assert_array_equal(index['offset'][1:],
+                                  np.cumsum(index['size'])[:-1])
+    assert int(index['end']) == os.path.getsize(filename)
+    # loaded from the sidecar
+    loaded = frameindex.get_frame_index(filename)
+    np.testing.assert_array_equal(loaded['offset'], index['offset'])
+
+
+def test_frame_index_grows(tmp_path):
+    filename = str(tmp_path / 'traj.trr')
+    write_frames(filename, [0, 1, 2])
+    assert list(frameindex.read_frame_steps(filename)) == [0, 1, 2]
+    # a partial frame is not indexed until it is complete
+    frame = trr.pack_frame(3, 0.3, fixtures.BOX, np.full((100, 3), 3 / 8))
+    with open(filename, 'ab') as fd:
+        fd.write(frame[:50])
+    assert list(frameindex.read_frame_steps(filename)) == [0, 1, 2]
+    with open(filename, 'ab') as fd:
+        fd.write(frame[50:])
+    write_frames(filename, [4], mode='ab')
+    assert list(frameindex.read_frame_steps(filename)) == [0, 1, 2, 3, 4]
+    np.testing.assert_array_equal(read_x(filename, frames=[3, 4]),
+                                  [np.full((100, 3), 3 / 8),
+                                   np.full((100, 3), 4 / 8)])
+
+
+def test_frame_index_last_frame_rewritten(tmp_path):
+    filename = str(tmp_path / 'traj.trr')
+    write_frames(filename, [0, 1, 2, 3, 4])
+    index = frameindex.get_frame_index(filename)
+    # same first HEAD_SIZE bytes and a longer file, but a different last
+    # indexed frame
+    assert index['offset'][-1] >= frameindex.HEAD_SIZE
+    write_frames(filename, [0, 1, 2, 3, 9, 10])
+    assert list(frameindex.read_frame_steps(filename)) == [0, 1, 2, 3, 9, 10]
+    np.testing.assert_array_equal(read_x(filename, frames=4)[0],
+                                  np.full((100, 3), 9 / 8))
+
+
+def test_frame_index_rewritten(tmp_path):
+    filename = str(tmp_path / 'traj.trr')
+    write_frames(filename, [0, 1, 2, 3])
+    frameindex.get_frame_index(filename)
+    write_frames(filename, [5, 6], natoms=4)
+    assert list(frameindex.read_frame_steps(filename)) == [5, 6]
+    assert read_x(filename).shape == (2, 4, 3)
+
+
+def test_read_gro_frames(tmp_path):
+    filename = str(tmp_path / 'output.gro')
+    positions = fixtures.get_xtc_positions(5)
+    fixtures.writers.write_gro_frames(filename, ['C', 'H', 'H', 'H', 'H'],
+                                      fixtures.BOX, positions, [0, 1, 2, 3])
+    frames = frameindex.read_gro_frames(filename, frames=[0, -1])
+    assert len(frames) == 2
+    np.testing.assert_allclose(frames[1]['positions'], positions[-1] * 10)
+    assert len(frameindex.get_frame_index(filename)['offset']) == 4
@@ -0,0 +1,99 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import atomtools.unit
+from automd import gromacs_utils
+from automd import main
+
+import make_fixtures as fixtures
+
+# kJ/mol/nm to eV/Ang
+FORCE_UNIT = float(atomtools.unit.trans_energy('kJ/mol', 'eV') /
+                   atomtools.unit.trans_length('nm', 'Ang'))
+
+
+@pytest.fixture
+def trr_parts(datafile, tmp_path):
+    """
+    traj.trr (forces at steps 0 and 20) and traj.part0002.trr of a run
+    resumed at step 20 (forces at steps 20 and 30)
+    """
+    dest_dir = tmp_path / 'run'
+    dest_dir.mkdir()
+    shutil.copy(datafile('traj.trr'), dest_dir / 'traj.trr')
+    positions = fixtures.get_trr_positions(2)
+    with open(dest_dir / 'traj.part0002.trr', 'wb') as fd:
+        for step, x in zip([20, 30], positions):
+            fd.write(fixtures.writers.trr_frame(
+                step, step * 0.002, fixtures.BOX, x, 3 * x))
+    forces = fixtures.get_trr_forces()
+    return str(dest_dir), np.array([forces[0], 3 * positions[0],
+                                    3 * positions[1]]) * FORCE_UNIT
+
+
+def test_extract_forces_parts(trr_parts):
+    dest_dir, expected = trr_parts
+    np.testing.assert_allclose(
+        gromacs_utils.extract_forces(dest_dir=dest_dir), expected,
+        rtol=1e-6)
+
+
+@pytest.mark.parametrize('chunk_frames', [1, 256])
+def test_extract_forces_selection_mmap(trr_parts, monkeypatch,
+                                       chunk_frames):
+    monkeypatch.setattr(gromacs_utils, 'FORCES_CHUNK_FRAMES', chunk_frames)
+    dest_dir, expected = trr_parts
+    forces = gromacs_utils.extract_forces(
+        dest_dir=dest_dir, dtype=np.float32, mmap=True, frames=[0, 2, 1],
+        atoms=[1, 3])
+    assert isinstance(forces, np.memmap)
+    np.testing.assert_allclose(forces, expected[[0, 2, 1]][:, [1, 3]],
+                               rtol=1e-6)
+    np.testing.assert_array_equal(
+        np.load(os.path.join(dest_dir, gromacs_utils.FORCES_NPY)), forces)
+
+
+def test_extract_forces_empty_selection(trr_parts):
+    dest_dir, _ = trr_parts
+    forces = gromacs_utils.extract_forces(dest_dir=dest_dir, mmap=True,
+                                          frames=slice(0, 0))
+    assert forces.shape == (0, 0, 3)
+
+
+def test_exec_grompp_cache(gmx, alkane, tmp_path):
+    dest_dirs = [str(tmp_path / name) for name in ['first', 'second']]
+    for dest_dir in dest_dirs:
+        out_dict = main.prepare_inputs(alkane, dest_dir=dest_dir,
+                                       obgmx_method='python')
+    names = [os.path.basename(out_dict[key])
+             for key in ['mdrunfile', 'topfile', 'grofile']]
+    gromacs_utils.exec_grompp(*names, dest_dir=dest_dirs[0])
+    assert os.path.exists(os.path.join(dest_dirs[0], 'log_grompp.log'))
+    # identical inputs: topol.tpr is copied, grompp is not run
+    gromacs_utils.exec_grompp(*names, dest_dir=dest_dirs[1])
+    assert not os.path.exists(os.path.join(dest_dirs[1], 'log_grompp.log'))
+    with open(os.path.join(dest_dirs[0], gromacs_utils.TPR_FILE), 'rb') as fd:
+        tpr = fd.read()
+    with open(os.path.join(dest_dirs[1], gromacs_utils.TPR_FILE), 'rb') as fd:
+        assert fd.read() == tpr
+    # the itp included by the top is part of the key
+    with open(out_dict['itpfile'], 'a') as fd:
+        fd.write('; changed\n')
+    assert not gromacs_utils.lookup_tpr(*names, dest_dir=dest_dirs[1])[0]
+
+
+def test_lookup_tpr_random_seed(gmx, alkane, tmp_path):
+    out_dict = main.prepare_inputs(alkane, dest_dir=str(tmp_path),
+                                   obgmx_method='python')
+    gromacs_utils.set_mdp_options(out_dict['mdrunfile'],
+                                  {'gen_vel': 'yes', 'gen_seed': -1})
+    names = [os.path.basename(out_dict[key])
+             for key in ['mdrunfile', 'topfile', 'grofile']]
+    assert gromacs_utils.lookup_tpr(*names, dest_dir=str(tmp_path)) == \
+        (False, None)
+    gromacs_utils.set_mdp_options(out_dict['mdrunfile'], {'gen-seed': 7})
+    hit, cache_key = gromacs_utils.lookup_tpr(*names, dest_dir=str(tmp_path))
+    assert not hit and cache_key
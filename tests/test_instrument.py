@@ -0,0 +1,26 @@
+import time
+
+from automd import instrument
+
+
+def test_stage_timings(tmp_path):
+    (tmp_path / 'topol.log').write_bytes(b'x' * 1000)
+    (tmp_path / 'input.gro').write_bytes(b'x' * 500)
+    timings = instrument.StageTimings(str(tmp_path))
+    with timings.stage('mdrun'):
+        (tmp_path / 'topol.edr').write_bytes(b'x' * 100)
+        with open(tmp_path / 'topol.log', 'ab') as fd:
+            fd.write(b'x' * 50)
+        time.sleep(0.01)
+    record = timings.to_dict()['mdrun']
+    # the new file and the growth of the log, not its full size
+    assert record['bytes_written'] == 150
+    assert record['wall_time'] >= 0.01
+    assert record['peak_rss'] > 0
+    with timings.stage('mdrun'):
+        (tmp_path / 'topol.log').write_bytes(b'y' * 200)
+    # stages entered twice add up, a shrunk file wrote no bytes
+    assert timings.to_dict()['mdrun']['bytes_written'] == 150
+    assert set(timings.to_dict()['mdrun']) == {
+        'wall_time', 'cpu_time', 'child_cpu_time', 'peak_rss',
+        'bytes_written'}
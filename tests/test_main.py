@@ -0,0 +1,94 @@
+import os
+import json
+import time
+
+import pytest
+
+import automd
+from automd import main
+from automd import xtc
+from automd import affinity
+from automd import gromacs_utils
+
+
+def test_prepare_inputs(gmx, alkane, tmp_path):
+    dest_dir = str(tmp_path / 'run')
+    out_dict = main.prepare_inputs(alkane, dest_dir=dest_dir,
+                                   obgmx_method='python')
+    for key in ['grofile', 'topfile', 'itpfile', 'mdrunfile']:
+        assert os.path.exists(out_dict[key])
+    # the parsed input is shared, only the obgmx executable reads an xyz file
+    assert not os.path.exists(os.path.join(dest_dir, 'input.xyz'))
+
+
+def test_check_resume(tmp_path):
+    assert main.check_resume(str(tmp_path)) == (False, False)
+    # no checkpoint: a new run is started
+    assert main.check_resume(str(tmp_path), resume=True) == (True, False)
+    with pytest.raises(ValueError):
+        main.check_resume(str(tmp_path), extend_time=10)
+
+
+def test_mdrun_args_checkpoint(gmx, tmp_path):
+    dest_dir = str(tmp_path)
+    assert gromacs_utils.find_checkpoint(dest_dir) == (None, True)
+    for name in [gromacs_utils.CPT_FILE, gromacs_utils.TPR_FILE]:
+        (tmp_path / name).write_bytes(b'')
+    # without its log the outputs of the run are written to new parts
+    checkpoint, append = gromacs_utils.find_checkpoint(dest_dir)
+    assert (checkpoint, append) == (gromacs_utils.CPT_FILE, False)
+    args = gromacs_utils.get_mdrun_args(1, checkpoint=checkpoint,
+                                        append=append)
+    assert args[args.index('-cpi') + 1] == gromacs_utils.CPT_FILE
+    assert '-noappend' in args
+    (tmp_path / gromacs_utils.LOG_FILE).write_text('')
+    assert gromacs_utils.find_checkpoint(dest_dir)[1]
+
+
+def test_resume_extend(gmx, alkane, tmp_path):
+    dest_dir = str(tmp_path / 'run')
+    first = automd.run(alkane, dest_dir=dest_dir, max_core=1,
+                       obgmx_method='python')
+    mdrunfile = first['mdrunfile']
+    nsteps = int(gromacs_utils.read_mdp_options(mdrunfile)['nsteps'])
+    dt = float(gromacs_utils.read_mdp_options(mdrunfile)['dt'])
+    grompp_log = os.path.join(dest_dir, 'log_grompp.log')
+    os.remove(grompp_log)
+    # the inputs of the checkpoint are kept and topol.tpr is extended
+    second = automd.run(alkane, dest_dir=dest_dir, max_core=1,
+                        obgmx_method='python', extend_time=0.5,
+                        time_unit='ns')
+    assert not os.path.exists(grompp_log)
+    assert second['mdrunfile'] == mdrunfile
+    assert 'extend_tpr' in second['timings']
+    assert int(gromacs_utils.read_mdp_options(mdrunfile)['nsteps']) == \
+        nsteps + round(500 / dt)
+    assert gromacs_utils.get_extend_tpr_args(0.5, 'ns')[4:6] == \
+        ['-extend', '500']
+
+
+def test_iter_isomers(gmx, alkane, tmp_path):
+    dest_dir = str(tmp_path / 'run')
+    structures = list(main.iter_isomers(alkane, dest_dir=dest_dir,
+                                        max_core=1, poll_interval=0.05,
+                                        obgmx_method='python'))
+    headers = xtc.read_xtc_headers(os.path.join(dest_dir,
+                                                gromacs_utils.XTC_FILE))
+    assert len(headers) > 1
+    assert [x['step'] for x in structures] == \
+        [header['step'] for header in headers]
+    assert len(structures[0]['symbols']) == 29
+
+
+def test_iter_isomers_close(gmx, alkane, tmp_path, monkeypatch):
+    monkeypatch.setenv('GMX_STANDIN_MDRUN_SECONDS', '60')
+    dest_dir = str(tmp_path / 'run')
+    start = time.monotonic()
+    structures = main.iter_isomers(alkane, dest_dir=dest_dir, max_core=1,
+                                   poll_interval=0.05, obgmx_method='python')
+    assert next(structures)['step'] == 0
+    # mdrun is killed and its cores released
+    structures.close()
+    assert time.monotonic() - start < 30
+    with open(affinity.AFFINITY_FILE) as fd:
+        assert json.load(fd) == {}
@@ -0,0 +1,85 @@
+import os
+import stat
+
+import numpy as np
+import pytest
+
+from automd.obgmx import obgmx
+from automd.obgmx.cache import get_topology_key
+
+import make_fixtures as fixtures
+
+
+def write_exe(tmp_path, script):
+    filename = tmp_path / 'obgmx'
+    filename.write_text('#!/bin/sh\n' + script)
+    filename.chmod(filename.stat().st_mode | stat.S_IEXEC)
+    return str(filename)
+
+
+@pytest.fixture
+def dest_dir(tmp_path):
+    dest_dir = tmp_path / 'run'
+    dest_dir.mkdir()
+    # outputs of a previous run
+    for name in ['obgmx.top', 'obgmx.itp']:
+        (dest_dir / name).write_text('; stale\n')
+    return str(dest_dir)
+
+
+def test_obgmx_exe(monkeypatch, tmp_path, alkane, dest_dir):
+    monkeypatch.setattr(obgmx, 'OBGMX_EXE_FNAME', write_exe(
+        tmp_path, 'echo "; top" > obgmx.top; echo "; itp" > obgmx.itp\n'))
+    top_filename, itp_filename = obgmx.generate_gromacs_obgmx_UFF_topfile(
+        alkane, dest_dir=dest_dir)
+    with open(top_filename) as fd:
+        assert fd.read() == '; top\n'
+    # cached
+    os.remove(top_filename)
+    assert obgmx.generate_gromacs_obgmx_UFF_topfile(
+        alkane, dest_dir=dest_dir) == (top_filename, itp_filename)
+
+
+def test_obgmx_exe_failed(monkeypatch, tmp_path, cache_dir, alkane,
+                          dest_dir):
+    # the obgmx wrapper exits with 0 whether obgmx ran or not
+    monkeypatch.setattr(obgmx, 'OBGMX_EXE_FNAME', write_exe(
+        tmp_path, 'echo "obgmx: error"\n'))
+    with pytest.raises(RuntimeError, match='obgmx: error'):
+        obgmx.generate_gromacs_obgmx_UFF_topfile(alkane, dest_dir=dest_dir)
+    assert not os.path.exists(os.path.join(dest_dir, 'obgmx.top'))
+    assert not list(cache_dir.glob('topology/*'))
+
+
+def test_topology_key():
+    symbols, positions = fixtures.molecules.get_alkane(11)
+    positions = np.asarray(positions)
+    key = get_topology_key(symbols, positions)
+    # same connectivity: a translated or slightly distorted molecule
+    assert get_topology_key(symbols, positions + 3) == key
+    assert get_topology_key(symbols, positions + 0.01) == key
+    assert get_topology_key(symbols, positions, 'python') != key
+    assert get_topology_key(symbols, positions, use_harmonic_angle=True) \
+        != key
+    # equilibrium values of the geometry: the positions are part of the key
+    assert get_topology_key(symbols, positions, use_geom_bond=True) != \
+        get_topology_key(symbols, positions + 0.01, use_geom_bond=True)
+
+
+def test_topology_cache_hit(monkeypatch, tmp_path, alkane, dest_dir):
+    monkeypatch.setattr(obgmx, 'OBGMX_EXE_FNAME', write_exe(
+        tmp_path, 'echo "; top" > obgmx.top; echo "; itp" > obgmx.itp\n'))
+    obgmx.generate_gromacs_obgmx_UFF_topfile(alkane, dest_dir=dest_dir)
+    # the executable is not run for the same molecule
+    monkeypatch.setattr(obgmx, 'OBGMX_EXE_FNAME', write_exe(
+        tmp_path, 'exit 1\n'))
+    other_dir = tmp_path / 'other'
+    other_dir.mkdir()
+    top_filename, itp_filename = obgmx.generate_gromacs_obgmx_UFF_topfile(
+        alkane, dest_dir=str(other_dir))
+    with open(itp_filename) as fd:
+        assert fd.read() == '; itp\n'
+    # another switch is another topology
+    with pytest.raises(RuntimeError):
+        obgmx.generate_gromacs_obgmx_UFF_topfile(
+            alkane, dest_dir=str(other_dir), use_harmonic_angle=True)
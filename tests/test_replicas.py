@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+import automd
+from automd import replicas
+from automd import gromacs_utils
+
+
+def test_get_replica_seeds():
+    assert replicas.get_replica_seeds(3, 7) == [7, 8, 9]
+    seeds = replicas.get_replica_seeds(2)
+    assert seeds[1] == seeds[0] + 1
+
+
+def test_prepare_replicas(gmx, alkane, tmp_path):
+    dest_dir = str(tmp_path / 'run')
+    out_dicts = replicas.prepare_replicas(
+        alkane, 2, dest_dir=dest_dir, temperatures=[300, 600], gen_seed=5,
+        obgmx_method='python')
+    assert [x['replica'] for x in out_dicts] == [0, 1]
+    for out_dict, seed, temperature in zip(out_dicts, [5, 6], [300, 600]):
+        assert out_dict['dest_dir'] == os.path.realpath(
+            replicas.get_replica_dir(dest_dir, out_dict['replica']))
+        assert os.path.exists(os.path.join(out_dict['dest_dir'],
+                                           'topol.tpr'))
+        options = gromacs_utils.read_mdp_options(out_dict['mdrunfile'])
+        assert options['gen-seed'] == str(seed)
+        assert float(options['ref-t']) == temperature
+    # gro/top/itp are shared
+    assert out_dicts[0]['grofile'] == out_dicts[1]['grofile']
+    with pytest.raises(ValueError):
+        replicas.prepare_replicas(alkane, 2, dest_dir=dest_dir,
+                                  temperatures=[300])
+
+
+def test_get_isomers_replicas(gmx, alkane, tmp_path):
+    reports = list()
+    structures = automd.get_isomers(
+        alkane, dest_dir=str(tmp_path / 'run'), max_core=2, replicas=2,
+        obgmx_method='python', progress=reports.append)
+    assert {x['replica'] for x in structures} == {0, 1}
+    assert {x['replica'] for x in reports} == {0, 1}
+
+
+@pytest.mark.parametrize('option', replicas.UNSUPPORTED_OPTIONS)
+def test_get_isomers_replicas_unsupported(alkane, tmp_path, option):
+    with pytest.raises(ValueError, match=option):
+        automd.get_isomers(alkane, dest_dir=str(tmp_path / 'run'),
+                           replicas=2, **{option: 10})
+    assert not os.path.exists(tmp_path / 'run')
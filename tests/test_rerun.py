@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+import automd
+from automd import trr
+
+import make_fixtures as fixtures
+
+
+def test_rerun_energies(gmx, alkane, tmp_path):
+    topfile, itpfile = automd.generate_gromacs_topfile_itpfile(
+        alkane, dest_dir=str(tmp_path / 'top'), obgmx_method='python')
+    symbols, positions = fixtures.molecules.get_alkane(29)
+    cell = np.eye(3) * 30
+    structures = [{'symbols': symbols, 'positions': positions},
+                  {'symbols': symbols, 'positions': positions * 1.1},
+                  {'symbols': symbols, 'positions': positions + 1,
+                   'cell': cell}]
+    dest_dir = str(tmp_path / 'rerun')
+    out_dict = automd.rerun_energies(structures, topfile, itpfile,
+                                     dest_dir=dest_dir, max_core=1)
+    assert out_dict['potential_energy'].shape == (3,)
+    assert out_dict['forces'].shape == (3, 29, 3)
+    assert 'mdrun' in out_dict['timings']
+    # one frame per structure, centered in a cell of its extent if it has
+    # no cell
+    frames = trr.read_trr(out_dict['rerun_filename'], 'x')
+    for frame, scale in zip(frames, [1, 1.1]):
+        np.testing.assert_allclose(
+            frame - frame.mean(axis=0),
+            scale * (positions - positions.mean(axis=0)) / 10, atol=1e-6)
+    np.testing.assert_allclose(frames[2], (positions + 1) / 10, atol=1e-6)
+    np.testing.assert_allclose(trr.read_trr(out_dict['rerun_filename'],
+                                            'box')[2], cell / 10)
+
+
+def test_rerun_energies_natoms(tmp_path):
+    symbols, positions = fixtures.molecules.get_alkane(29)
+    structures = [{'symbols': symbols, 'positions': positions},
+                  {'symbols': symbols[:-1], 'positions': positions[:-1]}]
+    with pytest.raises(ValueError):
+        automd.rerun_energies(structures, 'topol.top',
+                              dest_dir=str(tmp_path))
+    with pytest.raises(ValueError):
+        automd.rerun_energies([], 'topol.top', dest_dir=str(tmp_path))
@@ -0,0 +1,37 @@
+import os
+
+import numpy as np
+
+import automd
+from automd import results
+from automd import gromacs_utils
+
+
+def test_get_result_key(gmx, alkane):
+    key = results.get_result_key(alkane, temperature=300)
+    assert results.get_result_key(alkane, temperature=300,
+                                  debug=True) == key
+    assert results.get_result_key(alkane, temperature=400) != key
+    assert results.get_result_key(alkane, temperature=300,
+                                  obgmx_method='python') != key
+    assert results.get_result_key(alkane, 'emin', temperature=300) != key
+
+
+def test_run_cache_results(gmx, alkane, tmp_path, monkeypatch):
+    first = automd.run(alkane, dest_dir=str(tmp_path / 'first'),
+                       max_core=1, cache_results=True, obgmx_method='python')
+
+    def exec_mdrun(*args, **kwargs):
+        raise AssertionError('mdrun of a stored result')
+
+    monkeypatch.setattr(gromacs_utils, 'exec_mdrun', exec_mdrun)
+    dest_dir = str(tmp_path / 'second')
+    second = automd.run(alkane, dest_dir=dest_dir, max_core=1,
+                        cache_results=True, obgmx_method='python')
+    for key in results.RESULT_FILE_KEYS:
+        if key in first:
+            assert second[key] == os.path.realpath(
+                os.path.join(dest_dir, os.path.basename(first[key])))
+            assert os.path.exists(second[key])
+    np.testing.assert_array_equal(second['potential_energy'],
+                                  first['potential_energy'])
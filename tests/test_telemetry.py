@@ -0,0 +1,91 @@
+import pytest
+
+import automd
+from automd import telemetry
+
+# end of a topol.log of gromacs 2020
+LOG_TAIL = """\
+     R E A L   C Y C L E   A N D   T I M E   A C C O U N T I N G
+
+On 1 MPI rank, each using 4 OpenMP threads
+
+ Computing:          Num   Num      Call    Wall time         Giga-Cycles
+                     Ranks Threads  Count      (s)         total sum    %
+-----------------------------------------------------------------------------
+ Neighbor search        1    4        251       0.075          0.723   4.1
+ Force                  1    4      10001       1.377         13.218  75.0
+ NB X/F buffer ops.     1    4      19751       0.065          0.627   3.6
+ Rest                                           0.319          3.063  17.3
+-----------------------------------------------------------------------------
+ Total                                          1.836         17.630 100.0
+-----------------------------------------------------------------------------
+
+               Core t (s)   Wall t (s)        (%)
+       Time:        7.343        1.836      400.0
+                 (ns/day)    (hour/ns)
+Performance:      470.747        0.051
+Finished mdrun on rank 0 Wed Mar 18 15:10:12 2020
+"""
+
+
+def test_parse_progress():
+    text = 'starting mdrun\rstep 100, will finish Wed Mar 18 15:10:12 2020' \
+        '\rstep 200, remaining wall clock time:    25 s          '
+    assert telemetry.parse_progress(text) == {
+        'step': 200, 'finish': None, 'remaining': 25.0}
+    # with dynamic load balancing
+    assert telemetry.parse_progress(
+        'imb F  2% step 4100, will finish Wed Mar 18 15:10:12 2020\n') == {
+        'step': 4100, 'finish': 'Wed Mar 18 15:10:12 2020',
+        'remaining': None}
+    assert telemetry.parse_progress('Reading file topol.tpr\n') is None
+
+
+def test_mdrun_progress(tmp_path):
+    filename = tmp_path / 'log_mdrun.err'
+    reports = list()
+    follower = telemetry.MdrunProgress(str(filename), nsteps=1000, dt=0.002,
+                                       callback=reports.append)
+    assert follower.poll() is None
+    filename.write_text('step 100, will finish Wed Mar 18 15:10:12 2020\r'
+                        'step 2')
+    progress = follower.poll()
+    assert progress['step'] == 100 and progress['fraction'] == 0.1
+    # a partial line is read on the next poll, the same step is no report
+    assert follower.poll() is progress
+    with open(filename, 'a') as fd:
+        fd.write('00, will finish Wed Mar 18 15:10:12 2020\r')
+    progress = follower.poll()
+    assert progress['step'] == 200
+    assert progress['remaining'] > 0 and progress['ns_per_day'] > 0
+    assert [x['step'] for x in reports] == [100, 200]
+
+
+def test_read_performance(tmp_path):
+    filename = tmp_path / 'topol.log'
+    filename.write_text('Started mdrun\n' + LOG_TAIL)
+    performance = telemetry.read_performance(str(filename))
+    assert performance['ns_per_day'] == 470.747
+    assert performance['hours_per_ns'] == 0.051
+    assert performance['core_time'] == 7.343
+    assert performance['wall_time'] == 1.836
+    assert performance['core_percent'] == 400.0
+    cycles = performance['cycles']
+    assert list(cycles) == ['Neighbor search', 'Force', 'NB X/F buffer ops.',
+                            'Rest']
+    assert cycles['Force'] == {'ranks': 1, 'threads': 4, 'count': 10001,
+                               'wall_time': 1.377, 'gcycles': 13.218,
+                               'percent': 75.0}
+    assert cycles['Rest']['ranks'] is None
+    # an unfinished run
+    filename.write_text('Started mdrun\n')
+    assert telemetry.read_performance(str(filename)) == {}
+
+
+def test_run_performance(gmx, alkane, tmp_path):
+    out_dict = automd.run(alkane, dest_dir=str(tmp_path / 'run'),
+                          max_core=1, obgmx_method='python')
+    assert out_dict['performance']['ns_per_day'] > 0
+    assert out_dict['performance']['cycles']['Force']['threads'] == 1
+    with pytest.raises(KeyError):
+        out_dict['performance']['cycles']['PME mesh']
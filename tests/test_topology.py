@@ -0,0 +1,65 @@
+import numpy as np
+
+from automd.topology import Topology, load_topology, parse_atoms
+from automd.obgmx import uff
+
+import make_fixtures as fixtures
+
+
+def write_propane(tmp_path):
+    symbols, positions = fixtures.molecules.get_alkane(11)
+    return uff.generate_uff_topfile(symbols, positions, str(tmp_path))
+
+
+def test_topology(tmp_path):
+    top_filename, itp_filename = write_propane(tmp_path)
+    topology = Topology.from_file(itp_filename)
+    assert topology.name == 'MOL' and topology.nrexcl == 3
+    assert topology.natoms == 11
+    assert topology.symbols == fixtures.molecules.get_alkane(11)[0]
+    assert list(topology.atoms['type'][:2]) == ['C_3', 'H_']
+    assert topology.bonds.atoms.shape == (10, 2)
+    # 3 carbons with 4 neighbors
+    assert len(topology.angles) == 18
+    np.testing.assert_array_equal(topology.bonds.funct, 1)
+    assert topology.bonds.params.shape == (10, 2)
+    # the top file includes the itp file
+    top_topology = Topology.from_file(top_filename)
+    np.testing.assert_array_equal(top_topology.atoms, topology.atoms)
+
+
+def test_topology_to_itp(tmp_path):
+    _, itp_filename = write_propane(tmp_path)
+    topology = Topology.from_file(itp_filename)
+    filename = str(tmp_path / 'copy.itp')
+    topology.write_itp(filename)
+    copy = Topology.from_file(filename)
+    np.testing.assert_array_equal(copy.atoms, topology.atoms)
+    assert copy.atomtypes == topology.atomtypes
+    for section, table in topology.interactions.items():
+        np.testing.assert_array_equal(copy.interactions[section].atoms,
+                                      table.atoms)
+        np.testing.assert_array_equal(copy.interactions[section].funct,
+                                      table.funct)
+        np.testing.assert_allclose(copy.interactions[section].params,
+                                   table.params)
+
+
+def test_parse_atoms():
+    atomtypes = {'OW': ['8', '15.9994', '-0.8', 'A', '0.3', '0.6']}
+    atoms = parse_atoms(['1 OW 1 SOL OW 1', '2 OW 1 SOL OW 1 -0.5'],
+                        atomtypes)
+    np.testing.assert_allclose(atoms['charge'], [-0.8, -0.5])
+    np.testing.assert_allclose(atoms['mass'], 15.9994)
+
+
+def test_load_topology(tmp_path):
+    _, itp_filename = write_propane(tmp_path)
+    topology = load_topology(itp_filename)
+    assert load_topology(itp_filename) is topology
+    # parsed again when the content changes
+    with open(itp_filename, 'a') as fd:
+        fd.write('\n[ position_restraints ]\n1 1 1000 1000 1000\n')
+    changed = load_topology(itp_filename)
+    assert changed is not topology
+    assert changed.extra == [('position_restraints', ['1 1 1000 1000 1000'])]
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from automd import trr
+from automd import frameindex
+
+import make_fixtures as fixtures
+
+
+def test_read_trr_headers(datafile):
+    headers = trr.read_trr_headers(datafile('traj.trr'))
+    assert [header['step'] for header in headers] == [0, 10, 20]
+    assert [header['natoms'] for header in headers] == [12] * 3
+    assert [header['f'] is not None for header in headers] == \
+        [True, False, True]
+    assert all(header['real_size'] == 4 for header in headers)
+
+
+def test_read_trr(datafile):
+    filename = datafile('traj.trr')
+    np.testing.assert_array_equal(trr.read_trr(filename, 'x'),
+                                  fixtures.get_trr_positions())
+    # only the frames having forces
+    np.testing.assert_array_equal(trr.read_trr(filename, 'f'),
+                                  fixtures.get_trr_forces()[[0, 2]])
+    np.testing.assert_array_equal(trr.read_trr(filename, 'box'),
+                                  [fixtures.BOX] * 3)
+    assert trr.read_trr(filename, 'v').shape == (0, 0, 3)
+
+
+def test_read_trr_memmap(datafile, tmp_path):
+    out_filename = str(tmp_path / 'forces.npy')
+    forces = trr.read_trr(datafile('traj.trr'), 'f', dtype=np.float32,
+                          scale=10.0, out_filename=out_filename)
+    np.testing.assert_array_equal(np.load(out_filename), forces)
+    np.testing.assert_array_equal(forces,
+                                  10 * fixtures.get_trr_forces()[[0, 2]])
+
+
+def test_read_trr_frames(datafile):
+    filename = datafile('traj.trr')
+    headers, values = frameindex.read_trr_frames(
+        filename, keys=('x', 'f'), frames=[-1], atoms=[1, 3])
+    assert [header['step'] for header in headers] == [20]
+    np.testing.assert_array_equal(
+        values['x'], fixtures.get_trr_positions()[[2]][:, [1, 3]])
+    np.testing.assert_array_equal(
+        values['f'], fixtures.get_trr_forces()[[2]][:, [1, 3]])
+    np.testing.assert_array_equal(
+        frameindex.read_frame_steps(filename, keys=['f']), [0, 20])
+
+
+def test_write_trr(tmp_path):
+    filename = str(tmp_path / 'rerun.trr')
+    positions = fixtures.get_trr_positions()
+    trr.write_trr(filename, positions, [fixtures.BOX] * 3, steps=[5, 6, 7])
+    assert [header['step'] for header in trr.read_trr_headers(filename)] == \
+        [5, 6, 7]
+    np.testing.assert_array_equal(trr.read_trr(filename, 'x'), positions)
+
+
+def test_read_trr_xdrfile(datafile):
+    """
+    a file written by the xdrfile library of gromacs (through mdtraj)
+    """
+    filename = datafile('xdrfile.trr')
+    headers = trr.read_trr_headers(filename)
+    assert [header['step'] for header in headers] == [0, 500, 1000, 1500]
+    np.testing.assert_allclose([header['t'] for header in headers],
+                               [0, 1, 2, 3])
+    np.testing.assert_array_equal(trr.read_trr(filename, 'x'),
+                                  fixtures.get_xdrfile_positions())
+    np.testing.assert_array_equal(trr.read_trr(filename, 'box'),
+                                  [fixtures.BOX] * 4)
+    assert trr.read_trr(filename, 'f').shape == (0, 0, 3)
+
+
+def test_read_trr_mdtraj(datafile):
+    """
+    frames of benchmarks/writers.py as read by mdtraj
+    """
+    formats = pytest.importorskip('mdtraj.formats')
+    filename = datafile('traj.trr')
+    with formats.TRRTrajectoryFile(filename) as fd:
+        xyz, time, step, box, _ = fd.read()
+    np.testing.assert_array_equal(trr.read_trr(filename, 'x'), xyz)
+    np.testing.assert_array_equal(
+        [header['step'] for header in trr.read_trr_headers(filename)], step)
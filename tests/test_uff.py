@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from automd.obgmx import uff
+
+import make_fixtures as fixtures
+
+WATER = (['O', 'H', 'H'],
+         [[0, 0, 0], [0.7572, 0.5865, 0], [-0.7572, 0.5865, 0]])
+# harmonic angle constants in kcal/mol/rad^2 of the UFF paper formula,
+# K = 664.12 Zi Zk / rik^5 [3 rij rjk (1 - cos^2 theta0) - rik^2 cos theta0],
+# with the parameters of UFF.prm, as RDKit computes them
+KA_CCC = 214.2118
+KA_HOH = 120.4998
+
+
+def get_angle_constants(symbols, positions):
+    """
+    {(symbol i, symbol j, symbol k): harmonic constant in kcal/mol/rad^2}
+    """
+    topology = uff.get_uff_topology(symbols, positions,
+                                    use_harmonic_angle=True)
+    return {(symbols[i], symbols[j], symbols[k]): ka / uff.KCAL_TO_KJ
+            for i, j, k, _, _, ka in topology['angles']}
+
+
+def test_angle_constants():
+    # propane
+    constants = get_angle_constants(*fixtures.molecules.get_alkane(11))
+    assert constants['C', 'C', 'C'] == pytest.approx(KA_CCC, rel=1e-5)
+    constants = get_angle_constants(*WATER)
+    assert constants['H', 'O', 'H'] == pytest.approx(KA_HOH, rel=1e-5)
+
+
+def get_benzene():
+    angles = np.radians(np.arange(6) * 60)
+    ring = np.stack([np.cos(angles), np.sin(angles), 0 * angles], axis=1)
+    return ['C'] * 6 + ['H'] * 6, np.concatenate([ring * 1.39, ring * 2.47])
+
+
+def get_bond_lengths(symbols, positions):
+    """
+    {(symbol i, symbol j): natural bond length in Angstrom}
+    """
+    topology = uff.get_uff_topology(symbols, positions)
+    return {(symbols[i], symbols[j]): b0 / uff.ANG_TO_NM
+            for i, j, _, b0, _ in topology['bonds']}
+
+
+def test_atomtypes():
+    topology = uff.get_uff_topology(*get_benzene())
+    assert [x[0] for x in topology['atoms']] == ['C_R'] * 6 + ['H_'] * 6
+    # a flat molecule is kept flat by one improper per carbon
+    assert sum(x[4] == 2 for x in topology['dihedrals']) == 6
+    symbols, positions = fixtures.molecules.get_alkane(8)
+    topology = uff.get_uff_topology(symbols, positions)
+    assert [x[0] for x in topology['atoms']] == \
+        ['C_3' if x == 'C' else 'H_' for x in symbols]
+
+
+def test_bond_lengths():
+    # ri + rj + r_bo - r_en of the UFF paper, as RDKit computes them
+    lengths = get_bond_lengths(*fixtures.molecules.get_alkane(8))
+    assert lengths['C', 'C'] == pytest.approx(1.514, abs=1e-4)
+    assert lengths['C', 'H'] == pytest.approx(1.1094, abs=1e-4)
+    # aromatic bonds of order 1.5
+    lengths = get_bond_lengths(*get_benzene())
+    assert lengths['C', 'C'] == pytest.approx(1.3793, abs=1e-4)
+
+
+def test_torsions():
+    # ethane: 9 H-C-C-H torsions share the barrier of the C_3-C_3 bond
+    topology = uff.get_uff_topology(*fixtures.molecules.get_alkane(8))
+    dihedrals = topology['dihedrals']
+    assert len(dihedrals) == 9
+    assert len(topology['pairs']) == 9
+    for dihedral in dihedrals:
+        assert dihedral[4:] == pytest.approx(
+            (1, 0.0, 2.119 / 2 / 9 * uff.KCAL_TO_KJ, 3))
@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+
+from automd import xtc
+from automd import frameindex
+
+import make_fixtures as fixtures
+
+
+def make_stream(rng, natoms, sizeint, smallidx=12):
+    """
+    random compressed stream with run length coded small triples and
+    changes of their size, as written by gromacs for molecules
+    """
+    bits = fixtures.writers.BitWriter()
+    bitsize = int(np.prod(sizeint)).bit_length()
+    i = 0
+    run = 0
+    while i < natoms:
+        bits.write_ints(bitsize, sizeint,
+                        [int(rng.integers(size)) for size in sizeint])
+        i += 1
+        left = natoms - i
+        is_smaller = 0
+        if rng.random() < 0.6 or run // 3 > left:
+            is_smaller = int(rng.integers(-1, 2))
+            if not xtc.FIRSTIDX <= smallidx + is_smaller < 40:
+                is_smaller = 0
+            run = 3 * int(rng.integers(0, min(8, left) + 1))
+            bits.write(1, 1)
+            bits.write(run + is_smaller + 1, 5)
+        else:
+            bits.write(0, 1)
+        for _ in range(run // 3):
+            size = xtc.MAGICINTS[smallidx]
+            bits.write_ints(smallidx, [size] * 3,
+                            [int(x) for x in rng.integers(size, size=3)])
+        i += run // 3
+        smallidx += is_smaller
+    return bits.to_bytes()
+
+
+@pytest.mark.parametrize('natoms', fixtures.XTC_ATOMS)
+def test_iread_xtc(datafile, natoms):
+    frames = list(xtc.iread_xtc(datafile(f'topol_{natoms}.xtc')))
+    assert [header['step'] for header, _ in frames] == [0, 50, 100, 150]
+    np.testing.assert_allclose(frames[0][0]['box'], fixtures.BOX)
+    np.testing.assert_array_equal([coords for _, coords in frames],
+                                  fixtures.get_xtc_positions(natoms))
+
+
+def test_read_xtc_frames(datafile):
+    filename = datafile('topol_40.xtc')
+    frames = list(frameindex.read_xtc_frames(filename, frames=[-1, 1],
+                                             atoms=slice(0, 5)))
+    assert [header['step'] for header, _ in frames] == [150, 50]
+    np.testing.assert_array_equal(
+        [coords for _, coords in frames],
+        fixtures.get_xtc_positions(40)[[-1, 1], :5])
+
+
+def test_xtc_follower(datafile, tmp_path):
+    with open(datafile('topol_40.xtc'), 'rb') as fd:
+        data = fd.read()
+    headers = xtc.read_xtc_headers(datafile('topol_40.xtc'))
+    filename = str(tmp_path / 'growing.xtc')
+    follower = xtc.XTCFollower(filename)
+    assert list(follower.read()) == []
+    # one frame and a half
+    with open(filename, 'wb') as fd:
+        fd.write(data[:headers[1]['offset'] + 20])
+    assert [header['step'] for header, _ in follower.read()] == [0]
+    with open(filename, 'wb') as fd:
+        fd.write(data)
+    frames = list(follower.read())
+    assert [header['step'] for header, _ in frames] == [50, 100, 150]
+    np.testing.assert_array_equal(frames[-1][1],
+                                  fixtures.get_xtc_positions(40)[-1])
+
+
+@pytest.mark.parametrize('natoms', [10, 100, 1000])
+def test_decompress_coords_runs(natoms):
+    rng = np.random.default_rng(natoms)
+    minint = [-500, 0, 250]
+    maxint = [1500, 3000, 800]
+    sizeint = [high - low + 1 for low, high in zip(minint, maxint)]
+    data = make_stream(rng, natoms, sizeint)
+    expected = xtc.decompress_coords_python(data, natoms, minint, maxint, 12)
+    np.testing.assert_array_equal(
+        xtc.decompress_coords_numpy(data, natoms, minint, maxint, 12),
+        expected)
+    np.testing.assert_array_equal(
+        xtc.decompress_coords(data, natoms, minint, maxint, 12), expected)
+
+
+def test_decompress_coords_corrupted():
+    rng = np.random.default_rng(0)
+    data = make_stream(rng, 100, [1000] * 3)
+    with pytest.raises(xtc.XTCError):
+        xtc.decompress_coords_numpy(data[:len(data) // 2], 100, [0] * 3,
+                                    [999] * 3, 12)
+
+
+def test_iread_xtc_xdrfile(datafile):
+    """
+    a file written by the xdrfile library of gromacs (through mdtraj),
+    with run length coded small triples
+    """
+    frames = list(xtc.iread_xtc(datafile('xdrfile.xtc')))
+    assert [header['step'] for header, _ in frames] == [0, 500, 1000, 1500]
+    coords = np.array([coords for _, coords in frames])
+    positions = fixtures.get_xdrfile_positions()
+    np.testing.assert_allclose(coords, positions, rtol=0, atol=5.01e-4)
+    formats = pytest.importorskip('mdtraj.formats')
+    with formats.XTCTrajectoryFile(datafile('xdrfile.xtc')) as fd:
+        xyz, time, step, box = fd.read()
+    np.testing.assert_allclose(coords, xyz, rtol=1e-6, atol=1e-6)
+
+
+def test_iread_xtc_mdtraj(datafile):
+    """
+    frames of benchmarks/writers.py as read by mdtraj
+    """
+    formats = pytest.importorskip('mdtraj.formats')
+    filename = datafile('topol_40.xtc')
+    with formats.XTCTrajectoryFile(filename) as fd:
+        xyz, time, step, box = fd.read()
+    coords = np.array([coords for _, coords in xtc.iread_xtc(filename)])
+    np.testing.assert_allclose(coords, xyz, rtol=1e-6, atol=1e-6)